@@ -0,0 +1,182 @@
+"""酒店和租车的可用性日历
+
+availability_calendar 以 (资源表, 资源 ID, 日期) 为主键，每行表示该资源在这一天已被预订。
+预订、改期、取消后由写工具调用 sync_reservation 按资源行的 booked 标记和日期区间重新生成；
+启动时建表并根据已有的预订填充一次。日期区间统一按左闭右开 [开始, 结束) 处理。
+"""
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_TABLE = "availability_calendar"
+
+# 资源表 -> (开始日期列, 结束日期列)
+RESOURCES: dict[str, tuple[str, str]] = {
+    "hotels": ("checkin_date", "checkout_date"),
+    "car_rentals": ("start_date", "end_date"),
+}
+
+# 单次预订最多占用的天数，防止异常日期写入大量日历行
+MAX_RESERVATION_DAYS = 366
+
+CALENDAR_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CALENDAR_TABLE} (
+    resource TEXT NOT NULL,
+    resource_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (resource, resource_id, day)
+) WITHOUT ROWID
+"""
+
+DateLike = Union[date, datetime, str, None]
+
+
+def to_day(value: DateLike) -> Optional[date]:
+    """把工具参数或数据库中的日期（date / datetime / ISO 字符串）转换为 date，无法解析时返回 None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+def iso_day(value: DateLike) -> Optional[str]:
+    """写入数据库的日期：统一为 YYYY-MM-DD，空值或无法解析时返回 None"""
+    day = to_day(value)
+    return day.isoformat() if day else None
+
+
+def date_error(**values: DateLike) -> Optional[str]:
+    """检查工具的日期参数，有无法解析的值时返回给模型的错误说明，全部有效时返回 None"""
+    for name, value in values.items():
+        if value not in (None, "") and to_day(value) is None:
+            return f"Invalid {name} {value!r}: expected an ISO 8601 date such as 2024-05-01."
+    return None
+
+
+def date_range(start: DateLike, end: DateLike) -> Optional[tuple[date, date]]:
+    """规整查询或预订的日期区间
+
+    只给出一端时视为一天；结束早于开始时交换两端（教程数据中存在这种记录）。
+
+    Returns:
+        (开始, 结束) 左闭右开区间，两端都无法解析时返回 None
+    """
+    start_day, end_day = to_day(start), to_day(end)
+    if start_day is None and end_day is None:
+        return None
+    start_day = start_day or end_day - timedelta(days=1)
+    end_day = end_day or start_day + timedelta(days=1)
+    if end_day < start_day:
+        start_day, end_day = end_day, start_day
+    if end_day == start_day:
+        end_day = start_day + timedelta(days=1)
+    return start_day, end_day
+
+
+def reserved_days(start: DateLike, end: DateLike) -> list[str]:
+    span = date_range(start, end)
+    if span is None:
+        return []
+    start_day, end_day = span
+    days = min((end_day - start_day).days, MAX_RESERVATION_DAYS)
+    return [(start_day + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def _calendar_rows(conn: sqlite3.Connection, resource: str, where: str, params: tuple) -> list[tuple]:
+    start_col, end_col = RESOURCES[resource]
+    rows = conn.execute(
+        f"SELECT id, {start_col}, {end_col} FROM {resource} WHERE booked = 1 AND {where}", params
+    ).fetchall()
+    return [
+        (resource, resource_id, day)
+        for resource_id, start, end in rows
+        for day in reserved_days(start, end)
+    ]
+
+
+def sync_reservation(conn: sqlite3.Connection, resource: str, resource_id: int) -> None:
+    """按资源当前的预订状态重写它在日历中的记录，由调用方提交事务
+
+    Args:
+        conn: 执行写操作的连接
+        resource: 资源表名（hotels / car_rentals）
+        resource_id: 资源 ID
+    """
+    conn.execute(
+        f"DELETE FROM {CALENDAR_TABLE} WHERE resource = ? AND resource_id = ?", (resource, resource_id)
+    )
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {CALENDAR_TABLE} VALUES (?, ?, ?)",
+        _calendar_rows(conn, resource, "id = ?", (resource_id,)),
+    )
+
+
+def ensure_calendar(conn: sqlite3.Connection, tables: dict[str, tuple[str, ...]]) -> bool:
+    """日历表不存在时建表，并根据已有的预订填充
+
+    Args:
+        conn: 数据库连接
+        tables: 当前数据库的 表名 -> 列
+
+    Returns:
+        是否新建了日历表
+    """
+    if CALENDAR_TABLE in tables:
+        return False
+    resources = [
+        resource for resource, columns in RESOURCES.items()
+        if all(col in tables.get(resource, ()) for col in ("id", "booked", *columns))
+    ]
+    if not resources:
+        return False
+    with conn:
+        conn.execute(CALENDAR_DDL)
+        for resource in resources:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {CALENDAR_TABLE} VALUES (?, ?, ?)",
+                _calendar_rows(conn, resource, "1 = 1", ()),
+            )
+    logger.info(f"已建立可用性日历: {', '.join(resources)}")
+    return True
+
+
+def availability_condition(
+    resource: str,
+    start: DateLike = None,
+    end: DateLike = None,
+    *,
+    use_calendar: bool = True,
+) -> tuple[str, list]:
+    """只保留可预订资源的 WHERE 条件
+
+    给出日期时排除日历中与 [start, end) 有重叠的资源；已预订但在日历中没有记录的资源（日期为空或无法解析，
+    不知道占用了哪些天）同样排除。没有日期（或日历不可用）时排除已预订的资源。
+
+    Args:
+        resource: 资源表名，条件中以表名引用其列
+        start: 开始日期（入住 / 取车）
+        end: 结束日期（退房 / 还车）
+        use_calendar: 日历表是否可用
+
+    Returns:
+        (sql 片段, 参数)
+    """
+    span = date_range(start, end) if use_calendar else None
+    if span is None:
+        return f"{resource}.booked = 0", []
+    return (
+        f"NOT EXISTS (SELECT 1 FROM {CALENDAR_TABLE} c WHERE c.resource = ? "
+        f"AND c.resource_id = {resource}.id AND c.day >= ? AND c.day < ?) "
+        f"AND ({resource}.booked = 0 OR EXISTS (SELECT 1 FROM {CALENDAR_TABLE} c WHERE c.resource = ? "
+        f"AND c.resource_id = {resource}.id))",
+        [resource, span[0].isoformat(), span[1].isoformat(), resource],
+    )
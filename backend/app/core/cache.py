@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+
+class LRUCache(Generic[K, V]):
+    """线程安全的 LRU 缓存，可选过期时间和内存上限，附带命中率统计
+
+    Args:
+        max_size: 最多保留的条目数，超出时淘汰最久未使用的条目
+        ttl_seconds: 条目的存活秒数，None 表示不过期
+        max_bytes: 条目总大小上限（按 sizeof 估算），None 表示不限制
+        sizeof: 估算单个值大小的函数，设置 max_bytes 时必须提供
+        clock: 时间函数（测试时可替换）
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        *,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size 必须大于 0")
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("设置 max_bytes 时必须提供 sizeof")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._clock = clock
+        # key -> (值, 过期时间, 大小)
+        self._data: "OrderedDict[K, tuple[V, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: K) -> V:
+        value, _, size = self._data.pop(key)
+        self.bytes -= size
+        return value
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个值超过上限时不缓存，也不挤掉其他条目
+            self.pop(key)
+            return
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __contains__(self, key: K) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ReadThroughCache(Generic[K, V]):
+    """在 LRUCache 之上按 key 读穿加载，写操作后调用 invalidate 精确失效
+
+    加载期间发生 invalidate 时，这次加载的结果只返回给调用方、不写入缓存，
+    避免把写之前读到的旧数据放回去。
+
+    Args:
+        cache: 实际存储结果的 LRUCache
+    """
+
+    def __init__(self, cache: LRUCache[K, V]):
+        self.cache = cache
+        # key -> 正在进行的加载；invalidate 时整体移除，使这些加载的结果作废
+        self._loading: dict[K, set[object]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: K, loader: Callable[[], V]) -> V:
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        token = object()
+        with self._lock:
+            self._loading.setdefault(key, set()).add(token)
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                self._finish(key, token)
+            raise
+        with self._lock:
+            # 在锁内写入，与 invalidate 互斥
+            if self._finish(key, token):
+                self.cache.put(key, value)
+        return value
+
+    def _finish(self, key: K, token: object) -> bool:
+        """结束一次加载，返回它的结果是否仍然有效"""
+        pending = self._loading.get(key)
+        if pending is None or token not in pending:
+            return False
+        pending.discard(token)
+        if not pending:
+            del self._loading[key]
+        return True
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._loading.pop(key, None)
+            self.cache.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loading.clear()
+            self.cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return self.cache.stats()
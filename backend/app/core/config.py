@@ -3,10 +3,7 @@ from pydantic_settings import BaseSettings
 
 
 # 第一部分 - 配置和模型
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 日志级别由入口（app.main）按 LOG_LEVEL 配置，导入配置模块本身不修改全局日志
 logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
@@ -16,6 +13,85 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str 
     TAVILY_API_KEY: str
     DATABASE_URL: str = "sqlite:///database/travel2.sqlite"
+    LOG_LEVEL: str = "INFO"
+    # 启动后在后台线程中预先构建对话图，第一个请求不必等待模型和工具模块加载
+    PRELOAD_GRAPH: bool = True
+
+    # SQLite 连接池配置
+    DB_POOL_SIZE: int = 8
+    DB_POOL_TIMEOUT: float = 10.0  # 等待空闲连接的最长秒数
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_JOURNAL_MODE: str = "WAL"
+    DB_STATEMENT_CACHE_SIZE: int = 128
+
+    # 会话检查点存储："sqlite"（可在多个 worker 间共享）或 "memory"
+    CHECKPOINTER_BACKEND: str = "sqlite"
+    CHECKPOINT_DB_URL: str = "sqlite:///database/checkpoints.sqlite"
+    CHECKPOINT_BATCH_SIZE: int = 32
+    CHECKPOINT_THREAD_TTL_SECONDS: int = 24 * 3600
+    CHECKPOINT_MAX_THREADS: int = 10000
+    CHECKPOINT_KEEP_VERSIONS: int = 5
+    CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS: int = 300
+
+    # 同一轮中多个工具调用并发执行的上限（写操作仍按乘客串行）
+    TOOL_MAX_CONCURRENCY: int = 4
+    # 搜索类工具的结果整形：每页行数上限、单条结果的字符预算、单元格截断长度
+    TOOL_RESULT_MAX_ROWS: int = 20
+    TOOL_RESULT_MAX_CHARS: int = 6000
+    TOOL_RESULT_MAX_CELL_CHARS: int = 300
+    # fetch_user_flight_information 的按乘客缓存：条目数、存活秒数、总大小上限（字节，按 JSON 长度估算）
+    USER_FLIGHTS_CACHE_SIZE: int = 1024
+    USER_FLIGHTS_CACHE_TTL_SECONDS: float = 300.0
+    USER_FLIGHTS_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    # Anthropic 提示缓存：是否为工具定义、system 和历史前缀设置缓存断点，以及历史中的断点数（0-2）
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_HISTORY_BREAKPOINTS: int = 2
+    # 对话历史：发送给 LLM 的窗口 token 预算、摘要长度上限、当前轮之前的工具结果保留的字符数
+    HISTORY_MAX_TOKENS: int = 8000
+    HISTORY_SUMMARY_MAX_TOKENS: int = 1000
+    HISTORY_TOOL_RESULT_MAX_CHARS: int = 500
+    # 助手调用 LLM 的重试：最多调用次数、指数退避的基准和上限（秒，全抖动）、单次调用超时（秒）
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    LLM_CALL_TIMEOUT_SECONDS: float = 60.0
+    # 单个对话请求（含全部 LLM 和工具调用）的总时限（秒）
+    CHAT_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    # 语义响应缓存：新会话的通用问题按问题向量相似度复用回答（只缓存未调用个人工具的回答）
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    RESPONSE_CACHE_THRESHOLD: float = 0.92
+    # 默认嵌入器（政策检索）不可用时，间隔多少秒再尝试加载；期间缓存直接跳过
+    RESPONSE_CACHE_RETRY_SECONDS: float = 300.0
+    # 只读工具的结果缓存：条目数、总大小（字节，按字符数估算）、存活秒数（兜底绕过写工具直接修改数据库的情况）
+    TOOL_CACHE_ENABLED: bool = True
+    TOOL_CACHE_SIZE: int = 2048
+    TOOL_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    TOOL_CACHE_TTL_SECONDS: float = 600.0
+
+    # 指标：执行图时挂上耗时 / token 回调并在 /metrics 输出；JSON_LOGS 开启时每个请求额外输出一行 JSON 日志
+    METRICS_ENABLED: bool = True
+    METRICS_JSON_LOGS: bool = False
+
+    # 流式输出：服务端为每个连接缓冲的事件数上限
+    STREAM_QUEUE_SIZE: int = 64
+
+    # 政策检索：FAQ 原文与离线构建的向量索引
+    # 构建命令：python -m app.services.customer_support.retrieval.index
+    POLICY_FAQ_URL: str = "https://storage.googleapis.com/benchmarks-artifacts/travel-db/swiss_faq.md"
+    POLICY_FAQ_PATH: str = "database/swiss_faq.md"
+    POLICY_INDEX_DIR: str = "database/policy_index"
+    # 嵌入器："openai"（POLICY_EMBEDDING_MODEL）或完全本地的 "hashing"
+    POLICY_EMBEDDER: str = "openai"
+    POLICY_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    POLICY_HASHING_DIM: int = 1024
+    # 查询向量缓存：内存 LRU 条目数与磁盘缓存路径（留空则只用内存）
+    POLICY_QUERY_CACHE_SIZE: int = 1024
+    POLICY_QUERY_CACHE_PATH: str = "database/policy_query_cache.sqlite"
+    # 近似最近邻（IVF）：文档数达到阈值时构建索引时一并生成；nprobe 越大召回越高、查询越慢
+    POLICY_ANN_MIN_DOCS: int = 5000
+    POLICY_ANN_NPROBE: int = 8
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -23,6 +99,8 @@ class Settings(BaseSettings):
         logger.debug(f"加载项目名称: {self.PROJECT_NAME}")
         logger.debug(f"API版本: {self.API_V1_STR}")
         logger.debug(f"数据库URL: {self.DATABASE_URL}")
+        logger.debug(f"数据库连接池大小: {self.DB_POOL_SIZE}")
+        logger.debug(f"检查点存储: {self.CHECKPOINTER_BACKEND}")
         # 敏感信息只记录是否存在
         logger.debug(f"Anthropic API Key 已设置: {bool(self.ANTHROPIC_API_KEY)}")
         logger.debug(f"OpenAI API Key 已设置: {bool(self.OPENAI_API_KEY)}")
@@ -0,0 +1,242 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# backend 目录，相对数据库路径都以此为基准（与原 flight_tool 的解析方式一致）
+BACKEND_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """在超时时间内没有等到空闲连接"""
+
+
+def resolve_database_path(database_url: str) -> Path:
+    """把 sqlite:/// 形式的 DATABASE_URL 解析成绝对文件路径
+
+    Args:
+        database_url: 配置中的数据库 URL，也可以直接是文件路径
+
+    Returns:
+        数据库文件的绝对路径，所在目录不存在时会被创建
+    """
+    raw = database_url.replace("sqlite:///", "", 1)
+    path = Path(raw)
+    if not path.is_absolute():
+        path = BACKEND_ROOT / path
+    path = path.resolve()
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"创建数据库目录: {path.parent}")
+    return path
+
+
+class SQLiteConnectionPool:
+    """所有工具共享的有界 SQLite 连接池
+
+    - 连接总数不超过 max_size，池满时调用方最多等待 timeout 秒
+    - 同一线程嵌套获取时直接复用已持有的连接；归还后优先把同一个连接
+      再分给该线程，使其预编译语句缓存保持命中
+    - 每个连接建立时设置 WAL 日志模式和 busy_timeout
+    """
+
+    def __init__(
+        self,
+        database: str,
+        *,
+        max_size: int = 8,
+        timeout: float = 10.0,
+        busy_timeout_ms: int = 5000,
+        journal_mode: str = "WAL",
+        cached_statements: int = 128,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size 必须大于 0")
+        self.database = str(database)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.journal_mode = journal_mode
+        self.cached_statements = cached_statements
+
+        self._cond = threading.Condition()
+        self._idle: list[sqlite3.Connection] = []
+        self._size = 0
+        self._closed = False
+        self._local = threading.local()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # 连接会在线程之间流转，但同一时刻只被一个线程持有
+            cached_statements=self.cached_statements,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        mode = conn.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()[0]
+        if mode.lower() == "wal":
+            # WAL 下 NORMAL 已能保证一致性，且省掉每次提交的 fsync
+            conn.execute("PRAGMA synchronous = NORMAL")
+        logger.debug(f"新建数据库连接: {self.database} (journal_mode={mode})")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """从池中取出一个连接，需要配合 release 使用"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("连接池已关闭")
+                preferred = getattr(self._local, "last", None)
+                if preferred is not None and any(c is preferred for c in self._idle):
+                    self._idle = [c for c in self._idle if c is not preferred]
+                    return preferred
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"等待数据库连接超时（{self.timeout}s，连接池大小 {self.max_size}）"
+                    )
+                self._cond.wait(remaining)
+
+        # 在锁外建立连接，避免阻塞其他线程归还连接
+        try:
+            return self._create_connection()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """把连接归还到池中，未提交的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # 连接已损坏，直接丢弃
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            conn.close()
+            return
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                conn.close()
+                return
+            self._idle.append(conn)
+            self._local.last = conn
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """以上下文管理器的方式借用连接
+
+        同一线程内嵌套调用会拿到同一个连接，只有最外层退出时才归还。
+        """
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self.acquire()
+        self._local.held = conn
+        try:
+            yield conn
+        finally:
+            self._local.held = None
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """借用连接并以 BEGIN IMMEDIATE 开启写事务，正常退出时提交，异常时回滚
+
+        一开始就取得写锁，避免先读后写的事务在升级锁时与其他写事务互相等待（SQLITE_BUSY），
+        读取与更新之间也不会被其他连接插入修改。已在事务中时（嵌套调用）由外层负责提交。
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def stats(self) -> dict:
+        """返回连接池当前状态，便于监控"""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+            }
+
+    def close(self) -> None:
+        """关闭所有空闲连接，借出的连接会在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+_pool: Optional[SQLiteConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SQLiteConnectionPool:
+    """获取全局连接池，首次调用时按 Settings 创建"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                path = resolve_database_path(settings.DATABASE_URL)
+                logger.info(f"初始化数据库连接池: {path} (大小 {settings.DB_POOL_SIZE})")
+                _pool = SQLiteConnectionPool(
+                    str(path),
+                    max_size=settings.DB_POOL_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    busy_timeout_ms=settings.DB_BUSY_TIMEOUT_MS,
+                    journal_mode=settings.DB_JOURNAL_MODE,
+                    cached_statements=settings.DB_STATEMENT_CACHE_SIZE,
+                )
+    return _pool
+
+
+def get_connection():
+    """从全局连接池借用连接的快捷方式，用法: with get_connection() as conn"""
+    return get_pool().connection()
+
+
+def write_transaction():
+    """在全局连接池上开启 BEGIN IMMEDIATE 写事务，用法: with write_transaction() as conn"""
+    return get_pool().transaction()
+
+
+def close_pool() -> None:
+    """关闭并丢弃全局连接池，下次 get_pool 时会按当前配置重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
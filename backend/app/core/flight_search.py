@@ -0,0 +1,167 @@
+"""按航线和起飞时间窗口搜索航班
+
+flights.scheduled_departure 是带时区的文本（如 2024-04-30 12:09:03.561731-04:00），按字符串比较
+既不能跨时区，也不能和 date 参数直接比较。启动时为 flights 增加虚拟生成列
+scheduled_departure_ts（UTC 秒数），查询条件统一换算成半开区间 [start, end) 的整数比较。
+
+每种过滤组合都有以 scheduled_departure_ts 结尾的索引，时间窗口是索引上的范围扫描，
+ORDER BY scheduled_departure_ts 直接沿索引顺序输出，只有同一时刻的航班需要按 flight_id 排序。
+"""
+import logging
+import sqlite3
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+DEPARTURE_TS = "scheduled_departure_ts"
+DEPARTURE_TS_DDL = (
+    f"ALTER TABLE flights ADD COLUMN {DEPARTURE_TS} INTEGER "
+    f"GENERATED ALWAYS AS (CAST(strftime('%s', scheduled_departure) AS INTEGER)) VIRTUAL"
+)
+
+# (是否按出发机场, 是否按到达机场) -> 应当使用的索引，索引本身在 app.core.schema.REQUIRED_INDEXES 中声明
+FLIGHT_SEARCH_INDEXES: dict[tuple[bool, bool], str] = {
+    (True, True): "idx_flights_route_departure",
+    (True, False): "idx_flights_origin_departure",
+    (False, True): "idx_flights_destination_departure",
+    (False, False): "idx_flights_departure",
+}
+
+TimeLike = Union[date, datetime, str, None]
+
+
+def ensure_departure_ts(conn: sqlite3.Connection, tables: dict[str, tuple[str, ...]]) -> bool:
+    """flights 缺少数值起飞时间列时添加（虚拟生成列，不需要回填和触发器）
+
+    Returns:
+        是否新增了该列
+    """
+    columns = tables.get("flights", ())
+    if DEPARTURE_TS in columns or "scheduled_departure" not in columns:
+        return False
+    with conn:
+        conn.execute(DEPARTURE_TS_DDL)
+    logger.info(f"已为 flights 添加数值起飞时间列 {DEPARTURE_TS}")
+    return True
+
+
+def _parse(value: TimeLike) -> Optional[Union[date, datetime]]:
+    if value is None or isinstance(value, (date, datetime)):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text) if len(text) > 10 else date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(
+            f"Invalid time {text!r}: expected an ISO 8601 date (2024-05-01) "
+            f"or datetime (2024-05-01T14:00:00+02:00)."
+        ) from None
+
+
+def to_epoch(value: TimeLike, *, end: bool = False) -> Optional[int]:
+    """把时间参数换算为 UTC 秒数，作为半开区间的一端
+
+    date 表示整天（按 UTC）：作为开始取当天 0 点，作为结束取次日 0 点；
+    不带时区的 datetime 按 UTC 处理，作为结束时包含这一秒。
+
+    Args:
+        value: date / datetime / ISO 字符串
+        end: 是否为区间结束
+
+    Returns:
+        秒数，value 为空时返回 None
+
+    Raises:
+        ValueError: value 不是 ISO 8601 日期或时间（如 "tomorrow"），错误信息说明了期望的格式
+    """
+    parsed = _parse(value)
+    if parsed is None:
+        return None
+    if isinstance(parsed, datetime):
+        moment = parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp()) + (1 if end else 0)
+    day = parsed + timedelta(days=1) if end else parsed
+    return int(datetime.combine(day, time(), tzinfo=timezone.utc).timestamp())
+
+
+def build_flight_search(
+    columns: Sequence[str],
+    departure_airport: Optional[str] = None,
+    arrival_airport: Optional[str] = None,
+    start_time: TimeLike = None,
+    end_time: TimeLike = None,
+    *,
+    numeric: bool = True,
+) -> tuple[str, list]:
+    """生成航班搜索 SQL（不含 LIMIT），按起飞时间和 flight_id 稳定排序
+
+    Args:
+        columns: 返回的列
+        departure_airport: 出发机场
+        arrival_airport: 到达机场
+        start_time: 最早起飞时间（含）
+        end_time: 最晚起飞时间（含；date 表示包含当天）
+        numeric: flights 是否有 scheduled_departure_ts 列，没有时退回文本比较
+
+    Returns:
+        (sql, params)
+
+    Raises:
+        ValueError: 时间参数无法解析，不能静默丢弃时间条件（否则会返回整张表中最早的航班）
+    """
+    start, end = to_epoch(start_time), to_epoch(end_time, end=True)
+    query = f"SELECT {', '.join(columns)} FROM flights WHERE 1 = 1"
+    params: list = []
+    if departure_airport:
+        query += " AND departure_airport = ?"
+        params.append(departure_airport)
+    if arrival_airport:
+        query += " AND arrival_airport = ?"
+        params.append(arrival_airport)
+
+    if not numeric:
+        # 旧库或只读库没有生成列：保持原来的文本比较
+        if start_time:
+            query += " AND scheduled_departure >= ?"
+            params.append(str(start_time))
+        if end_time:
+            query += " AND scheduled_departure <= ?"
+            params.append(str(end_time))
+        return query + " ORDER BY scheduled_departure, flight_id", params
+
+    if start is not None:
+        query += f" AND {DEPARTURE_TS} >= ?"
+        params.append(start)
+    if end is not None:
+        query += f" AND {DEPARTURE_TS} < ?"
+        params.append(end)
+    return query + f" ORDER BY {DEPARTURE_TS}, flight_id", params
+
+
+def verify_flight_plans(conn: sqlite3.Connection) -> dict[str, bool]:
+    """用 EXPLAIN QUERY PLAN 检查每种搜索组合是否走了对应的索引
+
+    Returns:
+        索引名 -> 计划中是否使用了该索引
+    """
+    results = {}
+    for (by_origin, by_destination), index in FLIGHT_SEARCH_INDEXES.items():
+        query, params = build_flight_search(
+            ("flight_id",),
+            "AAA" if by_origin else None,
+            "BBB" if by_destination else None,
+            date(2000, 1, 1),
+            date(2000, 1, 2),
+        )
+        try:
+            plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"无法检查航班搜索的查询计划: {str(e)}")
+            return {}
+        results[index] = f"INDEX {index}" in plan
+        if not results[index]:
+            logger.warning(f"航班搜索未使用索引 {index}: {plan}")
+    return results
@@ -0,0 +1,152 @@
+"""酒店、租车和旅游推荐的 FTS5 全文检索
+
+每张表对应一张外部内容（external content）的 FTS5 表 <table>_fts，以原表的 rowid 关联，
+由触发器在 INSERT / DELETE / 相关列 UPDATE 时增量维护，启动时缺失才整体重建。
+查询按列过滤、支持前缀匹配并按 bm25 排序；FTS5 不可用时退回原来的 LIKE 查询。
+"""
+import logging
+import re
+import sqlite3
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 表名 -> 建立全文索引的列
+FTS_TABLES: dict[str, tuple[str, ...]] = {
+    "hotels": ("name", "location"),
+    "car_rentals": ("name", "location"),
+    "trip_recommendations": ("name", "location", "keywords"),
+}
+
+_WORD_RE = re.compile(r"\w", re.UNICODE)
+
+
+def fts_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def _fts_ddl(table: str, columns: Sequence[str]) -> list[str]:
+    fts = fts_table(table)
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{col}" for col in columns)
+    old_values = ", ".join(f"old.{col}" for col in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+        f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values}); END",
+        # 只有索引列变化时才更新全文索引，预订状态、日期等更新不会触发
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def ensure_fts(conn: sqlite3.Connection, tables: dict[str, tuple[str, ...]]) -> list[str]:
+    """为缺少全文索引的表建立 FTS5 表和触发器
+
+    Args:
+        conn: 数据库连接
+        tables: 当前数据库的 表名 -> 列，用于跳过不存在的表和已建好的索引
+
+    Returns:
+        新建的 FTS 表名
+    """
+    created = []
+    for table, columns in FTS_TABLES.items():
+        if fts_table(table) in tables or not all(col in tables.get(table, ()) for col in columns):
+            continue
+        with conn:
+            for statement in _fts_ddl(table, columns):
+                conn.execute(statement)
+        created.append(fts_table(table))
+    if created:
+        logger.info(f"已建立全文索引: {', '.join(created)}")
+    return created
+
+
+def _phrase(text: str) -> Optional[str]:
+    """把用户输入变成带前缀匹配的 FTS5 短语，没有可检索的字符时返回 None"""
+    if not text or not _WORD_RE.search(text):
+        return None
+    return '"' + text.strip().replace('"', '""') + '"*'
+
+
+def match_expression(
+    text_filters: dict[str, Optional[str]],
+    any_filters: Optional[dict[str, Sequence[str]]] = None,
+) -> Optional[str]:
+    """构造 MATCH 表达式：各列之间为 AND，any_filters 中同一列的多个值为 OR
+
+    Args:
+        text_filters: 列 -> 查询文本（None 表示不过滤）
+        any_filters: 列 -> 多个候选文本，命中任意一个即可
+
+    Returns:
+        FTS5 查询表达式，没有任何可用条件时返回 None
+    """
+    clauses = []
+    for column, value in text_filters.items():
+        phrase = _phrase(value) if value else None
+        if phrase:
+            clauses.append(f"{column} : {phrase}")
+    for column, values in (any_filters or {}).items():
+        phrases = [p for p in (_phrase(v) for v in values) if p]
+        if phrases:
+            clauses.append(f"{column} : ({' OR '.join(phrases)})")
+    return " AND ".join(clauses) if clauses else None
+
+
+def build_search(
+    table: str,
+    text_filters: dict[str, Optional[str]],
+    any_filters: Optional[dict[str, Sequence[str]]] = None,
+    *,
+    where: Sequence[tuple[str, Sequence]] = (),
+    columns: Optional[Sequence[str]] = None,
+    use_fts: bool = True,
+) -> tuple[str, list]:
+    """生成搜索 SQL
+
+    有文本条件且全文索引可用时走 FTS5 并按相关度排序，否则使用 LIKE 子串匹配。
+    两种情况都以 rowid 作为次要排序，结果顺序稳定，可以按偏移量分页。
+
+    Args:
+        table: 原表名
+        text_filters: 列 -> 查询文本
+        any_filters: 列 -> 多个候选文本（OR）
+        where: 额外的 (sql 片段, 参数) 条件，片段中以表名引用原表的列
+        columns: 返回的列，默认为原表的全部列
+        use_fts: 全文索引是否可用
+
+    Returns:
+        (sql, params)
+    """
+    select = ", ".join(f"{table}.{col}" for col in columns) if columns else f"{table}.*"
+    extra = "".join(f" AND {condition}" for condition, _ in where)
+    extra_params = [param for _, condition_params in where for param in condition_params]
+
+    expression = match_expression(text_filters, any_filters) if use_fts else None
+    if expression:
+        fts = fts_table(table)
+        return (
+            f"SELECT {select} FROM {fts} JOIN {table} ON {table}.rowid = {fts}.rowid "
+            f"WHERE {fts} MATCH ?{extra} ORDER BY {fts}.rank, {table}.rowid",
+            [expression, *extra_params],
+        )
+
+    query = f"SELECT {select} FROM {table} WHERE 1=1{extra}"
+    params: list = list(extra_params)
+    for column, value in text_filters.items():
+        if value:
+            query += f" AND {column} LIKE ?"
+            params.append(f"%{value}%")
+    for column, values in (any_filters or {}).items():
+        values = [v for v in values if v]
+        if values:
+            query += " AND (" + " OR ".join(f"{column} LIKE ?" for _ in values) + ")"
+            params.extend(f"%{v}%" for v in values)
+    return query + f" ORDER BY {table}.rowid", params
@@ -0,0 +1,201 @@
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+from app.core.availability import ensure_calendar
+from app.core.database import get_connection
+from app.core.flight_search import DEPARTURE_TS, ensure_departure_ts, verify_flight_plans
+from app.core.fts import ensure_fts
+from app.core.table_versions import ensure_table_versions
+
+logger = logging.getLogger(__name__)
+
+# 工具依赖的表及其必需列，启动时校验一次
+REQUIRED_COLUMNS: dict[str, tuple[str, ...]] = {
+    "tickets": ("ticket_no", "book_ref", "passenger_id"),
+    "ticket_flights": ("ticket_no", "flight_id", "fare_conditions"),
+    "flights": (
+        "flight_id", "flight_no", "departure_airport", "arrival_airport",
+        "scheduled_departure", "scheduled_arrival",
+    ),
+    "boarding_passes": ("ticket_no", "flight_id", "seat_no"),
+    "hotels": ("id", "name", "location", "price_tier", "checkin_date", "checkout_date", "booked"),
+    "car_rentals": ("id", "name", "location", "price_tier", "start_date", "end_date", "booked"),
+    "trip_recommendations": ("id", "name", "location", "keywords", "details", "booked"),
+}
+
+# 工具热路径需要的索引: (索引名, 表名, 列)
+# 教程数据库由 pandas.to_sql 生成，原表上没有任何索引
+REQUIRED_INDEXES: list[tuple[str, str, tuple[str, ...]]] = [
+    ("idx_tickets_passenger", "tickets", ("passenger_id", "ticket_no")),
+    ("idx_ticket_flights_ticket", "ticket_flights", ("ticket_no", "flight_id")),
+    ("idx_flights_flight_id", "flights", ("flight_id",)),
+    # search_flights 的四种过滤组合，均以数值起飞时间结尾（见 app.core.flight_search）
+    ("idx_flights_route_departure", "flights", ("departure_airport", "arrival_airport", DEPARTURE_TS)),
+    ("idx_flights_origin_departure", "flights", ("departure_airport", DEPARTURE_TS)),
+    ("idx_flights_destination_departure", "flights", ("arrival_airport", DEPARTURE_TS)),
+    ("idx_flights_departure", "flights", (DEPARTURE_TS,)),
+    ("idx_boarding_passes_ticket_flight", "boarding_passes", ("ticket_no", "flight_id")),
+    # 搜索工具按价格档次（不区分大小写）和预订状态过滤
+    ("idx_hotels_price_tier_booked", "hotels", ("price_tier COLLATE NOCASE", "booked")),
+    ("idx_car_rentals_price_tier_booked", "car_rentals", ("price_tier COLLATE NOCASE", "booked")),
+    # 写工具按 ID 更新预订，原表没有主键；教程库每张表只有几行，生成的大库上没有索引就是全表扫描
+    ("idx_hotels_id", "hotels", ("id",)),
+    ("idx_car_rentals_id", "car_rentals", ("id",)),
+    ("idx_trip_recommendations_id", "trip_recommendations", ("id",)),
+]
+
+
+class SchemaRegistry:
+    """数据库表结构的只读快照，避免工具在每次调用时查询 sqlite_master"""
+
+    def __init__(self):
+        self._tables: dict[str, tuple[str, ...]] = {}
+        self._indexes: set[str] = set()
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """从数据库读取所有表、列和索引"""
+        tables: dict[str, tuple[str, ...]] = {}
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+            # table_xinfo 才包含生成列；hidden=1 是虚拟表的隐藏列，不计入
+            columns = conn.execute(f'PRAGMA table_xinfo("{name}")').fetchall()
+            tables[name] = tuple(col[1] for col in columns if col[6] != 1)
+        self._tables = tables
+        self._indexes = {
+            name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        }
+        self._loaded = True
+
+    def clear(self) -> None:
+        self._tables = {}
+        self._indexes = set()
+        self._loaded = False
+
+    def has_table(self, name: str) -> bool:
+        return name in self._tables
+
+    def has_index(self, name: str) -> bool:
+        return name in self._indexes
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in self._tables.get(table, ())
+
+    def columns(self, table: str) -> tuple[str, ...]:
+        return self._tables.get(table, ())
+
+    def tables(self) -> list[str]:
+        return sorted(self._tables)
+
+    def missing_columns(self, required: dict[str, tuple[str, ...]]) -> dict[str, list[str]]:
+        """返回缺失的表/列，缺表时列表为 ["*"]"""
+        missing: dict[str, list[str]] = {}
+        for table, columns in required.items():
+            if table not in self._tables:
+                missing[table] = ["*"]
+                continue
+            absent = [col for col in columns if col not in self._tables[table]]
+            if absent:
+                missing[table] = absent
+        return missing
+
+
+def _ensure_indexes(conn: sqlite3.Connection, registry: SchemaRegistry) -> None:
+    created = []
+    for name, table, columns in REQUIRED_INDEXES:
+        if registry.has_index(name) or not all(
+            col.split()[0] in registry.columns(table) for col in columns
+        ):
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    if created:
+        conn.commit()
+        logger.info(f"已创建索引: {', '.join(created)}")
+
+
+schema_registry = SchemaRegistry()
+_init_lock = threading.Lock()
+
+
+def prepare_schema(conn: sqlite3.Connection, registry: SchemaRegistry) -> None:
+    """读取表结构并补齐工具需要的生成列、索引、全文索引、可用性日历和表版本号
+
+    每一步失败只记录警告，工具会退回较慢的查询方式。
+
+    Args:
+        conn: 数据库连接
+        registry: 要填充的注册表
+    """
+    registry.load(conn)
+    try:
+        if ensure_departure_ts(conn, {table: registry.columns(table) for table in registry.tables()}):
+            registry.load(conn)
+    except sqlite3.OperationalError as e:
+        # SQLite 早于 3.31 不支持生成列，航班搜索退回文本比较
+        logger.warning(f"添加数值起飞时间列失败: {str(e)}")
+    try:
+        _ensure_indexes(conn, registry)
+    except sqlite3.OperationalError as e:
+        # 只读数据库等情况下不阻塞启动，查询仍然可以执行
+        logger.warning(f"创建索引失败: {str(e)}")
+    try:
+        ensure_fts(conn, {table: registry.columns(table) for table in registry.tables()})
+    except sqlite3.OperationalError as e:
+        # SQLite 未编译 FTS5 或数据库只读时，搜索工具退回 LIKE 查询
+        logger.warning(f"建立全文索引失败: {str(e)}")
+    try:
+        ensure_calendar(conn, {table: registry.columns(table) for table in registry.tables()})
+    except sqlite3.OperationalError as e:
+        # 没有日历时按日期搜索退回只看 booked 标记
+        logger.warning(f"建立可用性日历失败: {str(e)}")
+    try:
+        ensure_table_versions(conn)
+    except sqlite3.OperationalError as e:
+        # 没有版本表时只读工具不使用结果缓存
+        logger.warning(f"创建表版本号失败: {str(e)}")
+    registry.load(conn)
+
+
+def init_schema(registry: Optional[SchemaRegistry] = None) -> SchemaRegistry:
+    """启动时执行一次：读取表结构、校验工具依赖的列，补齐索引、全文索引、可用性日历和表版本号
+
+    Args:
+        registry: 要填充的注册表，默认为全局 schema_registry
+
+    Returns:
+        填充完成的 SchemaRegistry
+    """
+    registry = registry or schema_registry
+    with _init_lock:
+        if registry.loaded:
+            return registry
+        with get_connection() as conn:
+            prepare_schema(conn, registry)
+            if registry.has_column("flights", DEPARTURE_TS):
+                verify_flight_plans(conn)
+
+        logger.info(f"数据库表结构已加载，共 {len(registry.tables())} 张表")
+        for table in registry.tables():
+            logger.debug(f"- {table}: {', '.join(registry.columns(table))}")
+        for table, columns in registry.missing_columns(REQUIRED_COLUMNS).items():
+            logger.error(f"表 {table} 缺少工具依赖的列: {', '.join(columns)}")
+    return registry
+
+
+def get_schema() -> SchemaRegistry:
+    """获取已加载的表结构，未初始化时按需加载一次"""
+    if not schema_registry.loaded:
+        init_schema()
+    return schema_registry
+
+
+def reset_schema() -> None:
+    """清空缓存的表结构（切换数据库或测试时使用）"""
+    with _init_lock:
+        schema_registry.clear()
@@ -0,0 +1,387 @@
+"""确定性的旅行数据库生成器
+
+生成与教程 travel2.sqlite 表结构相同的 flights、tickets、ticket_flights、boarding_passes、hotels、
+car_rentals、trip_recommendations 七张表，不需要下载原库，也不访问网络。规模由机票数 rows
+决定（1 千到 1 千万），其余表按教程库的比例缩放：约 11 张机票对应一个航班，每张机票平均约 2.8 段航程，
+已开放值机的航段有登机牌；酒店、租车和旅游推荐各约 rows / 1000 条。
+
+键的分布接近真实数据：机场和城市按 Zipf 分布（枢纽机场的航班多），少数常旅客持有大量机票，
+联程航段从上一段的到达机场出发，舱位以经济舱为主。航班状态以时间窗口的中点为“当前时刻”生成。
+相同的 rows、seed 和 start 总是生成完全相同的数据；教程中的乘客 3442 587242 持有第一张机票。
+
+写入时关闭日志和同步（先写到临时文件，完成后再改名），每张表在事务中分批 executemany，
+数据写完后再由 prepare_schema 建立与服务启动时相同的索引、全文索引和日历。
+
+用法:
+    python -m app.core.synthetic_db --rows 100000 --out database/travel_100k.sqlite
+"""
+import argparse
+import bisect
+import itertools
+import logging
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+from app.core.schema import SchemaRegistry, prepare_schema
+
+logger = logging.getLogger(__name__)
+
+MIN_ROWS = 1_000
+MAX_ROWS = 10_000_000
+BATCH_SIZE = 50_000
+# 每个航班的座位数（60 排，每排 A-F）
+SEATS_PER_FLIGHT = 360
+
+TUTORIAL_PASSENGER_ID = "3442 587242"
+
+TABLES_DDL = """
+CREATE TABLE flights (
+    flight_id INTEGER, flight_no TEXT, scheduled_departure TEXT, scheduled_arrival TEXT,
+    departure_airport TEXT, arrival_airport TEXT, status TEXT, aircraft_code TEXT,
+    actual_departure TEXT, actual_arrival TEXT
+);
+CREATE TABLE tickets (ticket_no TEXT, book_ref TEXT, passenger_id TEXT);
+CREATE TABLE ticket_flights (ticket_no TEXT, flight_id INTEGER, fare_conditions TEXT, amount REAL);
+CREATE TABLE boarding_passes (ticket_no TEXT, flight_id INTEGER, boarding_no INTEGER, seat_no TEXT);
+CREATE TABLE hotels (
+    id INTEGER, name TEXT, location TEXT, price_tier TEXT,
+    checkin_date TEXT, checkout_date TEXT, booked INTEGER
+);
+CREATE TABLE car_rentals (
+    id INTEGER, name TEXT, location TEXT, price_tier TEXT,
+    start_date TEXT, end_date TEXT, booked INTEGER
+);
+CREATE TABLE trip_recommendations (
+    id INTEGER, name TEXT, location TEXT, keywords TEXT, details TEXT, booked INTEGER
+);
+"""
+
+# 批量写入期间的 PRAGMA：数据写完前崩溃只需删除临时文件重来
+FAST_PRAGMAS = (
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA locking_mode = EXCLUSIVE",
+)
+
+# (机场代码, 城市, UTC 偏移小时)，按繁忙程度排序，权重为 1 / 名次（Zipf）
+AIRPORTS: tuple[tuple[str, str, int], ...] = (
+    ("ZRH", "Zurich", 2), ("CDG", "Paris", 2), ("FRA", "Frankfurt", 2), ("LHR", "London", 1),
+    ("AMS", "Amsterdam", 2), ("MUC", "Munich", 2), ("GVA", "Geneva", 2), ("BSL", "Basel", 2),
+    ("VIE", "Vienna", 2), ("MAD", "Madrid", 2), ("BCN", "Barcelona", 2), ("FCO", "Rome", 2),
+    ("MXP", "Milan", 2), ("BRU", "Brussels", 2), ("CPH", "Copenhagen", 2), ("DUB", "Dublin", 1),
+    ("LIS", "Lisbon", 1), ("PRG", "Prague", 2), ("WAW", "Warsaw", 2), ("ATH", "Athens", 3),
+    ("IST", "Istanbul", 3), ("JFK", "New York", -4), ("ORD", "Chicago", -5), ("BOS", "Boston", -4),
+    ("YUL", "Montreal", -4), ("DXB", "Dubai", 4), ("SIN", "Singapore", 8), ("HKG", "Hong Kong", 8),
+    ("NRT", "Tokyo", 9), ("BKK", "Bangkok", 7), ("LUG", "Lugano", 2), ("BRN", "Bern", 2),
+)
+AIRCRAFT = ("320", "321", "319", "CR2", "773", "SU9", "733", "763", "CN1")
+# (舱位, 占比, 每小时航程的基准票价)
+FARES = (("Economy", 0.80, 90.0), ("Comfort", 0.12, 160.0), ("Business", 0.08, 320.0))
+# 每张机票的航段数及占比，平均约 2.85 段
+LEG_WEIGHTS = ((1, 0.10), (2, 0.30), (3, 0.25), (4, 0.35))
+PRICE_TIERS = (("Midscale", 0.35), ("Upper Midscale", 0.25), ("Upscale", 0.2), ("Upper Upscale", 0.1),
+               ("Luxury", 0.1))
+CAR_TIERS = (("Economy", 0.4), ("Midsize", 0.3), ("Premium", 0.2), ("Luxury", 0.1))
+HOTEL_BRANDS = ("Hilton", "Marriott", "Hyatt", "Radisson", "Sheraton", "Holiday Inn", "Best Western",
+                "Novotel", "Ibis", "Four Seasons", "InterContinental", "Mövenpick")
+CAR_BRANDS = ("Europcar", "Avis", "Hertz", "Sixt", "Enterprise", "Budget", "Thrifty", "National")
+# 旅游推荐：(名称, 关键词)
+EXCURSIONS = (
+    ("Old Town Walk", "history, architecture"), ("Art Museum", "art, museum"),
+    ("History Museum", "history, museum"), ("Lake Cruise", "lake, relaxation"),
+    ("Food Tour", "food, market"), ("Mountain Hike", "hiking, nature"),
+    ("Cathedral Visit", "landmark, history"), ("Wine Tasting", "wine, food"),
+    ("Science Museum", "science, museum, family"), ("River Boat Tour", "river, sightseeing"),
+)
+DISTRICTS = ("Central", "Airport", "Old Town", "Station", "Riverside", "Park", "Lakeside", "North", "South")
+
+
+def _cumulative(weights: Sequence[float]) -> list[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _pick(rng: random.Random, cumulative: list[float]) -> int:
+    """按累计权重抽取下标"""
+    return bisect.bisect(cumulative, rng.random() * cumulative[-1])
+
+
+AIRPORT_WEIGHTS = _cumulative([1 / rank for rank in range(1, len(AIRPORTS) + 1)])
+FARE_WEIGHTS = _cumulative([share for _, share, _ in FARES])
+LEG_CUMULATIVE = _cumulative([share for _, share in LEG_WEIGHTS])
+TIER_WEIGHTS = _cumulative([share for _, share in PRICE_TIERS])
+CAR_TIER_WEIGHTS = _cumulative([share for _, share in CAR_TIERS])
+
+
+def passenger_id(index: int) -> str:
+    """第 index 位乘客的 ID（"dddd dddddd"），乘法置换保证不同下标不重复"""
+    n = (index * 2654435761 + 1234567) % 10**10
+    return f"{n // 10**6:04d} {n % 10**6:06d}"
+
+
+def ticket_no(index: int) -> str:
+    return f"{7240000000000000 + index:016d}"
+
+
+def _timestamp(moment: datetime, offset_hours: int) -> str:
+    """教程库的格式：当地时间 + 微秒 + UTC 偏移，如 2024-04-30 12:09:03.000000+02:00"""
+    local = moment + timedelta(hours=offset_hours)
+    sign = "+" if offset_hours >= 0 else "-"
+    return f"{local:%Y-%m-%d %H:%M:%S}.000000{sign}{abs(offset_hours):02d}:00"
+
+
+def _duration_minutes(origin: int, destination: int) -> int:
+    """同一航线的飞行时间固定：时区差越大越远"""
+    hours_apart = abs(AIRPORTS[origin][2] - AIRPORTS[destination][2])
+    return 50 + 55 * hours_apart + (origin * 31 + destination * 17) % 90
+
+
+class _Flights:
+    """生成航班，并保留后续生成航段和登机牌所需的信息"""
+
+    def __init__(self, rng: random.Random, count: int, start: datetime, days: int):
+        self.count = count
+        self.now = start + timedelta(days=days / 2)
+        self.origin: list[int] = []
+        self.destination: list[int] = []
+        self.departure: list[datetime] = []
+        self.minutes: list[int] = []
+        self.cancelled: list[bool] = []
+        self.by_origin: dict[int, list[int]] = {}
+        self._rng = rng
+        self._start = start
+        self._days = days
+
+    def rows(self) -> Iterator[tuple]:
+        rng = self._rng
+        for flight_id in range(1, self.count + 1):
+            origin = _pick(rng, AIRPORT_WEIGHTS)
+            destination = _pick(rng, AIRPORT_WEIGHTS)
+            while destination == origin:
+                destination = _pick(rng, AIRPORT_WEIGHTS)
+            departure = self._start + timedelta(days=rng.randrange(self._days), minutes=rng.randrange(300, 1380, 5))
+            minutes = _duration_minutes(origin, destination)
+            arrival = departure + timedelta(minutes=minutes)
+            self.origin.append(origin)
+            self.destination.append(destination)
+            self.departure.append(departure)
+            self.minutes.append(minutes)
+            self.by_origin.setdefault(origin, []).append(flight_id)
+
+            status, actual_departure, actual_arrival = self._status(departure, arrival)
+            self.cancelled.append(status == "Cancelled")
+            origin_offset, destination_offset = AIRPORTS[origin][2], AIRPORTS[destination][2]
+            yield (
+                flight_id,
+                f"LX{100 + (origin * 37 + destination) % 9000:04d}",
+                _timestamp(departure, origin_offset),
+                _timestamp(arrival, destination_offset),
+                AIRPORTS[origin][0],
+                AIRPORTS[destination][0],
+                status,
+                AIRCRAFT[(origin + destination) % len(AIRCRAFT)],
+                actual_departure and _timestamp(actual_departure, origin_offset),
+                actual_arrival and _timestamp(actual_arrival, destination_offset),
+            )
+
+    def _status(self, departure: datetime, arrival: datetime) -> tuple[str, Optional[datetime], Optional[datetime]]:
+        rng = self._rng
+        roll = rng.random()
+        if roll < 0.01:
+            return "Cancelled", None, None
+        delay = timedelta(minutes=rng.randrange(0, 45) if roll < 0.2 else rng.randrange(-5, 10))
+        if arrival + delay <= self.now:
+            return "Arrived", departure + delay, arrival + delay
+        if departure + delay <= self.now:
+            return "Departed", departure + delay, None
+        if departure - self.now <= timedelta(days=1):
+            return ("Delayed" if roll < 0.05 else "On Time"), None, None
+        return "Scheduled", None, None
+
+
+def _ticket_batches(
+    rng: random.Random, rows: int, flights: _Flights
+) -> Iterator[tuple[list[tuple], list[tuple], list[tuple]]]:
+    """按批生成 (tickets, ticket_flights, boarding_passes)
+
+    这是生成大库时最热的循环：随机下标用 int(random() * n) 代替 randrange，航程和值机状态预先算好。
+    """
+    passengers = max(1, rows * 2 // 3)
+    # 值机在起飞前 24 小时开放，之前的航段才有登机牌；取消的航班没有登机牌
+    check_in_until = flights.now + timedelta(days=1)
+    checked_in = [
+        departure <= check_in_until and not cancelled
+        for departure, cancelled in zip(flights.departure, flights.cancelled)
+    ]
+    onward_flights = [flights.by_origin.get(destination) for destination in flights.destination]
+    random_ = rng.random
+    boarded: dict[int, int] = {}
+    booking = 0
+    tickets, legs, passes = [], [], []
+    for index in range(rows):
+        if index == 0:
+            owner = TUTORIAL_PASSENGER_ID
+        else:
+            # 少数常旅客持有大量机票：下标越小越常出行
+            owner = passenger_id(int(passengers * random_() ** 2.5))
+        # 同一预订中平均约 1.5 张机票
+        if random_() < 0.65:
+            booking += 1
+        number = ticket_no(index)
+        tickets.append((number, f"{booking * 2654435761 % 16**6:06X}", owner))
+
+        fare, _, hourly = FARES[_pick(rng, FARE_WEIGHTS)]
+        i = int(random_() * flights.count)
+        ticket_flights: list[int] = []
+        for _ in range(LEG_WEIGHTS[_pick(rng, LEG_CUMULATIVE)][0]):
+            flight_id = i + 1
+            ticket_flights.append(flight_id)
+            amount = round(hourly * flights.minutes[i] / 60 * (0.8 + 0.4 * random_()), -1)
+            legs.append((number, flight_id, fare, amount))
+            # 座位坐满后不再发登机牌，座位号不会重复
+            if checked_in[i] and boarded.get(flight_id, 0) < SEATS_PER_FLIGHT:
+                seat = boarded[flight_id] = boarded.get(flight_id, 0) + 1
+                passes.append((number, flight_id, seat, f"{1 + (seat - 1) // 6}{'ABCDEF'[(seat - 1) % 6]}"))
+            # 联程：下一段从这一段的到达机场出发；选到本张机票已有的航班（A→B→A→B）时到此为止
+            onward = onward_flights[i]
+            if not onward:
+                break
+            i = onward[int(random_() * len(onward))] - 1
+            if i + 1 in ticket_flights:
+                break
+
+        if len(tickets) >= BATCH_SIZE:
+            yield tickets, legs, passes
+            tickets, legs, passes = [], [], []
+    if tickets:
+        yield tickets, legs, passes
+
+
+def _city(rng: random.Random) -> str:
+    return AIRPORTS[_pick(rng, AIRPORT_WEIGHTS)][1]
+
+
+def _stay(rng: random.Random, start: date, days: int) -> tuple[str, str]:
+    begin = start + timedelta(days=rng.randrange(days))
+    return begin.isoformat(), (begin + timedelta(days=rng.randint(1, 14))).isoformat()
+
+
+def _hotels(rng: random.Random, count: int, start: date, days: int) -> Iterator[tuple]:
+    for hotel_id in range(1, count + 1):
+        city = _city(rng)
+        name = f"{rng.choice(HOTEL_BRANDS)} {city} {rng.choice(DISTRICTS)}"
+        checkin, checkout = _stay(rng, start, days)
+        tier = PRICE_TIERS[_pick(rng, TIER_WEIGHTS)][0]
+        yield hotel_id, name, city, tier, checkin, checkout, int(rng.random() < 0.1)
+
+
+def _car_rentals(rng: random.Random, count: int, start: date, days: int) -> Iterator[tuple]:
+    for rental_id in range(1, count + 1):
+        city = _city(rng)
+        begin, end = _stay(rng, start, days)
+        tier = CAR_TIERS[_pick(rng, CAR_TIER_WEIGHTS)][0]
+        yield rental_id, rng.choice(CAR_BRANDS), city, tier, begin, end, int(rng.random() < 0.1)
+
+
+def _trip_recommendations(rng: random.Random, count: int) -> Iterator[tuple]:
+    for recommendation_id in range(1, count + 1):
+        city = _city(rng)
+        name, keywords = rng.choice(EXCURSIONS)
+        details = f"{name} in {city}: a {keywords.split(',')[0]} experience, about {rng.randint(1, 6)} hours."
+        yield recommendation_id, f"{city} {name}", city, keywords, details, int(rng.random() < 0.05)
+
+
+def generate_travel_db(
+    path: Path,
+    rows: int,
+    seed: int = 0,
+    start: date = date(2024, 4, 1),
+    overwrite: bool = False,
+) -> dict[str, int]:
+    """生成旅行数据库
+
+    Args:
+        path: 输出文件
+        rows: 机票数（MIN_ROWS 到 MAX_ROWS），其余表按比例缩放
+        seed: 随机种子
+        start: 航班时间窗口的第一天
+        overwrite: 文件已存在时是否覆盖
+
+    Returns:
+        各表的行数
+    """
+    if not MIN_ROWS <= rows <= MAX_ROWS:
+        raise ValueError(f"rows 应在 {MIN_ROWS} 到 {MAX_ROWS} 之间: {rows}")
+    path = Path(path)
+    if path.exists() and not overwrite:
+        raise FileExistsError(f"数据库已存在: {path}")
+
+    rng = random.Random(seed)
+    flight_count = max(100, rows // 11)
+    # 每天约 100 个以上航班，窗口在 2 周到 1 年之间
+    days = max(14, min(365, flight_count // 100))
+    catalog = max(10, rows // 1000)
+    begin = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    conn = sqlite3.connect(tmp)
+    try:
+        for pragma in FAST_PRAGMAS:
+            conn.execute(pragma)
+        conn.executescript(TABLES_DDL)
+        with conn:
+            flights = _Flights(rng, flight_count, begin, days)
+            conn.executemany("INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", flights.rows())
+            for tickets, legs, passes in _ticket_batches(rng, rows, flights):
+                conn.executemany("INSERT INTO tickets VALUES (?, ?, ?)", tickets)
+                conn.executemany("INSERT INTO ticket_flights VALUES (?, ?, ?, ?)", legs)
+                conn.executemany("INSERT INTO boarding_passes VALUES (?, ?, ?, ?)", passes)
+            conn.executemany("INSERT INTO hotels VALUES (?, ?, ?, ?, ?, ?, ?)", _hotels(rng, catalog, start, days))
+            conn.executemany(
+                "INSERT INTO car_rentals VALUES (?, ?, ?, ?, ?, ?, ?)", _car_rentals(rng, catalog, start, days)
+            )
+            conn.executemany(
+                "INSERT INTO trip_recommendations VALUES (?, ?, ?, ?, ?, ?)", _trip_recommendations(rng, catalog)
+            )
+        logger.info(f"数据写入完成，用时 {time.perf_counter() - started:.1f} 秒，开始建立索引")
+
+        registry = SchemaRegistry()
+        prepare_schema(conn, registry)
+        conn.execute("ANALYZE")
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("flights", "tickets", "ticket_flights", "boarding_passes",
+                          "hotels", "car_rentals", "trip_recommendations")
+        }
+    finally:
+        conn.close()
+    tmp.replace(path)
+    logger.info(f"已生成 {path}（{time.perf_counter() - started:.1f} 秒）: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="生成确定性的旅行数据库")
+    parser.add_argument("--rows", type=int, default=100_000, help=f"机票数（{MIN_ROWS} 到 {MAX_ROWS}）")
+    parser.add_argument("--out", type=Path, default=Path("database/travel_synthetic.sqlite"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2024, 4, 1), help="航班时间窗口的第一天")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    counts = generate_travel_db(args.out, args.rows, seed=args.seed, start=args.start, overwrite=args.force)
+    for table, count in counts.items():
+        print(f"{table:<22} {count:>12,}")
+
+
+if __name__ == "__main__":
+    main()
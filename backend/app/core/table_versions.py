@@ -0,0 +1,57 @@
+"""按表的数据版本号
+
+写工具在修改数据的同一个写事务中调用 bump_versions，递增被修改表的版本号；只读工具的结果缓存
+把所依赖表的当前版本放进缓存键，版本变化后旧条目不会再命中，随后被 LRU 淘汰。
+版本号存放在数据库中，多个 worker 看到的是同一份，事务回滚时版本号也一起回滚。
+"""
+import logging
+import sqlite3
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_TABLE = "table_versions"
+
+VERSIONS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def ensure_table_versions(conn: sqlite3.Connection) -> None:
+    """创建版本表（启动时执行一次）"""
+    with conn:
+        conn.execute(VERSIONS_DDL)
+
+
+def bump_versions(conn: sqlite3.Connection, *tables: str) -> None:
+    """在当前事务中递增各表的版本号；没有版本表（如只读库）时不做任何事"""
+    try:
+        conn.executemany(
+            f"INSERT INTO {VERSIONS_TABLE} (name, version) VALUES (?, 1) "
+            f"ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            [(table,) for table in tables],
+        )
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+
+
+def read_versions(conn: sqlite3.Connection, tables: Sequence[str]) -> Optional[tuple[int, ...]]:
+    """读取各表的当前版本号（从未修改过的表为 0）
+
+    Returns:
+        与 tables 一一对应的版本号，没有版本表时返回 None（调用方应跳过缓存）
+    """
+    if not tables:
+        return ()
+    placeholders = ", ".join("?" for _ in tables)
+    try:
+        rows = dict(conn.execute(
+            f"SELECT name, version FROM {VERSIONS_TABLE} WHERE name IN ({placeholders})", list(tables)
+        ).fetchall())
+    except sqlite3.OperationalError:
+        return None
+    return tuple(rows.get(table, 0) for table in tables)
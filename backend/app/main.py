@@ -1,17 +1,55 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import settings
+from app.core.database import close_pool
+from app.core.schema import init_schema
 from app.routers import customer_router
 import logging
 
 # 配置日志
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=settings.LOG_LEVEL.upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
 logger = logging.getLogger(__name__)
 
+async def _background_tasks():
+    """预热对话图，然后定期淘汰空闲会话、压缩旧检查点"""
+    interval = settings.CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS
+    if settings.PRELOAD_GRAPH:
+        await customer_router.aget_graph()
+        logger.info("对话图已构建")
+    # 未预热时等到图被首次使用后再开始维护
+    while customer_router.graph is None:
+        await asyncio.sleep(interval)
+    from app.services.customer_support.checkpointer import run_maintenance
+
+    await run_maintenance(customer_router.graph.checkpointer, interval)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时校验一次数据库表结构并补齐索引，工具调用时不再重复检查
+    init_schema()
+    # 图在后台构建，不阻塞 worker 开始接受连接
+    background = asyncio.create_task(_background_tasks())
+    yield
+    background.cancel()
+    with suppress(asyncio.CancelledError):
+        await background
+    if customer_router.graph is not None:
+        from app.services.customer_support.checkpointer import flush_checkpointer
+
+        await flush_checkpointer(customer_router.graph.checkpointer)
+    close_pool()
+
 # 创建 FastAPI 应用实例
 app = FastAPI(
     title="客服支持系统 API",
     description="客服聊天和操作确认的 API 接口",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -29,6 +67,10 @@ app.include_router(
     prefix="/api/v1",
     tags=["customer-support"]
 )
+app.include_router(
+    customer_router.ws_router,
+    tags=["customer-support"]
+)
 
 if __name__ == "__main__":
     import uvicorn
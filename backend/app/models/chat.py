@@ -9,13 +9,18 @@ class ChatMessage(BaseModel):
     tool_calls: Optional[List[Dict]] = None
 
 class ChatRequest(BaseModel):
+    # 继续已有会话时只需发送新的用户消息；发送完整记录也可以，服务端只追加末尾的用户消息
     messages: List[ChatMessage]
     passenger_id: Optional[str] = None
+    thread_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     requires_confirmation: bool = False
     action_details: Optional[dict] = None
+    thread_id: Optional[str] = None
+    # 本轮模型调用的 token 用量（含提示缓存的读取、写入），模型未返回用量时为空
+    usage: Optional[Dict[str, int]] = None
 
 class ToolCall(BaseModel):
     id: str
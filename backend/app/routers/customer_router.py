@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from app.models.chat import ChatRequest, ChatResponse
-from app.services.customer_support.graph import create_customer_support_graph
-from langchain_core.messages import ToolMessage, HumanMessage, AIMessage
+import asyncio
+import contextlib
+import json
+import logging
+import threading
 import uuid
-import shutil
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 # Example conversation data
 tutorial_questions = [
     "Hi there, what time is my flight?",
@@ -26,15 +31,160 @@ tutorial_questions = [
 
 # 第五部分 - API路由
 router = APIRouter()
-graph = create_customer_support_graph()
+# 挂在根路径下的路由：WebSocket（ws://host/chat/{passenger_id}）和 Prometheus 的 /metrics
+ws_router = APIRouter()
+
+# 对话图在首次使用（或应用启动后的预热）时才构建：构建过程需要导入 LangGraph、
+# LLM 客户端和全部工具模块，放在模块导入阶段会拖慢 worker 启动
+graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """返回全局对话图，首次调用时构建"""
+    global graph
+    if graph is None:
+        with _graph_lock:
+            if graph is None:
+                from app.services.customer_support.graph import create_customer_support_graph
+
+                graph = create_customer_support_graph()
+    return graph
+
+async def aget_graph():
+    """异步版本：构建放到线程中执行，不阻塞事件循环"""
+    if graph is not None:
+        return graph
+    return await asyncio.to_thread(get_graph)
+
+async def _flush(graph) -> None:
+    from app.services.customer_support.checkpointer import flush_checkpointer
+
+    await flush_checkpointer(graph.checkpointer)
+
+DEFAULT_PASSENGER_ID = "3442 587242"
 
 def _convert_messages(messages):
+    from langchain_core.messages import AIMessage, HumanMessage
+
     return [
         HumanMessage(content=msg.content) if msg.role == "user"
         else AIMessage(content=msg.content)
         for msg in messages
     ]
 
+def _thread_config(thread_id: str, passenger_id: str) -> dict:
+    return {
+        "configurable": {
+            "passenger_id": passenger_id,
+            "thread_id": thread_id,
+        }
+    }
+
+def _with_deadline(config: dict) -> dict:
+    """给 config 加上整个请求的截止时间，助手据此限制每次 LLM 调用和重试"""
+    from app.services.customer_support.retry import with_deadline
+
+    return with_deadline(config)
+
+def _run_config(config: dict) -> dict:
+    """执行图时使用的 config：加上请求截止时间，开启指标时挂上指标回调"""
+    from app.core.config import settings
+
+    config = _with_deadline(config)
+    if settings.METRICS_ENABLED:
+        from app.services.customer_support.instrumentation import metrics_callback
+
+        config["callbacks"] = [metrics_callback]
+    return config
+
+async def _invoke(graph, inputs, config):
+    """在请求总时限内执行一轮对话，超时返回 504"""
+    from app.core.config import settings
+
+    try:
+        return await asyncio.wait_for(
+            graph.ainvoke(inputs, _run_config(config)), settings.CHAT_REQUEST_TIMEOUT_SECONDS
+        )
+    except TimeoutError as e:
+        logger.warning(f"对话 {config['configurable']['thread_id']} 超过请求时限: {str(e)}")
+        raise HTTPException(status_code=504, detail="对话请求超时，请稍后重试")
+
+def _new_turns(messages):
+    """取出末尾连续的用户消息，即本轮新增的输入"""
+    start = len(messages)
+    while start > 0 and messages[start - 1].role == "user":
+        start -= 1
+    return messages[start:]
+
+async def _prepare_turn(graph, request: ChatRequest):
+    """确定会话线程，返回 (config, 本轮要追加到会话的消息, 是否为新会话)
+
+    没有 thread_id 或线程尚无检查点时新建会话，请求中的消息全部作为初始上下文；
+    线程已存在时历史由检查点提供，只追加新的用户消息。
+    """
+    thread_id = request.thread_id or str(uuid.uuid4())
+    checkpoint = None
+    if request.thread_id:
+        checkpoint = await graph.checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+
+    if checkpoint is None:
+        passenger_id = request.passenger_id or DEFAULT_PASSENGER_ID
+        return _thread_config(thread_id, passenger_id), _convert_messages(request.messages), True
+
+    # 检查点元数据中记录了创建会话时的 passenger_id
+    owner = checkpoint.metadata.get("passenger_id")
+    if request.passenger_id and owner and request.passenger_id != owner:
+        raise HTTPException(status_code=403, detail="会话不属于该乘客")
+    messages = _new_turns(request.messages)
+    if not messages:
+        raise HTTPException(status_code=400, detail="请求中没有新的用户消息")
+    passenger_id = owner or request.passenger_id or DEFAULT_PASSENGER_ID
+    return _thread_config(thread_id, passenger_id), _convert_messages(messages), False
+
+def _cacheable_question(messages, is_new: bool):
+    """新会话的单个问题才查询语义响应缓存，后续轮次的回答依赖上下文"""
+    from app.core.config import settings
+
+    if not (is_new and settings.RESPONSE_CACHE_ENABLED):
+        return None
+    from app.services.customer_support.response_cache import first_question
+
+    return first_question(messages)
+
+async def _cached_answer(graph, config, new_messages, question: str):
+    """命中语义响应缓存时把问答写入会话（后续轮次照常进行）并返回回答，未命中返回 None"""
+    from langchain_core.messages import AIMessage
+    from app.services.customer_support.response_cache import get_response_cache
+
+    try:
+        answer = await get_response_cache().alookup(question)
+    except Exception as e:
+        # 缓存只是加速手段，嵌入器不可用时照常执行对话
+        logger.warning(f"语义响应缓存不可用: {str(e)}")
+        return None
+    if answer is None:
+        return None
+    await graph.aupdate_state(
+        config, {"messages": [*new_messages, AIMessage(content=answer)]}, as_node="assistant"
+    )
+    await _flush(graph)
+    return answer
+
+async def _remember_answer(question: str, messages, config) -> None:
+    """本轮只调用了非个人工具、回答中也没有乘客信息时写入语义响应缓存"""
+    from langchain_core.messages import HumanMessage
+    from app.services.customer_support.graph import SHARED_TOOLS
+    from app.services.customer_support.response_cache import get_response_cache, shareable_answer
+
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    answer = shareable_answer(messages[start + 1:], SHARED_TOOLS, config["configurable"]["passenger_id"])
+    if answer is None:
+        return
+    try:
+        await get_response_cache().astore(question, answer)
+    except Exception as e:
+        logger.warning(f"写入语义响应缓存失败: {str(e)}")
+
 def _process_result(messages):
     response = ""
     requires_confirmation = False
@@ -56,32 +206,42 @@ def _process_result(messages):
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        thread_id = str(uuid.uuid4())
-        converted_messages = _convert_messages(request.messages)
-        
-        config = {
-            "configurable": {
-                "passenger_id": "3442 587242",
-                "thread_id": thread_id,
-            }
-        }
-        
+        graph = await aget_graph()
+        config, new_messages, is_new = await _prepare_turn(graph, request)
+        question = _cacheable_question(new_messages, is_new)
+        if question:
+            cached = await _cached_answer(graph, config, new_messages, question)
+            if cached is not None:
+                return ChatResponse(response=cached, thread_id=config["configurable"]["thread_id"])
         
-        result = graph.invoke(
-            {"messages": converted_messages, "dialog_state": ["assistant"]},
+        result = await _invoke(
+            graph,
+            {"messages": new_messages, "dialog_state": ["assistant"]},
             config
         )
+        await _flush(graph)
         
         response, requires_confirmation, action_details = _process_result(result.get("messages"))
+        from app.services.customer_support.prompt_cache import turn_usage
+
+        usage = turn_usage(result.get("messages") or [])
+        if usage:
+            logger.info(f"对话 {config['configurable']['thread_id']} 本轮 token 用量: {usage}")
+        if question:
+            await _remember_answer(question, result.get("messages") or [], config)
         
         return ChatResponse(
             response=response,
             requires_confirmation=requires_confirmation,
             action_details=action_details,
-            ai_message=result.get("messages") if isinstance(result.get("messages"), AIMessage) else None,
+            thread_id=config["configurable"]["thread_id"],
+            usage=usage,
+            ai_message=result.get("messages") if getattr(result.get("messages"), "type", None) == "ai" else None,
             tool_calls=getattr(result.get("messages"), "tool_calls", None)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -93,17 +253,22 @@ async def confirm_action(
     confirmed: bool,
     feedback: Optional[str] = None
 ):
+    graph = await aget_graph()
+    checkpoint = await graph.checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail=f"会话不存在: {thread_id}")
     try:
-        config = {
-            "configurable": {
-                "thread_id": thread_id
-            }
-        }
+        config = _thread_config(
+            thread_id, checkpoint.metadata.get("passenger_id") or DEFAULT_PASSENGER_ID
+        )
         
         if confirmed:
-            result = graph.invoke(None, config)
+            result = await _invoke(graph, None, config)
         else:
-            result = graph.invoke(
+            from langchain_core.messages import ToolMessage
+
+            result = await _invoke(
+                graph,
                 {
                     "messages": [
                         ToolMessage(
@@ -114,8 +279,121 @@ async def confirm_action(
                 },
                 config
             )
+        await _flush(graph)
             
-        return {"status": "success", "result": result}
+        return {"status": "success", "thread_id": thread_id, "result": result}
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _format_sse(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+async def _chat_events(graph, inputs, config):
+    """推送图执行中的 token / 工具事件，结束时补充确认请求和最终回复
+
+    与非流式接口相同，整轮对话受 CHAT_REQUEST_TIMEOUT_SECONDS 限制。时限只作用于等待下一个事件，
+    不跨越 yield（否则超时会取消正在发送事件的调用方）。
+    """
+    from app.core.config import settings
+    from app.services.customer_support.streaming import stream_graph_events
+
+    thread_id = config["configurable"]["thread_id"]
+    deadline = asyncio.get_running_loop().time() + settings.CHAT_REQUEST_TIMEOUT_SECONDS
+    try:
+        async with contextlib.aclosing(stream_graph_events(graph, inputs, _run_config(config))) as stream:
+            while True:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        event = await anext(stream)
+                except StopAsyncIteration:
+                    break
+                yield event
+    except TimeoutError:
+        logger.warning(f"对话 {thread_id} 超过请求时限")
+        yield {"type": "error", "thread_id": thread_id, "detail": "对话请求超时，请稍后重试"}
+        return
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error(f"流式对话出错: {str(e)}")
+        yield {"type": "error", "thread_id": thread_id, "detail": str(e)}
+        return
+
+    snapshot = await graph.aget_state(config)
+    response, requires_confirmation, action_details = _process_result(
+        snapshot.values.get("messages")
+    )
+    if requires_confirmation:
+        yield {
+            "type": "confirmation",
+            "thread_id": thread_id,
+            "action_details": action_details,
+        }
+    yield {
+        "type": "end",
+        "thread_id": thread_id,
+        "response": response,
+        "requires_confirmation": requires_confirmation,
+    }
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """以 Server-Sent Events 的形式流式返回对话"""
+    graph = await aget_graph()
+    config, new_messages, _ = await _prepare_turn(graph, request)
+    inputs = {"messages": new_messages}
+
+    async def event_source():
+        # 客户端断开时 Starlette 会关闭该生成器，aclosing 保证 stream_graph_events 随之取消图的执行
+        async with contextlib.aclosing(_chat_events(graph, inputs, config)) as events:
+            async for event in events:
+                yield _format_sse(event)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@ws_router.websocket("/chat/{passenger_id}")
+async def chat_websocket(websocket: WebSocket, passenger_id: str, thread_id: Optional[str] = None):
+    """WebSocket 对话：每条文本消息是一轮用户输入，同一连接内共享一个会话线程
+
+    传入 ?thread_id=... 时继续已有会话（例如断线重连）。
+    """
+    from langchain_core.messages import HumanMessage
+
+    await websocket.accept()
+    graph = await aget_graph()
+    owner = None
+    if thread_id:
+        checkpoint = await graph.checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+        owner = checkpoint.metadata.get("passenger_id") if checkpoint else None
+        if owner and owner != passenger_id:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="会话不属于该乘客")
+            return
+    config = _thread_config(thread_id or str(uuid.uuid4()), owner or passenger_id)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            inputs = {"messages": [HumanMessage(content=text)]}
+            # 发送失败时立即关闭事件生成器，取消图的执行，而不是等垃圾回收
+            async with contextlib.aclosing(_chat_events(graph, inputs, config)) as events:
+                async for event in events:
+                    await websocket.send_text(json.dumps(event, ensure_ascii=False, default=str))
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket 已断开: passenger_id={passenger_id}")
+    except (RuntimeError, OSError) as e:
+        # 推送途中客户端已离开（连接已关闭时 send 抛出 RuntimeError，uvicorn 的 ClientDisconnected 是 OSError）
+        logger.warning(f"WebSocket 发送失败，连接已关闭: passenger_id={passenger_id}, {str(e)}")
+
+@ws_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 文本格式的指标"""
+    from app.core.metrics import registry
+    # 导入时注册图的指标和各缓存 / 连接池的采集回调
+    import app.services.customer_support.instrumentation  # noqa: F401
+
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,522 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+from app.core.database import SQLiteConnectionPool, resolve_database_path
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_last_access ON threads (last_access);
+"""
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """基于 SQLite（WAL）的检查点存储，可在多个 uvicorn worker 之间共享
+
+    - 写入先进入内存缓冲，攒够 batch_size 条、读取前或显式 flush 时在一个事务里落盘
+    - threads 表记录每个会话最近一次访问时间，供 TTL + LRU 淘汰使用
+    - maintain() 会淘汰过期/超量的会话，并只保留每个会话最近 keep_versions 个检查点
+    """
+
+    def __init__(
+        self,
+        database: str,
+        *,
+        batch_size: int = 32,
+        thread_ttl_seconds: float = 24 * 3600,
+        max_threads: int = 10000,
+        keep_versions: int = 5,
+        pool_size: int = 4,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        super().__init__(serde=serde)
+        self.batch_size = batch_size
+        self.thread_ttl_seconds = thread_ttl_seconds
+        self.max_threads = max_threads
+        self.keep_versions = keep_versions
+        self._pool = SQLiteConnectionPool(database, max_size=pool_size)
+        # _lock 只保护内存缓冲（事件循环中的写入也会获取，必须很快释放）；
+        # _flush_lock 串行化落盘，保证语句按写入顺序提交
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: list[tuple[str, tuple]] = []
+        self._touched: dict[str, float] = {}
+        # 缓冲中 / 正在落盘的写入涉及的会话，读取时据此判断是否需要先落盘
+        self._dirty: set[str] = set()
+        self._inflight: set[str] = set()
+
+        with self._pool.connection() as conn:
+            conn.executescript(CHECKPOINT_SCHEMA)
+            conn.commit()
+
+    # ------------------------------------------------------------------
+    # 批量写入
+    # ------------------------------------------------------------------
+    def _enqueue(self, statements: Sequence[tuple[str, tuple]], thread_id: str) -> bool:
+        """加入写缓冲，返回是否已达到批量阈值"""
+        with self._lock:
+            self._pending.extend(statements)
+            self._dirty.add(thread_id)
+            self._touched[thread_id] = time.time()
+            return len(self._pending) >= self.batch_size
+
+    def flush(self) -> int:
+        """把缓冲中的写入在一个事务里落盘，返回写入的语句数
+
+        只在交换缓冲时短暂持有 _lock，SQLite 事务在锁外执行，落盘期间事件循环中的写入不会被阻塞。
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._touched:
+                    return 0
+                pending, self._pending = self._pending, []
+                touched, self._touched = self._touched, {}
+                # 先登记正在落盘的会话，再清空 _dirty，读取方不会看到两者都不包含该会话的时刻
+                self._inflight = dirty = self._dirty
+                self._dirty = set()
+            try:
+                with self._pool.connection() as conn:
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                        for sql, params in pending:
+                            conn.execute(sql, params)
+                        conn.executemany(
+                            "INSERT INTO threads (thread_id, last_access) VALUES (?, ?) "
+                            "ON CONFLICT(thread_id) DO UPDATE SET last_access = "
+                            "MAX(last_access, excluded.last_access)",
+                            list(touched.items()),
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+            except Exception:
+                # 写入失败时放回缓冲，下次 flush 重试
+                with self._lock:
+                    self._pending = pending + self._pending
+                    self._dirty |= dirty
+                    for thread_id, ts in touched.items():
+                        self._touched.setdefault(thread_id, ts)
+                raise
+            finally:
+                self._inflight = set()
+            return len(pending)
+
+    def _flush_thread(self, thread_id: str) -> None:
+        """读取前只在该会话有未落盘的写入时落盘"""
+        if thread_id in self._dirty or thread_id in self._inflight:
+            self.flush()
+
+    async def aflush(self) -> int:
+        return await asyncio.to_thread(self.flush)
+
+    def _touch(self, thread_id: str) -> None:
+        with self._lock:
+            self._touched[thread_id] = time.time()
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    def _load_writes(self, conn, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        rows = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in rows]
+
+    def _to_tuple(self, conn, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, meta_type, meta = row
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, blob)),
+            metadata=self.serde.loads_typed((meta_type, meta)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=self._load_writes(conn, thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    _SELECT = (
+        "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+        "type, checkpoint, metadata_type, metadata FROM checkpoints"
+    )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        self._flush_thread(thread_id)
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._pool.connection() as conn:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = conn.execute(
+                    f"{self._SELECT} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f"{self._SELECT} WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            self._touch(thread_id)
+            return self._to_tuple(conn, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config:
+            self._flush_thread(config["configurable"]["thread_id"])
+        else:
+            self.flush()
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        query = self._SELECT
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        if limit is not None and not filter:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+            for row in rows:
+                item = self._to_tuple(conn, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                if limit is not None:
+                    if limit <= 0:
+                        break
+                    limit -= 1
+                yield item
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        if self._put(config, checkpoint, metadata):
+            self.flush()
+        return self._next_config(config, checkpoint)
+
+    def _put(self, config, checkpoint, metadata) -> bool:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        meta_type, meta = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        return self._enqueue(
+            [(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                "parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_, blob, meta_type, meta,
+                ),
+            )],
+            thread_id,
+        )
+
+    @staticmethod
+    def _next_config(config: RunnableConfig, checkpoint: Checkpoint) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._put_writes(config, writes, task_id, task_path):
+            self.flush()
+
+    def _put_writes(self, config, writes, task_id, task_path) -> bool:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        statements = []
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            # 普通写入不覆盖已有记录，特殊写入（错误、中断等）总是覆盖
+            verb = "INSERT OR REPLACE" if write_idx < 0 else "INSERT OR IGNORE"
+            type_, blob = self.serde.dumps_typed(value)
+            statements.append((
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, "
+                "idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx,
+                 channel, type_, blob, task_path),
+            ))
+        return self._enqueue(statements, thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush()
+        with self._pool.connection() as conn:
+            self._delete_threads(conn, [thread_id])
+            conn.commit()
+
+    @staticmethod
+    def _delete_threads(conn, thread_ids: Sequence[str]) -> None:
+        params = [(thread_id,) for thread_id in thread_ids]
+        conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", params)
+        conn.executemany("DELETE FROM writes WHERE thread_id = ?", params)
+        conn.executemany("DELETE FROM threads WHERE thread_id = ?", params)
+
+    # ------------------------------------------------------------------
+    # 异步接口：落盘和查询放到线程池，缓冲写入直接在事件循环中完成
+    # ------------------------------------------------------------------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        if self._put(config, checkpoint, metadata):
+            await self.aflush()
+        return self._next_config(config, checkpoint)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._put_writes(config, writes, task_id, task_path):
+            await self.aflush()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # 与 MemorySaver 相同的版本号格式
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ------------------------------------------------------------------
+    # 淘汰与压缩
+    # ------------------------------------------------------------------
+    def maintain(self, now: Optional[float] = None) -> dict:
+        """淘汰空闲会话并压缩旧检查点
+
+        Args:
+            now: 当前时间戳，测试时可以指定
+
+        Returns:
+            本次清理的统计信息
+        """
+        self.flush()
+        now = time.time() if now is None else now
+        with self._flush_lock, self._pool.connection() as conn:
+            expired = [
+                row[0] for row in conn.execute(
+                    "SELECT thread_id FROM threads WHERE last_access < ?",
+                    (now - self.thread_ttl_seconds,),
+                )
+            ]
+            self._delete_threads(conn, expired)
+
+            # LRU：会话数超过上限时淘汰最久未访问的
+            overflow = conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] - self.max_threads
+            evicted = []
+            if overflow > 0:
+                evicted = [
+                    row[0] for row in conn.execute(
+                        "SELECT thread_id FROM threads ORDER BY last_access LIMIT ?", (overflow,)
+                    )
+                ]
+                self._delete_threads(conn, evicted)
+
+            pruned = conn.execute(
+                """
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS rn
+                        FROM checkpoints
+                    ) WHERE rn > ?
+                )
+                """,
+                (self.keep_versions,),
+            ).rowcount
+            conn.execute(
+                """
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                      AND c.checkpoint_ns = writes.checkpoint_ns
+                      AND c.checkpoint_id = writes.checkpoint_id
+                )
+                """
+            )
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        stats = {"expired": len(expired), "evicted": len(evicted), "pruned": pruned}
+        if any(stats.values()):
+            logger.info(f"检查点清理完成: {stats}")
+        return stats
+
+    def close(self) -> None:
+        self.flush()
+        self._pool.close()
+
+
+def create_checkpointer(backend: Optional[str] = None) -> BaseCheckpointSaver:
+    """按配置创建检查点存储
+
+    Args:
+        backend: "sqlite" 或 "memory"，默认取 settings.CHECKPOINTER_BACKEND
+
+    Returns:
+        检查点存储实例
+    """
+    backend = (backend or settings.CHECKPOINTER_BACKEND).lower()
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        path = resolve_database_path(settings.CHECKPOINT_DB_URL)
+        logger.info(f"使用 SQLite 检查点存储: {path}")
+        return SQLiteCheckpointSaver(
+            str(path),
+            batch_size=settings.CHECKPOINT_BATCH_SIZE,
+            thread_ttl_seconds=settings.CHECKPOINT_THREAD_TTL_SECONDS,
+            max_threads=settings.CHECKPOINT_MAX_THREADS,
+            keep_versions=settings.CHECKPOINT_KEEP_VERSIONS,
+        )
+    raise ValueError(f"未知的检查点存储类型: {backend}")
+
+
+async def flush_checkpointer(checkpointer: Optional[BaseCheckpointSaver]) -> None:
+    """请求结束时把缓冲的检查点落盘，保证其他 worker 能读到最新状态"""
+    if isinstance(checkpointer, SQLiteCheckpointSaver):
+        await checkpointer.aflush()
+
+
+async def run_maintenance(checkpointer: BaseCheckpointSaver, interval: float) -> None:
+    """后台循环：定期执行检查点淘汰与压缩，直到任务被取消"""
+    if not isinstance(checkpointer, SQLiteCheckpointSaver):
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(checkpointer.maintain)
+        except Exception as e:
+            logger.error(f"检查点清理失败: {str(e)}")
@@ -1,22 +1,27 @@
-from typing import Annotated
+import asyncio
+import logging
+from typing import Annotated, Optional
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END 
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_anthropic import ChatAnthropic
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import ToolMessage
-from typing import Annotated
-from typing_extensions import TypedDict
+from langchain_core.messages import AIMessage, ToolMessage
 from langgraph.graph.message import AnyMessage, add_messages
 from langchain_core.runnables import RunnableLambda
+from langchain_core.callbacks.manager import adispatch_custom_event
 from datetime import datetime
 from app.core.config import settings
-from langchain_anthropic import ChatAnthropic
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable, RunnableConfig
 
+from .checkpointer import create_checkpointer
+from .instrumentation import RETRY_EVENT
+from .history import HistoryManager, Summarizer, extractive_summarizer, llm_summarizer
+from .prompt_cache import add_cache_breakpoints, cacheable_tools, prompt_cache_stats
+from .response_cache import mark_personal, shared_tool_names
+from .retry import DeadlineExceeded, RetryPolicy, remaining_time
+from .tool_scheduler import ToolCallScheduler
+
 from .tools.hotels_tool import (
     search_hotels,
     book_hotel,
@@ -49,44 +54,104 @@ from .tools.car_rental_tool import (
 
 
 
+logger = logging.getLogger(__name__)
+
 # 定义状态- 消息构成了聊天历史记录，这是我们简单助手所需的所有状态
 class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
+    # 已移出窗口的较早对话的滚动摘要，由 history 节点维护
+    summary: str
 
 # 定义助手类-此函数接收图状态，将其格式化为提示，然后调用 LLM 以预测最佳响应
 class Assistant:
-    def __init__(self, runnable: Runnable):
+    """助手节点：调用 LLM，空回复或超时时按 RetryPolicy 退避重试
+
+    Args:
+        runnable: 提示模板与 LLM 组成的链
+        retry_policy: 重试策略，默认按配置创建
+    """
+
+    # 多次尝试都没有得到有效回复时返回给用户的内容，保证对话状态仍然完整
+    FALLBACK_RESPONSE = "Sorry, I couldn't generate a response just now. Please try again."
+
+    def __init__(self, runnable: Runnable, retry_policy: Optional[RetryPolicy] = None):
         self.runnable = runnable
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
 
-    def __call__(self, state: State, config: RunnableConfig):
-        while True:
-            configuration = config.get("configurable", {})
-            passenger_id = configuration.get("passenger_id", None)
-            state = {**state, "user_info": passenger_id}
-            result = self.runnable.invoke(state)
-            # If the LLM happens to return an empty response, we will re-prompt it
-            # for an actual response.
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
+    @staticmethod
+    async def _report_retry(reason: str, attempt: int, config: RunnableConfig) -> None:
+        # 以自定义事件上报，由挂在 config 上的回调（如指标回调）统计；没有回调时不派发
+        if config.get("callbacks"):
+            await adispatch_custom_event(RETRY_EVENT, {"reason": reason, "attempt": attempt}, config=config)
+
+    async def __call__(self, state: State, config: RunnableConfig):
+        configuration = config.get("configurable", {})
+        passenger_id = configuration.get("passenger_id", None)
+        summary = state.get("summary")
+        state = {
+            **state,
+            "user_info": passenger_id,
+            "conversation_summary": (
+                f"\n\nSummary of the earlier conversation:\n<Summary>\n{summary}\n</Summary>" if summary else ""
+            ),
+        }
+        policy = self.retry_policy
+        nudged = False
+        for attempt in range(1, policy.max_attempts + 1):
+            timeout = policy.timeout(config)
+            try:
+                # 使用 ainvoke，等待 LLM 响应期间不阻塞事件循环
+                result = await asyncio.wait_for(self.runnable.ainvoke(state, config), timeout)
+            except asyncio.TimeoutError:
+                if attempt == policy.max_attempts:
+                    raise
+                logger.warning(f"LLM 调用超过 {timeout:.1f} 秒未返回（第 {attempt} 次）")
+                reason = "timeout"
             else:
+                prompt_cache_stats.record(result)
+                if not self._is_empty(result):
+                    return {"messages": result}
+                logger.warning(f"LLM 返回了空回复（第 {attempt} 次）")
+                reason = "empty"
+                if not nudged:
+                    # If the LLM happens to return an empty response, we will re-prompt it
+                    # for an actual response. 提示只追加一次，重试不会让消息越积越多
+                    state = {**state, "messages": state["messages"] + [("user", "Respond with a real output.")]}
+                    nudged = True
+            if attempt == policy.max_attempts:
                 break
-        return {"messages": result}
+            await self._report_retry(reason, attempt, config)
+            delay = policy.backoff(attempt)
+            remaining = remaining_time(config)
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded("请求剩余时间不足以再次调用 LLM")
+            await asyncio.sleep(delay)
+        logger.error(f"LLM 连续 {policy.max_attempts} 次返回空回复，使用兜底回复")
+        return {"messages": AIMessage(content=self.FALLBACK_RESPONSE, response_metadata={"fallback": True})}
 
 # 初始化 LLM
 # model="claude-3-sonnet-20240229",
 # model="claude-3-5-sonnet-20240620",
-llm = ChatAnthropic(
-    model="claude-3-5-sonnet-20241022",
-    api_key=settings.ANTHROPIC_API_KEY,
-    base_url="https://api.gptsapi.net"
-)
+def create_llm():
+    """创建 Claude 客户端；langchain_anthropic 导入较慢，只在真正需要时才导入"""
+    from langchain_anthropic import ChatAnthropic
+
+    return ChatAnthropic(
+        model="claude-3-5-sonnet-20241022",
+        api_key=settings.ANTHROPIC_API_KEY,
+        base_url="https://api.gptsapi.net"
+    )
 
 # 修改提示词模板
+# system 分为两段：静态说明在前，所有会话共享同一个缓存前缀；当前用户在后，放在缓存断点之后
 primary_assistant_prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -94,13 +159,16 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             "You are a helpful customer support assistant for Swiss Airlines. "
             " Use the provided tools to search for flights, company policies, and other information to assist the user's queries. "
             " When searching, be persistent. Expand your query bounds if the first search returns no results. "
-            " If a search comes up empty, expand your search before giving up."
-            "\n\nCurrent user:\n<User>\n{user_info}\n</User>"
-            "\nCurrent time: {time}.",
+            " If a search comes up empty, expand your search before giving up.",
+        ),
+        (
+            "system",
+            "Current user:\n<User>\n{user_info}\n</User>"
+            "\nCurrent time: {time}.{conversation_summary}",
         ),
         ("placeholder", "{messages}"),
     ]
-).partial(time=datetime.now())
+).partial(time=datetime.now(), conversation_summary="")
 
 # 定义工具列表
 tools = [
@@ -132,6 +200,33 @@ tools = [
     lookup_policy
 ]
 
+# 语义响应缓存只复用调用过非个人工具的回答：政策内容与乘客无关；
+# 其余工具读取或修改乘客数据（搜索结果也随预订变化），保持默认的个人工具
+mark_personal(lookup_policy, False)
+SHARED_TOOLS = shared_tool_names(tools)
+
+def create_assistant_runnable(llm=None) -> Runnable:
+    """创建助手链：提示模板 -> 缓存断点 -> 绑定工具的 LLM
+
+    开启 PROMPT_CACHE_ENABLED 时，工具定义、system 静态部分和历史前缀都会设置 Anthropic 缓存断点，
+    断点随对话增长前移，后续调用从上一次写入的前缀读取缓存。
+
+    Args:
+        llm: 聊天模型，默认使用 create_llm()
+
+    Returns:
+        可运行的助手链
+    """
+    llm = llm or create_llm()
+    if not settings.PROMPT_CACHE_ENABLED:
+        return primary_assistant_prompt | llm.bind_tools(tools)
+    history_breakpoints = settings.PROMPT_CACHE_HISTORY_BREAKPOINTS
+    return (
+        primary_assistant_prompt
+        | RunnableLambda(lambda prompt: add_cache_breakpoints(prompt, history_breakpoints))
+        | llm.bind_tools(cacheable_tools(tools))
+    )
+
 def handle_tool_error(state: dict) -> dict:
     """处理工具执行错误的函数
     
@@ -153,16 +248,25 @@ def handle_tool_error(state: dict) -> dict:
         ]
     }
 
-def create_tool_node_with_fallback(tools: list) -> ToolNode:
+def create_tool_node_with_fallback(
+    tools: list,
+    scheduler: Optional[ToolCallScheduler] = None,
+) -> ToolNode:
     """创建带有错误处理的工具节点
+
+    同一轮中的多个工具调用会并发执行（结果顺序与调用顺序一致），
+    由 scheduler 限制并发数，并让同一乘客的写操作串行执行。
     
     Args:
         tools: 工具列表
+        scheduler: 工具调用调度器，默认按配置创建
         
     Returns:
         配置了错误处理的 ToolNode 实例
     """
-    return ToolNode(tools).with_fallbacks(
+    scheduler = scheduler or ToolCallScheduler()
+    node = ToolNode(tools, wrap_tool_call=scheduler.wrap, awrap_tool_call=scheduler.awrap)
+    return node.with_fallbacks(
         [RunnableLambda(handle_tool_error)],
         exception_key="error"
     )
@@ -195,35 +299,58 @@ def _print_event(
             _printed.add(message.id)
 
 # 创建客服支持图
-def create_customer_support_graph():
-    """创建客服支持图"""
+def create_customer_support_graph(
+    assistant_runnable: Optional[Runnable] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    summarizer: Optional[Summarizer] = None,
+):
+    """创建客服支持图
+
+    图中的助手节点是异步的，需要通过 ainvoke / astream 执行；
+    同步工具会由 ToolNode 放到线程池中运行，不会阻塞事件循环。
+
+    Args:
+        assistant_runnable: 自定义的助手可运行对象（如压测时的桩 LLM），默认使用 Claude
+        checkpointer: 检查点存储，默认按 settings.CHECKPOINTER_BACKEND 创建
+        summarizer: 较早对话的摘要函数；使用默认的 Claude 时由 LLM 摘要，
+            传入自定义助手时默认使用不调用 LLM 的抽取式摘要
+
+    Returns:
+        编译好的 LangGraph 图
+    """
     builder = StateGraph(State)
 
     # 这行代码创建了一个可运行的助手对象
     # primary_assistant_prompt 是主要的助手提示模板
     # llm.bind_tools(tools) 将LLM与工具绑定在一起
     # | 操作符用于将提示和工具链接成一个管道
-    assistant_runnable = (
-        primary_assistant_prompt | llm.bind_tools(tools)
-    )
-    print("助手可运行对象:", assistant_runnable)
+    if assistant_runnable is None:
+        llm = create_llm()
+        assistant_runnable = create_assistant_runnable(llm)
+        summarizer = summarizer or llm_summarizer(llm)
+    logger.debug(f"助手可运行对象: {assistant_runnable}")
     # 添加节点
+    builder.add_node("history", HistoryManager(summarizer or extractive_summarizer))
     builder.add_node("assistant", Assistant(assistant_runnable))
     builder.add_node("tools", create_tool_node_with_fallback(tools))
 
     
     # 添加边
     # Define edges: these determine how the control flow moves
-    builder.add_edge(START, "assistant")
+    # 每次调用 LLM 之前（包括工具调用之后）先裁剪历史
+    builder.add_edge(START, "history")
+    builder.add_edge("history", "assistant")
     builder.add_conditional_edges(
         "assistant",
         tools_condition,
     )
-    builder.add_edge("tools", "assistant")
+    builder.add_edge("tools", "history")
 
     # The checkpointer lets the graph persist its state
     # this is a complete memory for the entire graph.
-    memory = MemorySaver()
-    return builder.compile(checkpointer=memory)
+    # 默认使用 SQLite 存储，状态在重启后保留且可被多个 worker 共享
+    if checkpointer is None:
+        checkpointer = create_checkpointer()
+    return builder.compile(checkpointer=checkpointer)
     
 
@@ -0,0 +1,188 @@
+"""对话历史的裁剪与滚动摘要
+
+图中 history 节点在每次调用 LLM 之前运行（包括每次工具调用之后）。历史在 token 预算之内时不做任何修改，
+已写入提示缓存的消息前缀（见 prompt_cache）在各轮之间保持不变；超出预算时直接修改状态：
+1. 压缩旧工具结果：当前轮之前、超过 HISTORY_TOOL_RESULT_MAX_CHARS 的 ToolMessage 只保留开头和提示；
+2. 按 token 预算保留窗口：从最新的消息往前累加，窗口只在用户消息处切分，工具调用与结果不会被拆开，
+   当前轮总是完整保留；
+3. 滚动摘要：窗口之外的消息与已有摘要合并为新的摘要（存入 state["summary"]），随后从状态中删除。
+
+压缩和裁剪都会改写前缀，因此只在裁剪不可避免时一起进行，提示缓存每次超出预算才失效一次。
+被摘要的消息会立即删除，下一次摘要只会看到新移出窗口的消息，同一段内容不会被重复摘要。
+"""
+import json
+import logging
+from typing import Awaitable, Callable, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, ToolMessage
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (已有摘要, 新移出窗口的消息) -> 新摘要
+Summarizer = Callable[[str, Sequence[BaseMessage]], Awaitable[str]]
+
+# 粗略估算：平均 4 个字符 1 个 token，每条消息另计固定开销
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a customer support conversation for Swiss Airlines. "
+    "Update the summary with the new messages below. Keep every booking, ticket, flight, hotel, "
+    "car rental and excursion ID, date, decision and open request; drop greetings and raw search "
+    "results. Reply with the updated summary only, as short bullet points."
+    "\n\nCurrent summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(
+        block if isinstance(block, str) else str(block.get("text") or block.get("input") or "")
+        for block in content
+    )
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """估算一条消息占用的 token 数（文本加工具调用参数）"""
+    chars = len(_text(message))
+    for call in getattr(message, "tool_calls", None) or ():
+        chars += len(call["name"]) + len(json.dumps(call["args"], ensure_ascii=False, default=str))
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def _current_turn_start(messages: Sequence[BaseMessage]) -> int:
+    """最后一条用户消息的位置，没有用户消息时为 0"""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return index
+    return 0
+
+
+def compact_tool_results(messages: Sequence[BaseMessage], max_chars: int) -> list[ToolMessage]:
+    """压缩当前轮之前的过长工具结果
+
+    Returns:
+        需要替换的 ToolMessage（id 不变，写回状态时按 id 覆盖原消息）
+    """
+    compacted = []
+    for message in messages[:_current_turn_start(messages)]:
+        if not isinstance(message, ToolMessage):
+            continue
+        text = _text(message)
+        if len(text) <= max_chars:
+            continue
+        compacted.append(message.model_copy(update={
+            "content": f"{text[:max_chars]}… [earlier tool result truncated from {len(text)} characters; "
+                       f"call the tool again if the details are needed]",
+        }))
+    return compacted
+
+
+def window_start(messages: Sequence[BaseMessage], max_tokens: int) -> int:
+    """按 token 预算计算保留窗口的起点
+
+    窗口从某条用户消息开始，且至少包含当前轮；更早的消息放不下预算时全部移出窗口。
+
+    Args:
+        messages: 完整的消息列表
+        max_tokens: 窗口的 token 预算
+
+    Returns:
+        窗口起点的下标，0 表示全部保留
+    """
+    start = _current_turn_start(messages)
+    used = sum(estimate_tokens(m) for m in messages[start:])
+    for index in range(start - 1, -1, -1):
+        used += estimate_tokens(messages[index])
+        if used > max_tokens:
+            break
+        if isinstance(messages[index], HumanMessage):
+            start = index
+    return start
+
+
+def _line(message: BaseMessage, max_chars: int) -> Optional[str]:
+    if isinstance(message, HumanMessage):
+        role = "User"
+    elif isinstance(message, AIMessage):
+        calls = ", ".join(
+            f"{call['name']}({json.dumps(call['args'], ensure_ascii=False, default=str)})"
+            for call in message.tool_calls
+        )
+        text = _text(message).strip()
+        if calls:
+            return f"- Assistant called {calls}"[:max_chars]
+        role = "Assistant"
+        if not text:
+            return None
+    else:
+        # 工具结果的细节不进入摘要，调用参数已由助手消息记录
+        return None
+    text = " ".join(_text(message).split())
+    return f"- {role}: {text}"[:max_chars]
+
+
+async def extractive_summarizer(summary: str, messages: Sequence[BaseMessage]) -> str:
+    """不调用 LLM 的摘要：每条用户消息、助手回答和工具调用各记一行，总长度超出预算时丢弃最早的行"""
+    lines = [line for line in summary.splitlines() if line]
+    lines += [line for line in (_line(m, 300) for m in messages) if line]
+    budget = settings.HISTORY_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def llm_summarizer(llm) -> Summarizer:
+    """用聊天模型生成摘要（不绑定工具）"""
+
+    async def summarize(summary: str, messages: Sequence[BaseMessage]) -> str:
+        transcript = "\n".join(line for line in (_line(m, 1000) for m in messages) if line)
+        result = await llm.ainvoke(SUMMARY_PROMPT.format(summary=summary or "(empty)", messages=transcript))
+        return _text(result).strip()
+
+    return summarize
+
+
+class HistoryManager:
+    """图中的 history 节点：在调用 LLM 之前压缩、裁剪历史并更新摘要"""
+
+    def __init__(
+        self,
+        summarizer: Summarizer = extractive_summarizer,
+        max_tokens: Optional[int] = None,
+        tool_result_max_chars: Optional[int] = None,
+    ):
+        self.summarizer = summarizer
+        self.max_tokens = settings.HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+        self.tool_result_max_chars = (
+            settings.HISTORY_TOOL_RESULT_MAX_CHARS if tool_result_max_chars is None else tool_result_max_chars
+        )
+
+    async def __call__(self, state: dict) -> dict:
+        messages = list(state["messages"])
+        # 预算之内不改写任何消息，保持提示缓存的前缀
+        if window_start(messages, self.max_tokens) == 0:
+            return {}
+
+        compacted = compact_tool_results(messages, self.tool_result_max_chars)
+        if compacted:
+            by_id = {m.id: m for m in compacted}
+            messages = [by_id.get(m.id, m) for m in messages]
+
+        start = window_start(messages, self.max_tokens)
+        if start == 0:
+            return {"messages": compacted} if compacted else {}
+
+        dropped = messages[:start]
+        summary = await self.summarizer(state.get("summary") or "", dropped)
+        logger.info(f"对话历史超出预算，已将 {len(dropped)} 条较早的消息并入摘要（{len(summary)} 字符）")
+        dropped_ids = {m.id for m in dropped}
+        return {
+            "messages": [RemoveMessage(id=m.id) for m in dropped]
+            + [m for m in compacted if m.id not in dropped_ids],
+            "summary": summary,
+        }
@@ -0,0 +1,279 @@
+"""对话图的耗时与 token 指标
+
+GraphMetricsCallback 是一个 LangChain 回调，由路由在执行图时挂到 config["callbacks"] 上
+（settings.METRICS_ENABLED 为 False 时不挂，图的执行没有任何额外开销）。它记录：
+
+- 每个请求的总耗时与结果、assistant 与 tools 之间往返的次数（tools 节点执行次数）
+- 每个节点（history / assistant / tools）的耗时
+- 每个工具的耗时，按成功 / 失败区分
+- LLM 的输入、输出以及读写提示缓存的 token 数
+- 助手的重试次数（Assistant 通过自定义事件 assistant_retry 上报）
+
+指标写入 app.core.metrics 的全局注册表，由 /metrics 以 Prometheus 文本格式输出；
+settings.METRICS_JSON_LOGS 开启时每个请求结束后额外输出一行 JSON 日志，
+同样的记录也会传给构造时指定的 on_request（如压测脚本按请求汇总工具耗时）。
+"""
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+from .prompt_cache import usage_of
+
+logger = logging.getLogger(__name__)
+
+# Assistant 重试时派发的自定义事件名
+RETRY_EVENT = "assistant_retry"
+
+REQUESTS = registry.counter("graph_requests_total", "Graph invocations by outcome", ["status"])
+REQUEST_SECONDS = registry.histogram("graph_request_duration_seconds", "Wall time of a graph invocation")
+NODE_SECONDS = registry.histogram("graph_node_duration_seconds", "Wall time of a graph node run", ["node"])
+TOOL_SECONDS = registry.histogram("graph_tool_duration_seconds", "Wall time of a tool call", ["tool", "status"])
+HOPS = registry.histogram(
+    "graph_tool_hops", "Assistant to tools round trips per graph invocation", buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16)
+)
+TOKENS = registry.counter("llm_tokens_total", "LLM tokens by kind", ["type"])
+RETRIES = registry.counter("assistant_retries_total", "Assistant LLM retries by reason", ["reason"])
+
+# usage_of 的字段 -> llm_tokens_total 的 type 标签
+_TOKEN_TYPES = {
+    "input_tokens": "input",
+    "output_tokens": "output",
+    "cache_read_input_tokens": "cache_read",
+    "cache_creation_input_tokens": "cache_creation",
+}
+
+
+@dataclass
+class _Request:
+    start: float
+    thread_id: Optional[str] = None
+    hops: int = 0
+    retries: int = 0
+    nodes: dict[str, float] = field(default_factory=dict)
+    tools: dict[str, float] = field(default_factory=dict)
+    tokens: dict[str, int] = field(default_factory=dict)
+
+
+def _node_name(name: Optional[str], tags: Optional[list[str]], metadata: Optional[dict]) -> Optional[str]:
+    """节点自身的运行（而不是节点内部的子链）名字与 langgraph_node 相同，且带有 graph:step 标签"""
+    node = (metadata or {}).get("langgraph_node")
+    if node is None or name != node:
+        return None
+    return node if any(tag.startswith("graph:step:") for tag in tags or ()) else None
+
+
+def _llm_usage(response: LLMResult) -> Optional[dict[str, int]]:
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = usage_of(message) if message is not None else None
+            if usage:
+                return usage
+    return None
+
+
+class GraphMetricsCallback(BaseCallbackHandler):
+    """按根运行（一次 graph.ainvoke / astream）汇总指标的回调
+
+    一个实例可以被所有请求共享：各运行按 run_id 记录，子运行通过 parent_run_id 找到所属的请求。
+    回调在事件循环中同步执行（run_inline），每个事件只做字典操作和一次计时。
+
+    Args:
+        on_request: 每个请求结束时以汇总记录（与 JSON 日志相同）调用
+    """
+
+    run_inline = True
+
+    def __init__(self, on_request: Optional[Callable[[dict[str, Any]], None]] = None):
+        self.on_request = on_request
+        self._requests: dict[UUID, _Request] = {}
+        # 运行中的链 / 工具 run_id -> 所属请求的根 run_id
+        self._roots: dict[UUID, UUID] = {}
+        # 节点与工具运行：run_id -> (名称, 开始时刻)
+        self._nodes: dict[UUID, tuple[str, float]] = {}
+        self._tools: dict[UUID, tuple[str, float]] = {}
+
+    def _request(self, run_id: Optional[UUID]) -> Optional[_Request]:
+        root = self._roots.get(run_id) if run_id is not None else None
+        return self._requests.get(root) if root is not None else None
+
+    # ---- 链（图与节点） ----
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[list[str]] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        now = time.perf_counter()
+        if parent_run_id is None:
+            self._requests[run_id] = _Request(start=now, thread_id=(metadata or {}).get("thread_id"))
+            self._roots[run_id] = run_id
+            return
+        root = self._roots.get(parent_run_id)
+        if root is None:
+            return
+        self._roots[run_id] = root
+        node = _node_name(kwargs.get("name"), tags, metadata)
+        if node is not None:
+            self._nodes[run_id] = (node, now)
+            if node == "tools":
+                self._requests[root].hops += 1
+
+    def _end_chain(self, run_id: UUID, status: str) -> None:
+        now = time.perf_counter()
+        root = self._roots.pop(run_id, None)
+        node = self._nodes.pop(run_id, None)
+        if node is not None:
+            name, start = node
+            NODE_SECONDS.observe(now - start, node=name)
+            request = self._requests.get(root)
+            if request is not None:
+                request.nodes[name] = request.nodes.get(name, 0.0) + now - start
+        if root == run_id:
+            self._finish(self._requests.pop(run_id), now, status)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id, "error")
+
+    def _finish(self, request: _Request, now: float, status: str) -> None:
+        duration = now - request.start
+        REQUESTS.inc(status=status)
+        REQUEST_SECONDS.observe(duration)
+        HOPS.observe(request.hops)
+        if not (settings.METRICS_JSON_LOGS or self.on_request):
+            return
+        record = {
+            "event": "graph_request",
+            "thread_id": request.thread_id,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "hops": request.hops,
+            "retries": request.retries,
+            "nodes_ms": {name: round(s * 1000, 3) for name, s in request.nodes.items()},
+            "tools_ms": {name: round(s * 1000, 3) for name, s in request.tools.items()},
+            "tokens": request.tokens,
+        }
+        if settings.METRICS_JSON_LOGS:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        if self.on_request:
+            self.on_request(record)
+
+    # ---- 工具 ----
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tools[run_id] = (name, time.perf_counter())
+        root = self._roots.get(parent_run_id) if parent_run_id is not None else None
+        if root is not None:
+            self._roots[run_id] = root
+
+    def _end_tool(self, run_id: UUID, status: str) -> None:
+        tool = self._tools.pop(run_id, None)
+        request = self._request(run_id)
+        self._roots.pop(run_id, None)
+        if tool is None:
+            return
+        name, start = tool
+        duration = time.perf_counter() - start
+        TOOL_SECONDS.observe(duration, tool=name, status=status)
+        if request is not None:
+            request.tools[name] = request.tools.get(name, 0.0) + duration
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, "error")
+
+    # ---- LLM 与自定义事件 ----
+
+    def on_llm_end(
+        self, response: LLMResult, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        usage = _llm_usage(response)
+        if not usage:
+            return
+        request = self._request(parent_run_id)
+        for key, kind in _TOKEN_TYPES.items():
+            count = usage.get(key, 0)
+            if not count:
+                continue
+            TOKENS.inc(count, type=kind)
+            if request is not None:
+                request.tokens[kind] = request.tokens.get(kind, 0) + count
+
+    def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name != RETRY_EVENT:
+            return
+        RETRIES.inc(reason=(data or {}).get("reason", "unknown"))
+        request = self._request(run_id)
+        if request is not None:
+            request.retries += 1
+
+
+metrics_callback = GraphMetricsCallback()
+
+
+def _pool_samples():
+    from app.core.database import get_pool
+
+    for state, value in get_pool().stats().items():
+        yield {"state": state}, value
+
+
+def _cache_stats() -> dict[str, dict]:
+    """各缓存已有的 stats()；未启用的缓存不输出"""
+    from .tools.flight_tool import user_flights_cache_stats
+    from .tools.memoize import tool_cache
+
+    stats = {"user_flights": user_flights_cache_stats(), "tool_results": tool_cache.stats()["storage"]}
+    if settings.RESPONSE_CACHE_ENABLED:
+        from .response_cache import get_response_cache
+
+        stats["responses"] = get_response_cache().stats()
+    return stats
+
+
+def _cache_samples(key: str):
+    def collect():
+        for cache, stats in _cache_stats().items():
+            yield {"cache": cache}, stats.get(key, 0)
+
+    return collect
+
+
+registry.register_collector("db_pool_connections", "SQLite connection pool state", _pool_samples)
+registry.register_collector("cache_entries", "Entries currently held by each cache", _cache_samples("size"))
+registry.register_collector("cache_hits_total", "Cache hits since start", _cache_samples("hits"), type="counter")
+registry.register_collector(
+    "cache_misses_total", "Cache misses since start", _cache_samples("misses"), type="counter"
+)
+registry.register_collector(
+    "cache_evictions_total", "Cache evictions since start", _cache_samples("evictions"), type="counter"
+)
@@ -0,0 +1,170 @@
+"""Anthropic 提示缓存（prompt caching）的断点设置与用量统计
+
+请求的前缀顺序是 工具定义 -> system -> 历史消息，缓存按前缀命中。这里最多设置 4 个断点：
+- 最后一个工具定义：所有会话共享；
+- system 的静态部分：与工具一起被所有会话共享，当前用户和时间放在断点之后的第二个文本块；
+- 历史中最后一条消息，以及上一次调用时的最后一条消息：每次调用都把断点推进到最新位置，
+  下一次调用可以从上一次写入的前缀读取缓存。
+
+历史断点只放在用户消息和工具结果上（助手消息可能只有 tool_use，没有可以挂断点的文本块）。
+"""
+import logging
+import threading
+from typing import Any, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.prompt_values import PromptValue
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# 请求中最多 4 个断点：工具、system 各占一个
+MAX_HISTORY_BREAKPOINTS = 2
+
+
+def cacheable_tools(tools: Sequence[Any]) -> list[dict]:
+    """把工具转换为 Anthropic 格式，并在最后一个工具上设置断点（缓存全部工具定义）"""
+    from langchain_anthropic.chat_models import convert_to_anthropic_tool
+
+    formatted = [dict(convert_to_anthropic_tool(tool)) for tool in tools]
+    if formatted:
+        formatted[-1]["cache_control"] = CACHE_CONTROL
+    return formatted
+
+
+def _mark(message: BaseMessage) -> BaseMessage:
+    """返回在最后一个内容块上带断点的消息副本，没有可用的文本块时原样返回"""
+    content = message.content
+    if isinstance(content, str):
+        if not content:
+            return message
+        blocks: list = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        if not content:
+            return message
+        blocks = [{"type": "text", "text": block} if isinstance(block, str) else dict(block) for block in content]
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": blocks})
+
+
+def _merge_system(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """把开头的多条 system 消息合并为一条，第一条（静态部分）之后设置断点"""
+    count = 0
+    while count < len(messages) and isinstance(messages[count], SystemMessage):
+        count += 1
+    if count == 0:
+        return messages
+    blocks: list = []
+    for message in messages[:count]:
+        content = message.content
+        if isinstance(content, str):
+            blocks.append({"type": "text", "text": content})
+        else:
+            blocks.extend({"type": "text", "text": b} if isinstance(b, str) else dict(b) for b in content)
+    blocks[0]["cache_control"] = CACHE_CONTROL
+    return [SystemMessage(content=blocks), *messages[count:]]
+
+
+def _history_breakpoints(messages: list[BaseMessage], limit: int) -> list[int]:
+    """选出设置断点的历史消息位置：最新的一条，以及每条助手消息之前的那一条（即之前调用时的末尾）"""
+    positions: list[int] = []
+    expect_end = True
+    for index in range(len(messages) - 1, -1, -1):
+        if len(positions) >= limit:
+            break
+        message = messages[index]
+        if isinstance(message, AIMessage):
+            expect_end = True
+            continue
+        if expect_end and isinstance(message, (HumanMessage, ToolMessage)):
+            positions.append(index)
+            expect_end = False
+    return positions
+
+
+def add_cache_breakpoints(
+    prompt: PromptValue | Sequence[BaseMessage],
+    history_breakpoints: int = MAX_HISTORY_BREAKPOINTS,
+) -> list[BaseMessage]:
+    """给提示模板的输出加上 system 和历史的缓存断点
+
+    Args:
+        prompt: 提示模板的输出或消息列表
+        history_breakpoints: 历史消息中的断点数（0-2）
+
+    Returns:
+        新的消息列表，原消息不会被修改
+    """
+    messages = prompt.to_messages() if isinstance(prompt, PromptValue) else list(prompt)
+    messages = _merge_system(messages)
+    for index in _history_breakpoints(messages, min(history_breakpoints, MAX_HISTORY_BREAKPOINTS)):
+        messages[index] = _mark(messages[index])
+    return messages
+
+
+def usage_of(message: BaseMessage) -> Optional[dict[str, int]]:
+    """从助手消息的 usage_metadata 中取出输入、输出和缓存读写的 token 数"""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    details = usage.get("input_token_details") or {}
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cache_read_input_tokens": details.get("cache_read", 0) or 0,
+        "cache_creation_input_tokens": details.get("cache_creation", 0) or 0,
+    }
+
+
+def turn_usage(messages: Sequence[BaseMessage]) -> Optional[dict[str, int]]:
+    """汇总本轮（最后一条用户消息之后）所有模型调用的 token 用量，没有用量信息时返回 None"""
+    start = len(messages)
+    while start > 0 and not isinstance(messages[start - 1], HumanMessage):
+        start -= 1
+    total: Optional[dict[str, int]] = None
+    for message in messages[start:]:
+        usage = usage_of(message)
+        if usage is None:
+            continue
+        total = total or dict.fromkeys(usage, 0)
+        for key, value in usage.items():
+            total[key] += value
+    return total
+
+
+class PromptCacheStats:
+    """进程内累计的模型调用次数和 token 用量"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+
+    def record(self, message: BaseMessage) -> None:
+        usage = usage_of(message)
+        if usage is None:
+            return
+        logger.debug(
+            f"模型调用 token: 输入 {usage['input_tokens']}（缓存读取 {usage['cache_read_input_tokens']}，"
+            f"缓存写入 {usage['cache_creation_input_tokens']}），输出 {usage['output_tokens']}"
+        )
+        with self._lock:
+            self._totals["calls"] += 1
+            for key, value in usage.items():
+                self._totals[key] += value
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+        inputs = totals["input_tokens"]
+        totals["cache_hit_rate"] = totals["cache_read_input_tokens"] / inputs if inputs else 0.0
+        return totals
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,249 @@
+"""通用问题的语义响应缓存
+
+会话的第一个问题（如行李额度、退款规则）通常与乘客数据无关，这里在 /chat 前面按问题向量查找
+相似度超过阈值的已有回答，命中时不再执行 LLM 和 lookup_policy。问题向量使用政策检索
+（VectorStoreRetriever）的同一个嵌入器，也就共享它的查询向量缓存。
+
+只有满足以下条件的回答才会写入缓存，避免一个乘客的信息出现在另一个乘客的回答中：
+- 新会话的第一条消息（没有上下文，回答只取决于问题本身）；
+- 本轮调用的工具全部明确标记为非个人工具（mark_personal(tool, False)），未标记的工具一律视为个人工具；
+- 回答中不包含当前乘客的 passenger_id。
+
+向量存放在预分配的矩阵中，查找是一次矩阵乘法；条目按 TTL 过期，满了以后淘汰最久未命中的条目。
+默认嵌入器加载失败时（如本地没有政策索引且无法下载 FAQ）不在每个请求上重试：
+缓存在 RESPONSE_CACHE_RETRY_SECONDS 内直接跳过，查找总是未命中、写入被忽略。
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def mark_personal(tool: BaseTool, personal: bool = True) -> BaseTool:
+    """标记工具是否读取或修改乘客个人数据，调用过个人工具的回答不会被缓存"""
+    tool.metadata = {**(tool.metadata or {}), "personal": personal}
+    return tool
+
+
+def shared_tool_names(tools: Iterable[BaseTool]) -> frozenset[str]:
+    """明确标记为非个人工具的名称集合（没有标记的工具按个人工具处理）"""
+    return frozenset(tool.name for tool in tools if (tool.metadata or {}).get("personal", True) is False)
+
+
+def shareable_answer(
+    turn: Sequence[BaseMessage],
+    shared_tools: Iterable[str],
+    passenger_id: Optional[str] = None,
+) -> Optional[str]:
+    """判断一轮对话的回答能否给其他乘客复用
+
+    Args:
+        turn: 本轮的消息，从用户问题开始到最终回答
+        shared_tools: 非个人工具的名称，调用了其他任何工具的回答都不可复用
+        passenger_id: 当前乘客，回答中出现时不缓存
+
+    Returns:
+        可以缓存的回答文本，不可缓存时返回 None
+    """
+    shared = set(shared_tools)
+    for message in turn:
+        for call in getattr(message, "tool_calls", None) or ():
+            if call["name"] not in shared:
+                return None
+    answer = turn[-1] if turn else None
+    if not isinstance(answer, AIMessage) or answer.tool_calls or answer.response_metadata.get("fallback"):
+        return None
+    content = answer.content
+    text = content if isinstance(content, str) else "".join(
+        block.get("text", "") for block in content if isinstance(block, dict)
+    )
+    if not text.strip() or (passenger_id and passenger_id in text):
+        return None
+    return text
+
+
+class SemanticResponseCache:
+    """按问题向量相似度复用回答的缓存（线程安全）
+
+    Args:
+        embed: 文本 -> 向量，默认使用政策检索的查询嵌入器
+        max_entries: 条目上限
+        ttl_seconds: 条目存活时间
+        threshold: 命中所需的最小余弦相似度
+        clock: 时钟函数，测试时可替换
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], np.ndarray]] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        threshold: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._embed = embed
+        self.max_entries = settings.RESPONSE_CACHE_SIZE if max_entries is None else max_entries
+        if self.max_entries < 1:
+            raise ValueError("max_entries 必须大于 0")
+        self.ttl_seconds = settings.RESPONSE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.threshold = settings.RESPONSE_CACHE_THRESHOLD if threshold is None else threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        # 过期时间为 0 的槽位是空的
+        self._expires = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+        self._answers: list[Optional[str]] = [None] * self.max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 默认嵌入器加载失败后，在这一时刻之前不再尝试
+        self._retry_at: Optional[float] = None
+
+    def _load_embedder(self) -> Optional[Callable[[str], np.ndarray]]:
+        """加载政策检索的查询嵌入器；失败时只记录一次日志，退避期内返回 None"""
+        if self._retry_at is not None and self._clock() < self._retry_at:
+            return None
+        from app.services.customer_support.tools.policy_tool import get_retriever
+
+        try:
+            embed = get_retriever().embedder.embed_query
+        except Exception as e:
+            if self._retry_at is None:
+                logger.warning(
+                    f"语义响应缓存的嵌入器不可用，{settings.RESPONSE_CACHE_RETRY_SECONDS:g} 秒内跳过缓存: {str(e)}"
+                )
+            self._retry_at = self._clock() + settings.RESPONSE_CACHE_RETRY_SECONDS
+            return None
+        if self._retry_at is not None:
+            logger.info("语义响应缓存的嵌入器已恢复")
+            self._retry_at = None
+        self._embed = embed
+        return embed
+
+    def _embedding(self, question: str) -> Optional[np.ndarray]:
+        """问题的单位向量，嵌入器不可用时返回 None"""
+        embed = self._embed or self._load_embedder()
+        if embed is None:
+            return None
+        vector = np.asarray(embed(question), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _best(self, vector: np.ndarray, now: float) -> tuple[int, float]:
+        """相似度最高的有效条目 (槽位, 相似度)，没有时返回 (-1, -1.0)；调用方持有锁"""
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            return -1, -1.0
+        expired = (self._expires > 0) & (self._expires <= now)
+        for slot in np.flatnonzero(expired):
+            self._expires[slot] = 0
+            self._answers[slot] = None
+        live = self._expires > 0
+        if not live.any():
+            return -1, -1.0
+        scores = np.where(live, self._vectors @ vector, -1.0)
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def lookup(self, question: str) -> Optional[str]:
+        """返回相似问题的已缓存回答"""
+        vector = self._embedding(question)
+        if vector is None:
+            return None
+        now = self._clock()
+        with self._lock:
+            slot, score = self._best(vector, now)
+            if slot >= 0 and score >= self.threshold:
+                self._last_used[slot] = now
+                self.hits += 1
+                logger.info(f"语义响应缓存命中（相似度 {score:.3f}）")
+                return self._answers[slot]
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str) -> None:
+        """缓存回答；已有足够相似的问题时覆盖该条目，否则占用空槽位或淘汰最久未命中的条目"""
+        vector = self._embedding(question)
+        if vector is None:
+            return
+        now = self._clock()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # 首次写入或嵌入器的维度变化：旧向量不再可比较
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._expires[:] = 0
+                self._answers = [None] * self.max_entries
+            slot, score = self._best(vector, now)
+            if slot < 0 or score < self.threshold:
+                free = np.flatnonzero(self._expires == 0)
+                if len(free):
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self.evictions += 1
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+
+    async def alookup(self, question: str) -> Optional[str]:
+        # 嵌入可能需要访问网络，放到线程中执行
+        return await asyncio.to_thread(self.lookup, question)
+
+    async def astore(self, question: str, answer: str) -> None:
+        await asyncio.to_thread(self.store, question, answer)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires[:] = 0
+            self._answers = [None] * self.max_entries
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int((self._expires > 0).sum()),
+                "max_size": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache: Optional[SemanticResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SemanticResponseCache:
+    """全局响应缓存，首次使用时按配置创建"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticResponseCache()
+    return _cache
+
+
+def set_response_cache(cache: Optional[SemanticResponseCache]) -> None:
+    """替换（或用 None 重置）全局响应缓存，供测试使用"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def first_question(messages: Sequence[BaseMessage]) -> Optional[str]:
+    """新会话只有一条用户消息时返回它的文本，其余情况回答可能依赖上下文"""
+    if len(messages) != 1 or not isinstance(messages[0], HumanMessage):
+        return None
+    text = messages[0].content
+    return text if isinstance(text, str) and text.strip() else None
@@ -0,0 +1 @@
+# 可以为空文件
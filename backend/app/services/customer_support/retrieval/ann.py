@@ -0,0 +1,162 @@
+"""倒排文件（IVF）近似最近邻检索
+
+向量先用球面 k-means 划分成 nlist 个簇，查询时只对最相近的 nprobe 个簇内的文档精确打分。
+倒排表以 CSR 形式保存（order + offsets），和向量矩阵一样可以 mmap 加载。
+要求文档向量和查询向量都已 L2 归一化（内积即余弦相似度）。
+"""
+import logging
+import math
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+ORDER_FILE = "ivf_order.npy"
+OFFSETS_FILE = "ivf_offsets.npy"
+
+# 分块计算相似度，避免 n × nlist 的大矩阵一次性占满内存
+_ASSIGN_CHUNK = 8192
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """逐行 L2 归一化为 float32，零向量保持为零"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = np.asarray(vectors[start:start + _ASSIGN_CHUNK], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """按分数从高到低返回前 k 个位置（对每一行）"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    idx = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=-1), axis=-1)
+    return np.take_along_axis(idx, order, axis=-1)
+
+
+class IVFIndex:
+    """IVF 近似检索
+
+    Args:
+        centroids: (nlist, dim) 归一化的簇中心
+        order: 按簇排列的文档编号
+        offsets: 长度 nlist + 1，第 c 个簇的文档为 order[offsets[c]:offsets[c + 1]]
+        nprobe: 每个查询检查的簇数
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        *,
+        iterations: int = 10,
+        nprobe: int = 8,
+        seed: int = 0,
+        max_train: int = 256,
+    ) -> "IVFIndex":
+        """训练簇中心并建立倒排表
+
+        Args:
+            vectors: (n, dim) 归一化的文档向量
+            nlist: 簇数，默认约为 sqrt(n)
+            iterations: k-means 迭代次数
+            nprobe: 查询时检查的簇数
+            seed: 随机种子，保证构建结果可复现
+            max_train: 每个簇最多使用的训练样本数
+
+        Returns:
+            IVFIndex
+        """
+        n = len(vectors)
+        nlist = max(1, min(n, nlist or int(math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        # 只在采样上训练簇中心，然后把全部文档分配到最近的簇
+        sample_size = min(n, nlist * max_train)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # 空簇重新随机取一个样本作为中心
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids.astype(np.float32), order, offsets, nprobe)
+
+    def search(self, vectors: np.ndarray, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """对每个查询返回 (文档编号, 分数)，按分数降序
+
+        Args:
+            vectors: 建索引时使用的文档向量
+            queries: (m, dim) 归一化的查询向量
+            k: 每个查询返回的结果数
+        """
+        nprobe = min(self.nprobe, self.nlist)
+        probes = top_k(queries @ self.centroids.T, nprobe)
+        results = []
+        for query, clusters in zip(queries, probes):
+            candidates = np.concatenate(
+                [self.order[self.offsets[c]:self.offsets[c + 1]] for c in clusters]
+            )
+            if len(candidates) == 0:
+                results.append((candidates.astype(np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            # 候选编号排序后再取向量，mmap 上的访问更接近顺序读取
+            candidates.sort()
+            scores = vectors[candidates] @ query
+            best = top_k(scores, k)
+            results.append((candidates[best].astype(np.int64), scores[best]))
+        return results
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """需要写入索引目录的文件名与数组"""
+        return {
+            CENTROIDS_FILE: self.centroids,
+            ORDER_FILE: self.order,
+            OFFSETS_FILE: self.offsets,
+        }
+
+    @classmethod
+    def load(cls, index_dir: Path, nprobe: int = 8) -> Optional["IVFIndex"]:
+        try:
+            return cls(
+                np.load(index_dir / CENTROIDS_FILE),
+                np.load(index_dir / ORDER_FILE, mmap_mode="r"),
+                np.load(index_dir / OFFSETS_FILE),
+                nprobe,
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取 IVF 索引失败 {index_dir}: {str(e)}")
+            return None
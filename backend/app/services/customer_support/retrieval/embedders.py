@@ -0,0 +1,260 @@
+"""可替换的文本嵌入实现
+
+所有嵌入器都返回 float32 矩阵，name 参与索引内容哈希和查询缓存的键，
+更换模型后旧索引和旧缓存会自动失效。
+"""
+import hashlib
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import SQLiteConnectionPool, resolve_database_path
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder:
+    """嵌入器接口"""
+
+    name: str = "embedder"
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: Sequence[str]) -> np.ndarray:
+        return self.embed_documents(texts)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings 接口，客户端在首次调用时才创建
+
+    Args:
+        model: 嵌入模型名称
+        client: 已有的 OpenAI 客户端，默认使用环境变量中的密钥创建
+        batch_size: 单次请求最多包含的文本数
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small", client=None, batch_size: int = 512):
+        # 名称直接使用模型名，与之前构建的索引保持兼容
+        self.name = model
+        self.model = model
+        self._client = client
+        self.batch_size = batch_size
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+
+            self._client = openai.Client()
+        return self._client
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(
+                model=self.model, input=list(texts[start:start + self.batch_size])
+            )
+            vectors.extend(item.embedding for item in response.data)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingEmbedder(Embedder):
+    """本地 CPU 嵌入：词和字符三元组经特征哈希映射到固定维度
+
+    不需要网络和模型文件，结果完全确定，适合离线部署和测试。
+    语义能力弱于神经网络模型，主要依赖词面重合。
+
+    Args:
+        dim: 向量维度
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-v1-{dim}"
+
+    def _features(self, text: str) -> list[tuple[str, float]]:
+        features = []
+        for word in _TOKEN_RE.findall(text.lower()):
+            features.append((word, 1.0))
+            padded = f"<{word}>"
+            features.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+        return features
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            # 不能用内置 hash()，它在每个进程中的种子不同
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += weight if (h >> 63) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._embed_one(text) for text in texts])
+
+
+def normalize_query(text: str) -> str:
+    """缓存键：小写并合并空白，让仅有大小写或空格差异的问题命中同一条缓存"""
+    return " ".join(text.lower().split())
+
+
+class CachedEmbedder(Embedder):
+    """为查询向量加上内存 LRU 与磁盘两级缓存
+
+    文档向量只在构建索引时计算一次，不经过缓存。
+
+    Args:
+        embedder: 实际计算向量的嵌入器
+        max_size: 内存 LRU 的条目上限
+        cache_path: 磁盘缓存（SQLite）路径，None 表示只使用内存
+    """
+
+    def __init__(self, embedder: Embedder, max_size: int = 1024, cache_path: Optional[Path] = None):
+        self.embedder = embedder
+        self.name = embedder.name
+        self._memory: LRUCache[str, np.ndarray] = LRUCache(max_size)
+        self._pool = SQLiteConnectionPool(str(cache_path), max_size=2) if cache_path else None
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+        if self._pool is not None:
+            with self._pool.connection() as conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS query_embeddings (
+                        embedder TEXT NOT NULL,
+                        query TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        PRIMARY KEY (embedder, query)
+                    )
+                    """
+                )
+                conn.commit()
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        return self.embedder.embed_documents(texts)
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        if self._pool is None:
+            return None
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT vector FROM query_embeddings WHERE embedder = ? AND query = ?",
+                (self.name, key),
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def _disk_put(self, key: str, vector: np.ndarray) -> None:
+        if self._pool is None:
+            return
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (embedder, query, vector) VALUES (?, ?, ?)",
+                (self.name, key, np.asarray(vector, dtype=np.float32).tobytes()),
+            )
+            conn.commit()
+
+    def embed_query(self, text: str) -> np.ndarray:
+        key = normalize_query(text)
+        vector = self._memory.get(key)
+        if vector is not None:
+            return vector
+
+        vector = self._disk_get(key)
+        if vector is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            vector = np.asarray(self.embedder.embed_query(key), dtype=np.float32)
+            self._disk_put(key, vector)
+        self._memory.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: Sequence[str]) -> np.ndarray:
+        """批量版本：缓存未命中的查询合并为一次嵌入调用"""
+        keys = [normalize_query(text) for text in texts]
+        vectors: dict[str, np.ndarray] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            vector = self._memory.get(key)
+            if vector is None:
+                vector = self._disk_get(key)
+                if vector is not None:
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._memory.put(key, vector)
+            if vector is None:
+                missing.append(key)
+            else:
+                vectors[key] = vector
+
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            computed = np.asarray(self.embedder.embed_queries(missing), dtype=np.float32)
+            for key, vector in zip(missing, computed):
+                self._disk_put(key, vector)
+                self._memory.put(key, vector)
+                vectors[key] = vector
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def stats(self) -> dict[str, Any]:
+        memory = self._memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory": memory,
+            "disk_hits": self.disk_hits,
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+
+
+def create_embedder(backend: Optional[str] = None) -> Embedder:
+    """根据配置创建嵌入器："openai" 或本地的 "hashing"
+
+    Args:
+        backend: 覆盖 settings.POLICY_EMBEDDER
+
+    Returns:
+        嵌入器实例
+    """
+    backend = (backend or settings.POLICY_EMBEDDER).lower()
+    if backend == "openai":
+        return OpenAIEmbedder(settings.POLICY_EMBEDDING_MODEL)
+    if backend == "hashing":
+        return HashingEmbedder(settings.POLICY_HASHING_DIM)
+    raise ValueError(f"未知的嵌入器类型: {backend}")
+
+
+def create_query_embedder(embedder: Embedder) -> CachedEmbedder:
+    """按配置为查询加上缓存，POLICY_QUERY_CACHE_PATH 为空时只使用内存缓存"""
+    cache_path = (
+        resolve_database_path(settings.POLICY_QUERY_CACHE_PATH)
+        if settings.POLICY_QUERY_CACHE_PATH
+        else None
+    )
+    return CachedEmbedder(embedder, settings.POLICY_QUERY_CACHE_SIZE, cache_path)
@@ -0,0 +1,262 @@
+"""政策 FAQ 向量索引的离线构建与加载
+
+索引目录包含三个文件：
+    vectors.npy  L2 归一化的 float32 向量矩阵，运行时以 mmap 只读方式加载，多个 worker 共享同一份页缓存
+    chunks.json  与向量逐行对应的文档分块
+    meta.json    内容哈希、嵌入模型、维度等元数据，最后写入，用来判断索引是否完整且最新
+
+文档数达到 POLICY_ANN_MIN_DOCS 时还会写入 IVF 近似检索的簇中心和倒排表（ivf_*.npy）。
+
+离线构建（openai 嵌入器需要网络和 OPENAI_API_KEY，hashing 嵌入器完全本地）：
+    python -m app.services.customer_support.retrieval.index [--embedder hashing] [--force]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import resolve_database_path
+
+from .ann import IVFIndex, normalize_rows
+from .embedders import Embedder, create_embedder
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+META_FILE = "meta.json"
+
+
+@dataclass
+class PolicyIndex:
+    chunks: list[str]
+    vectors: np.ndarray
+    meta: dict
+    ann: Optional[IVFIndex] = None
+
+    @property
+    def docs(self) -> list[dict]:
+        return [{"page_content": chunk} for chunk in self.chunks]
+
+
+def split_sections(text: str) -> list[str]:
+    """按二级标题切分 FAQ（与最初在线构建时的切分方式一致）"""
+    return re.split(r"(?=\n##)", text)
+
+
+def content_hash(text: str, model: str) -> str:
+    """原文和嵌入模型共同决定索引内容，任一变化都需要重建"""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def download_faq(url: str) -> str:
+    import requests
+
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+
+def _replace_file(path: Path, write: Callable[[Path], None]) -> None:
+    # 先写临时文件再原子替换，读取方不会看到写了一半的文件
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_array(array: np.ndarray) -> Callable[[Path], None]:
+    def write(tmp: Path) -> None:
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+
+    return write
+
+
+def write_index(
+    index_dir: Path,
+    chunks: Sequence[str],
+    vectors: np.ndarray,
+    meta: dict,
+    extra_arrays: Optional[dict[str, np.ndarray]] = None,
+) -> None:
+    """把索引写入目录，meta.json 最后写入
+
+    Args:
+        index_dir: 索引目录
+        chunks: 文档分块
+        vectors: 与分块逐行对应的向量
+        meta: 元数据
+        extra_arrays: 额外的 文件名 -> 数组（例如 IVF 倒排表）
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    # 先删除旧的 meta，中途失败时目录会被视为没有可用索引，而不是新旧文件混用
+    (index_dir / META_FILE).unlink(missing_ok=True)
+
+    _replace_file(index_dir / VECTORS_FILE, _write_array(np.asarray(vectors, dtype=np.float32)))
+    for name, array in (extra_arrays or {}).items():
+        _replace_file(index_dir / name, _write_array(array))
+    _replace_file(
+        index_dir / CHUNKS_FILE,
+        lambda tmp: tmp.write_text(json.dumps(list(chunks), ensure_ascii=False), encoding="utf-8"),
+    )
+    _replace_file(
+        index_dir / META_FILE,
+        lambda tmp: tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8"),
+    )
+
+
+def load_index(index_dir: Path) -> Optional[PolicyIndex]:
+    """以 mmap 方式加载索引，索引不存在或不完整时返回 None"""
+    meta_path = index_dir / META_FILE
+    if not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        chunks = json.loads((index_dir / CHUNKS_FILE).read_text(encoding="utf-8"))
+        vectors = np.load(index_dir / VECTORS_FILE, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取政策索引失败 {index_dir}: {str(e)}")
+        return None
+    if vectors.ndim != 2 or vectors.shape[0] != len(chunks) or meta.get("count") != len(chunks):
+        logger.warning(f"政策索引文件不一致，需要重建: {index_dir}")
+        return None
+    ann = None
+    if meta.get("ann"):
+        ann = IVFIndex.load(index_dir, settings.POLICY_ANN_NPROBE)
+        if ann is None:
+            return None
+    return PolicyIndex(chunks=chunks, vectors=vectors, meta=meta, ann=ann)
+
+
+def build_index(text: str, embedder: Embedder, index_dir: Path) -> PolicyIndex:
+    """切分原文、计算向量并写入索引目录
+
+    Args:
+        text: FAQ 原文
+        embedder: 嵌入器，其 name 参与内容哈希
+        index_dir: 索引目录
+
+    Returns:
+        重新加载后的索引（向量为 mmap）
+    """
+    start = time.perf_counter()
+    model = embedder.name
+    chunks = split_sections(text)
+    # 归一化后存储，查询时内积即余弦相似度，运行时无需再复制和转换矩阵
+    vectors = normalize_rows(embedder.embed_documents(chunks))
+    ann = None
+    if len(chunks) >= settings.POLICY_ANN_MIN_DOCS:
+        ann = IVFIndex.build(vectors, nprobe=settings.POLICY_ANN_NPROBE)
+    meta = {
+        "content_hash": content_hash(text, model),
+        "model": model,
+        "count": len(chunks),
+        "dim": int(vectors.shape[1]),
+        "normalized": True,
+        "ann": {"type": "ivf", "nlist": ann.nlist} if ann else None,
+        "built_at": time.time(),
+    }
+    write_index(index_dir, chunks, vectors, meta, ann.arrays() if ann else None)
+    logger.info(
+        f"政策索引已构建: {len(chunks)} 个分块, 维度 {meta['dim']}, "
+        f"IVF 簇数 {ann.nlist if ann else 0}, "
+        f"耗时 {time.perf_counter() - start:.2f}s -> {index_dir}"
+    )
+    return load_index(index_dir)
+
+
+def ensure_index(
+    index_dir: Path,
+    source_path: Path,
+    embedder: Embedder,
+    *,
+    fetch: Optional[Callable[[], str]] = None,
+    force: bool = False,
+) -> PolicyIndex:
+    """加载索引，内容哈希与本地原文不一致或索引缺失时才重建
+
+    只有索引存在而本地没有原文时直接信任索引，启动过程不访问网络。
+
+    Args:
+        index_dir: 索引目录
+        source_path: 本地 FAQ 原文路径
+        embedder: 嵌入器，索引必须由同名嵌入器构建，重建时也用它计算向量
+        fetch: 本地没有原文时获取原文的函数（例如下载），获取后写入 source_path
+        force: 忽略哈希强制重建
+
+    Returns:
+        可用的索引
+    """
+    model = embedder.name
+    index = None if force else load_index(index_dir)
+    text = source_path.read_text(encoding="utf-8") if source_path.exists() else None
+
+    if index is not None:
+        if index.meta.get("model") != model:
+            logger.info(f"索引由 {index.meta.get('model')} 构建，当前嵌入器为 {model}，重建索引")
+        elif text is None or index.meta.get("content_hash") == content_hash(text, model):
+            return index
+        else:
+            logger.info("政策原文已变化，重建索引")
+
+    if text is None:
+        if fetch is None:
+            raise FileNotFoundError(f"找不到政策原文 {source_path}，也没有可用的索引 {index_dir}")
+        logger.warning(f"本地没有政策原文，正在获取并保存到 {source_path}")
+        text = fetch()
+        source_path.parent.mkdir(parents=True, exist_ok=True)
+        source_path.write_text(text, encoding="utf-8")
+
+    return build_index(text, embedder, index_dir)
+
+
+def default_paths() -> tuple[Path, Path]:
+    """配置中的 (索引目录, 原文路径)"""
+    return (
+        resolve_database_path(settings.POLICY_INDEX_DIR),
+        resolve_database_path(settings.POLICY_FAQ_PATH),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="构建政策 FAQ 向量索引")
+    parser.add_argument("--source", help="FAQ 原文路径，默认取 POLICY_FAQ_PATH，不存在时从 POLICY_FAQ_URL 下载")
+    parser.add_argument("--index-dir", help="索引目录，默认取 POLICY_INDEX_DIR")
+    parser.add_argument("--embedder", help="嵌入器类型（openai / hashing），默认取 POLICY_EMBEDDER")
+    parser.add_argument("--force", action="store_true", help="忽略内容哈希强制重建")
+    args = parser.parse_args()
+
+    index_dir, source_path = default_paths()
+    if args.index_dir:
+        index_dir = Path(args.index_dir).resolve()
+    if args.source:
+        source_path = Path(args.source).resolve()
+
+    index = ensure_index(
+        index_dir,
+        source_path,
+        create_embedder(args.embedder),
+        fetch=lambda: download_faq(settings.POLICY_FAQ_URL),
+        force=args.force,
+    )
+    print(
+        f"{index_dir}: {index.meta['count']} chunks, dim={index.meta['dim']}, "
+        f"embedder={index.meta['model']}, hash={index.meta['content_hash'][:12]}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import logging
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .ann import IVFIndex, normalize_rows, top_k
+from .embedders import Embedder
+from .index import PolicyIndex
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreRetriever:
+    """基于内积的向量检索，文档向量以 L2 归一化的 float32 矩阵存储
+
+    Args:
+        docs: 与向量逐行对应的文档
+        vectors: 文档向量；已归一化的 float32 矩阵（包括 mmap）不会被复制
+        embedder: 查询嵌入器
+        ann: 可选的 IVF 近似检索，提供时查询只扫描候选簇
+        normalized: vectors 是否已归一化
+    """
+
+    def __init__(
+        self,
+        docs: list,
+        vectors,
+        embedder: Embedder,
+        *,
+        ann: Optional[IVFIndex] = None,
+        normalized: bool = False,
+    ):
+        if normalized:
+            # 保持 mmap 不复制，多个 worker 共享页缓存
+            self._arr = np.asarray(vectors, dtype=np.float32)
+        else:
+            self._arr = normalize_rows(vectors)
+        self._docs = docs
+        self._embedder = embedder
+        self._ann = ann
+
+    @classmethod
+    def from_docs(cls, docs, embedder: Embedder, *, ann: bool = False, nprobe: int = 8):
+        vectors = normalize_rows(embedder.embed_documents([doc["page_content"] for doc in docs]))
+        ivf = IVFIndex.build(vectors, nprobe=nprobe) if ann else None
+        return cls(docs, vectors, embedder, ann=ivf, normalized=True)
+
+    @classmethod
+    def from_index(cls, index: PolicyIndex, embedder: Embedder):
+        """使用离线构建好的索引，不需要再次计算文档向量
+
+        Raises:
+            ValueError: 索引不是由同一个嵌入器构建的，向量空间不一致
+        """
+        if index.meta.get("model") != embedder.name:
+            raise ValueError(
+                f"索引由 {index.meta.get('model')} 构建，与查询嵌入器 {embedder.name} 不一致"
+            )
+        normalized = bool(index.meta.get("normalized"))
+        if not normalized:
+            logger.info("索引中的向量未归一化，将在内存中归一化（重建索引可避免这次复制）")
+        return cls(index.docs, index.vectors, embedder, ann=index.ann, normalized=normalized)
+
+    @property
+    def embedder(self) -> Embedder:
+        return self._embedder
+
+    def _search(self, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        if self._ann is not None:
+            return self._ann.search(self._arr, queries, k)
+        # 所有查询一次矩阵乘法完成打分
+        scores = queries @ self._arr.T
+        best = top_k(scores, k)
+        return [(idx, row[idx]) for idx, row in zip(best, scores)]
+
+    def query_batch(self, queries: Sequence[str], k: int = 5) -> list[list[dict]]:
+        """批量检索，查询向量一次嵌入、一次打分
+
+        Args:
+            queries: 查询文本
+            k: 每个查询返回的文档数
+
+        Returns:
+            与 queries 一一对应的结果列表，每个结果按相似度降序
+        """
+        if not queries:
+            return []
+        vectors = normalize_rows(self._embedder.embed_queries(list(queries)))
+        return [
+            [{**self._docs[i], "similarity": float(score)} for i, score in zip(idx, scores)]
+            for idx, scores in self._search(vectors, k)
+        ]
+
+    def query(self, query: str, k: int = 5) -> list[dict]:
+        embed = normalize_rows(self._embedder.embed_query(query)[np.newaxis, :])
+        idx, scores = self._search(embed, k)[0]
+        return [
+            {**self._docs[i], "similarity": float(score)} for i, score in zip(idx, scores)
+        ]
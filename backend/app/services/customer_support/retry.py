@@ -0,0 +1,86 @@
+"""助手调用 LLM 的重试策略与请求时限
+
+路由在 config["configurable"] 中写入整个请求的截止时间（DEADLINE_KEY，time.monotonic 时刻），
+助手每次调用 LLM 的超时取 单次超时 与 剩余时间 的较小值，剩余时间不够时不再发起重试。
+键名以 "__" 开头，LangGraph 不会把它写入检查点元数据。
+"""
+import random
+import time
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from app.core.config import settings
+
+DEADLINE_KEY = "__request_deadline"
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的总时限已用完"""
+
+
+def with_deadline(config: RunnableConfig, seconds: Optional[float] = None) -> RunnableConfig:
+    """返回带请求截止时间的 config 副本
+
+    Args:
+        config: 线程配置
+        seconds: 从现在起的时限，默认取 settings.CHAT_REQUEST_TIMEOUT_SECONDS
+
+    Returns:
+        新的 config
+    """
+    seconds = settings.CHAT_REQUEST_TIMEOUT_SECONDS if seconds is None else seconds
+    configurable = {**config.get("configurable", {}), DEADLINE_KEY: time.monotonic() + seconds}
+    return {**config, "configurable": configurable}
+
+
+def remaining_time(config: Optional[RunnableConfig]) -> Optional[float]:
+    """请求剩余的秒数，没有设置截止时间时返回 None"""
+    deadline = (config or {}).get("configurable", {}).get(DEADLINE_KEY)
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动（full jitter）的重试策略
+
+    第 n 次失败后等待 uniform(0, min(max_delay, base_delay * 2 ** (n - 1))) 秒，
+    多个 worker 同时遇到上游异常时不会在同一时刻一起重试。
+
+    Args:
+        max_attempts: 最多调用次数（含第一次）
+        base_delay: 退避基准（秒）
+        max_delay: 单次退避上限（秒）
+        call_timeout: 单次调用超时（秒），0 表示只受请求总时限约束
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        call_timeout: Optional[float] = None,
+    ):
+        self.max_attempts = max(1, max_attempts or settings.LLM_MAX_ATTEMPTS)
+        self.base_delay = settings.LLM_RETRY_BASE_DELAY_SECONDS if base_delay is None else base_delay
+        self.max_delay = settings.LLM_RETRY_MAX_DELAY_SECONDS if max_delay is None else max_delay
+        self.call_timeout = settings.LLM_CALL_TIMEOUT_SECONDS if call_timeout is None else call_timeout
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次调用失败后的等待时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def timeout(self, config: Optional[RunnableConfig]) -> Optional[float]:
+        """本次调用的超时：单次超时与请求剩余时间的较小值，两者都没有时返回 None（不限制）
+
+        Raises:
+            DeadlineExceeded: 请求时限已用完
+        """
+        limit = self.call_timeout or None
+        remaining = remaining_time(config)
+        if remaining is None:
+            return limit
+        if remaining <= 0:
+            raise DeadlineExceeded("请求已超过总时限")
+        return remaining if limit is None else min(limit, remaining)
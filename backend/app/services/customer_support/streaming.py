@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def _chunk_text(chunk: Any) -> str:
+    """从 AIMessageChunk 中取出文本，Anthropic 的内容可能是分块列表"""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "")
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def _tool_output(output: Any) -> Any:
+    # ToolNode 产生的输出是 ToolMessage，只把内容推给客户端
+    return getattr(output, "content", output)
+
+
+def translate_event(raw: dict, token_nodes: Iterable[str] = ("assistant",)) -> Optional[dict]:
+    """把 astream_events(v2) 的原始事件转换为推送给客户端的事件，无关事件返回 None
+
+    Args:
+        raw: LangGraph 产生的原始事件
+        token_nodes: 只转发这些节点中 LLM 产生的 token
+
+    Returns:
+        {"type": "token" | "tool_start" | "tool_end", ...} 或 None
+    """
+    kind = raw.get("event")
+    if kind == "on_chat_model_stream":
+        node = raw.get("metadata", {}).get("langgraph_node")
+        if node not in token_nodes:
+            return None
+        text = _chunk_text(raw.get("data", {}).get("chunk"))
+        return {"type": "token", "content": text} if text else None
+    if kind == "on_tool_start":
+        return {
+            "type": "tool_start",
+            "run_id": raw.get("run_id"),
+            "name": raw.get("name"),
+            "input": raw.get("data", {}).get("input"),
+        }
+    if kind == "on_tool_end":
+        return {
+            "type": "tool_end",
+            "run_id": raw.get("run_id"),
+            "name": raw.get("name"),
+            "output": _tool_output(raw.get("data", {}).get("output")),
+        }
+    return None
+
+
+async def stream_graph_events(
+    graph,
+    inputs: Any,
+    config: dict,
+    *,
+    max_buffer: Optional[int] = None,
+    token_nodes: Iterable[str] = ("assistant",),
+) -> AsyncIterator[dict]:
+    """以有界缓冲区的方式推送图执行过程中的事件
+
+    图在后台任务中运行，事件通过容量为 max_buffer 的队列交给调用方。
+    客户端读得慢时，新 token 会合并成一条事件而不是无限堆积；工具事件不会被合并，
+    队列满时会等待。调用方停止迭代（例如客户端断开）时，后台任务会被取消。
+
+    Args:
+        graph: 编译好的 LangGraph 图
+        inputs: 传给图的输入
+        config: 运行配置（包含 thread_id 等）
+        max_buffer: 队列容量，默认取 settings.STREAM_QUEUE_SIZE，0 表示不限制（与 asyncio.Queue 相同）
+        token_nodes: 需要转发 token 的节点
+
+    Yields:
+        translate_event 产生的事件字典
+    """
+    token_nodes = tuple(token_nodes)
+    queue: asyncio.Queue = asyncio.Queue(
+        maxsize=settings.STREAM_QUEUE_SIZE if max_buffer is None else max_buffer
+    )
+    pending_tokens: list[str] = []
+    errors: list[BaseException] = []
+
+    def offer_token(text: str) -> None:
+        pending_tokens.append(text)
+        if not queue.full():
+            queue.put_nowait({"type": "token", "content": "".join(pending_tokens)})
+            pending_tokens.clear()
+
+    async def flush_tokens() -> None:
+        if pending_tokens:
+            await queue.put({"type": "token", "content": "".join(pending_tokens)})
+            pending_tokens.clear()
+
+    async def produce() -> None:
+        try:
+            async for raw in graph.astream_events(inputs, config, version="v2"):
+                event = translate_event(raw, token_nodes)
+                if event is None:
+                    continue
+                if event["type"] == "token":
+                    offer_token(event["content"])
+                else:
+                    await flush_tokens()
+                    await queue.put(event)
+            await flush_tokens()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            errors.append(e)
+        await queue.put(_DONE)
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        if not task.done():
+            logger.info("客户端已断开，取消图的执行")
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 会修改数据的工具，同一乘客的这类调用必须按顺序执行
+WRITE_TOOL_PREFIXES = ("book_", "update_", "cancel_")
+
+
+def is_write_tool(name: str) -> bool:
+    return name.startswith(WRITE_TOOL_PREFIXES)
+
+
+class _LoopPrimitives:
+    """某个事件循环专用的信号量和乘客锁（asyncio 原语不能跨事件循环使用）"""
+
+    def __init__(self, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # 没有调用在使用时锁会被回收，乘客数量不会让字典无限增长
+        self.locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class ToolCallScheduler:
+    """ToolNode 的工具调用拦截器：限制并发数，写操作按乘客串行
+
+    ToolNode 会并发执行同一条 AIMessage 中的全部工具调用，并按调用顺序返回结果。
+    这里在此基础上限制同时执行的工具数，并让同一乘客的 book_* / update_* / cancel_*
+    按调用出现的顺序逐个执行（锁是先进先出的），只读工具不受影响。
+
+    Args:
+        max_concurrency: 同时执行的工具调用上限，默认取 settings.TOOL_MAX_CONCURRENCY
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = settings.TOOL_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        if self.max_concurrency < 1:
+            raise ValueError("max_concurrency 必须大于 0")
+        self._guard = threading.Lock()
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPrimitives]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _passenger_id(request) -> str:
+        runtime = getattr(request, "runtime", None)
+        config = getattr(runtime, "config", None) or {}
+        return str(config.get("configurable", {}).get("passenger_id") or "")
+
+    def _loop_primitives(self) -> _LoopPrimitives:
+        loop = asyncio.get_running_loop()
+        with self._guard:
+            primitives = self._loops.get(loop)
+            if primitives is None:
+                primitives = self._loops[loop] = _LoopPrimitives(self.max_concurrency)
+            return primitives
+
+    async def awrap(self, request, execute: Callable[[Any], Awaitable[Any]]) -> Any:
+        primitives = self._loop_primitives()
+        name = request.tool_call["name"]
+        if not is_write_tool(name):
+            async with primitives.semaphore:
+                return await execute(request)
+
+        passenger_id = self._passenger_id(request)
+        with self._guard:
+            lock = primitives.locks.get(passenger_id)
+            if lock is None:
+                lock = primitives.locks[passenger_id] = asyncio.Lock()
+        # 先拿乘客锁再占并发名额，排队等待的写操作不会占用名额
+        async with lock:
+            async with primitives.semaphore:
+                logger.debug(f"执行写操作 {name}: passenger_id={passenger_id}")
+                return await execute(request)
+
+    def wrap(self, request, execute: Callable[[Any], Any]) -> Any:
+        """同步执行路径（graph.invoke）使用的版本
+
+        同步路径由线程池执行，同一乘客的写操作互斥，但不保证按调用顺序执行。
+        """
+        name = request.tool_call["name"]
+        if not is_write_tool(name):
+            with self._semaphore:
+                return execute(request)
+
+        passenger_id = self._passenger_id(request)
+        with self._guard:
+            lock = self._locks.get(passenger_id)
+            if lock is None:
+                lock = self._locks[passenger_id] = threading.Lock()
+        with lock:
+            with self._semaphore:
+                return execute(request)
@@ -1,20 +1,27 @@
-from datetime import date, datetime
-from typing import Optional, Union
+from typing import Optional
 from langchain_core.tools import tool
-import sqlite3
-from app.core.config import settings
+from app.core.availability import CALENDAR_TABLE, availability_condition, date_error, iso_day, sync_reservation
+from app.core.database import get_connection, write_transaction
+from app.core.fts import build_search, fts_table
+from app.core.schema import get_schema
+from app.core.table_versions import bump_versions
+from app.services.customer_support.tools.memoize import memoize
+from app.services.customer_support.tools.result_shaping import fetch_page
 
-db = settings.DATABASE_URL
+# 搜索结果返回给模型的列
+CAR_RENTALS_COLUMNS = ("id", "name", "location", "price_tier", "start_date", "end_date", "booked")
 
 
 @tool
+@memoize(tables=("car_rentals",))
 def search_car_rentals(
     location: Optional[str] = None,
     name: Optional[str] = None,
     price_tier: Optional[str] = None,
-    start_date: Optional[Union[datetime, date]] = None,
-    end_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> str:
     """
     Search for car rentals based on location, name, price tier, start date, and end date.
 
@@ -22,34 +29,43 @@ def search_car_rentals(
         location (Optional[str]): The location of the car rental. Defaults to None.
         name (Optional[str]): The name of the car rental company. Defaults to None.
         price_tier (Optional[str]): The price tier of the car rental. Defaults to None.
-        start_date (Optional[Union[datetime, date]]): The start date of the car rental. Defaults to None.
-        end_date (Optional[Union[datetime, date]]): The end date of the car rental. Defaults to None.
+        start_date (Optional[str]): The start date of the car rental, as an ISO 8601 date (2024-05-01). Defaults to None.
+        end_date (Optional[str]): The end date of the car rental, as an ISO 8601 date (2024-05-01). Defaults to None.
+        cursor (Optional[str]): The next_cursor from a previous search with the same criteria, to get the next page. Defaults to None.
 
     Returns:
-        list[dict]: A list of car rental dictionaries matching the search criteria.
+        str: A compact JSON table {"columns": [...], "rows": [[...]]} of the car rentals matching the search criteria.
+        Only car rentals that are not booked (or, when dates are given, free for those dates) are returned.
+        When there are more results it includes "next_cursor"; rows cut to keep the result small are described in "summary".
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM car_rentals WHERE 1=1"
-    params = []
-
-    if location:
-        query += " AND location LIKE ?"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE ?"
-        params.append(f"%{name}%")
-    # For our tutorial, we will let you match on any dates and price tier.
-    # (since our toy dataset doesn't have much data)
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-
-    conn.close()
-
-    return [
-        dict(zip([column[0] for column in cursor.description], row)) for row in results
-    ]
+    # 日期保持字符串，由 to_day 解析（原因见 search_flights）；无法解析时让模型改正后重试，而不是忽略日期
+    if error := date_error(start_date=start_date, end_date=end_date):
+        return error
+    schema = get_schema()
+    # 价格档次和日期在 SQL 中过滤，只返回可预订的记录
+    where = [availability_condition(
+        "car_rentals", start_date, end_date, use_calendar=schema.has_table(CALENDAR_TABLE)
+    )]
+    if price_tier:
+        where.append(("car_rentals.price_tier = ? COLLATE NOCASE", [price_tier]))
+    # 名称和地点走全文索引（前缀匹配、按相关度排序）
+    query, params = build_search(
+        "car_rentals",
+        {"location": location, "name": name},
+        where=where,
+        columns=CAR_RENTALS_COLUMNS,
+        use_fts=schema.has_table(fts_table("car_rentals")),
+    )
+    args = {
+        "location": location,
+        "name": name,
+        "price_tier": price_tier,
+        "start_date": start_date,
+        "end_date": end_date,
+        "cursor": cursor,
+    }
+    with get_connection() as conn:
+        return fetch_page(conn, query, params, tool="search_car_rentals", args=args)
 
 
 @tool
@@ -63,57 +79,54 @@ def book_car_rental(rental_id: int) -> str:
     Returns:
         str: A message indicating whether the car rental was successfully booked or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,))
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,)).rowcount
+        if updated:
+            bump_versions(conn, "car_rentals")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "car_rentals", rental_id)
+
+    if updated > 0:
         return f"Car rental {rental_id} successfully booked."
     else:
-        conn.close()
         return f"No car rental found with ID {rental_id}."
 
 
 @tool
 def update_car_rental(
     rental_id: int,
-    start_date: Optional[Union[datetime, date]] = None,
-    end_date: Optional[Union[datetime, date]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
 ) -> str:
     """
     Update a car rental's start and end dates by its ID.
 
     Args:
         rental_id (int): The ID of the car rental to update.
-        start_date (Optional[Union[datetime, date]]): The new start date of the car rental. Defaults to None.
-        end_date (Optional[Union[datetime, date]]): The new end date of the car rental. Defaults to None.
+        start_date (Optional[str]): The new start date of the car rental, as an ISO 8601 date (2024-05-01). Defaults to None.
+        end_date (Optional[str]): The new end date of the car rental, as an ISO 8601 date (2024-05-01). Defaults to None.
 
     Returns:
         str: A message indicating whether the car rental was successfully updated or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    if start_date:
-        cursor.execute(
-            "UPDATE car_rentals SET start_date = ? WHERE id = ?",
-            (start_date, rental_id),
-        )
-    if end_date:
-        cursor.execute(
-            "UPDATE car_rentals SET end_date = ? WHERE id = ?", (end_date, rental_id)
-        )
-
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    if error := date_error(start_date=start_date, end_date=end_date):
+        return error
+    start_date, end_date = iso_day(start_date), iso_day(end_date)
+    # 一条 UPDATE 同时修改两个日期，未提供的保持原值；rowcount 即匹配到的记录数
+    with write_transaction() as conn:
+        updated = conn.execute(
+            "UPDATE car_rentals SET start_date = COALESCE(?, start_date), end_date = COALESCE(?, end_date) "
+            "WHERE id = ?",
+            (start_date, end_date, rental_id),
+        ).rowcount
+        if updated:
+            bump_versions(conn, "car_rentals")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "car_rentals", rental_id)
+
+    if updated > 0:
         return f"Car rental {rental_id} successfully updated."
     else:
-        conn.close()
         return f"No car rental found with ID {rental_id}."
 
 
@@ -128,15 +141,14 @@ def cancel_car_rental(rental_id: int) -> str:
     Returns:
         str: A message indicating whether the car rental was successfully cancelled or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,))
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,)).rowcount
+        if updated:
+            bump_versions(conn, "car_rentals")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "car_rentals", rental_id)
+
+    if updated > 0:
         return f"Car rental {rental_id} successfully cancelled."
     else:
-        conn.close()
         return f"No car rental found with ID {rental_id}."
\ No newline at end of file
@@ -1,18 +1,25 @@
 from langchain_core.tools import tool
 from typing import Optional
-import sqlite3
 from datetime import date, datetime 
-from app.core.config import settings
+from app.core.database import get_connection, write_transaction
+from app.core.fts import build_search, fts_table
+from app.core.schema import get_schema
+from app.core.table_versions import bump_versions
+from app.services.customer_support.tools.memoize import memoize
+from app.services.customer_support.tools.result_shaping import fetch_page
 
-db = settings.DATABASE_URL
+# 搜索结果返回给模型的列
+TRIP_RECOMMENDATIONS_COLUMNS = ("id", "name", "location", "keywords", "details", "booked")
 
 
 @tool
+@memoize(tables=("trip_recommendations",))
 def search_trip_recommendations(
     location: Optional[str] = None,
     name: Optional[str] = None,
     keywords: Optional[str] = None,
-) -> list[dict]:
+    cursor: Optional[str] = None,
+) -> str:
     """
     Search for trip recommendations based on location, name, and keywords.
 
@@ -20,36 +27,24 @@ def search_trip_recommendations(
         location (Optional[str]): The location of the trip recommendation. Defaults to None.
         name (Optional[str]): The name of the trip recommendation. Defaults to None.
         keywords (Optional[str]): The keywords associated with the trip recommendation. Defaults to None.
+        cursor (Optional[str]): The next_cursor from a previous search with the same criteria, to get the next page. Defaults to None.
 
     Returns:
-        list[dict]: A list of trip recommendation dictionaries matching the search criteria.
+        str: A compact JSON table {"columns": [...], "rows": [[...]]} of the trip recommendations matching the search criteria.
+        When there are more results it includes "next_cursor"; rows cut to keep the result small are described in "summary".
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM trip_recommendations WHERE 1=1"
-    params = []
-
-    if location:
-        query += " AND location LIKE ?"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE ?"
-        params.append(f"%{name}%")
-    if keywords:
-        keyword_list = keywords.split(",")
-        keyword_conditions = " OR ".join(["keywords LIKE ?" for _ in keyword_list])
-        query += f" AND ({keyword_conditions})"
-        params.extend([f"%{keyword.strip()}%" for keyword in keyword_list])
-
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-
-    conn.close()
-
-    return [
-        dict(zip([column[0] for column in cursor.description], row)) for row in results
-    ]
+    # 逗号分隔的关键词命中任意一个即可
+    keyword_list = [keyword.strip() for keyword in keywords.split(",")] if keywords else []
+    query, params = build_search(
+        "trip_recommendations",
+        {"location": location, "name": name},
+        {"keywords": keyword_list},
+        columns=TRIP_RECOMMENDATIONS_COLUMNS,
+        use_fts=get_schema().has_table(fts_table("trip_recommendations")),
+    )
+    args = {"location": location, "name": name, "keywords": keywords, "cursor": cursor}
+    with get_connection() as conn:
+        return fetch_page(conn, query, params, tool="search_trip_recommendations", args=args)
 
 
 @tool
@@ -63,19 +58,16 @@ def book_excursion(recommendation_id: int) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully booked or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "UPDATE trip_recommendations SET booked = 1 WHERE id = ?", (recommendation_id,)
-    )
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute(
+            "UPDATE trip_recommendations SET booked = 1 WHERE id = ?", (recommendation_id,)
+        ).rowcount
+        if updated:
+            bump_versions(conn, "trip_recommendations")
+
+    if updated > 0:
         return f"Trip recommendation {recommendation_id} successfully booked."
     else:
-        conn.close()
         return f"No trip recommendation found with ID {recommendation_id}."
 
 
@@ -91,20 +83,17 @@ def update_excursion(recommendation_id: int, details: str) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully updated or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "UPDATE trip_recommendations SET details = ? WHERE id = ?",
-        (details, recommendation_id),
-    )
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute(
+            "UPDATE trip_recommendations SET details = ? WHERE id = ?",
+            (details, recommendation_id),
+        ).rowcount
+        if updated:
+            bump_versions(conn, "trip_recommendations")
+
+    if updated > 0:
         return f"Trip recommendation {recommendation_id} successfully updated."
     else:
-        conn.close()
         return f"No trip recommendation found with ID {recommendation_id}."
 
 
@@ -119,17 +108,14 @@ def cancel_excursion(recommendation_id: int) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully cancelled or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "UPDATE trip_recommendations SET booked = 0 WHERE id = ?", (recommendation_id,)
-    )
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute(
+            "UPDATE trip_recommendations SET booked = 0 WHERE id = ?", (recommendation_id,)
+        ).rowcount
+        if updated:
+            bump_versions(conn, "trip_recommendations")
+
+    if updated > 0:
         return f"Trip recommendation {recommendation_id} successfully cancelled."
     else:
-        conn.close()
         return f"No trip recommendation found with ID {recommendation_id}."
\ No newline at end of file
@@ -1,63 +1,94 @@
+import json
 import sqlite3
 import logging
-from datetime import date, datetime
+import time
+from datetime import datetime
 from typing import Optional
-import os
-from pathlib import Path
 
 import pytz
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
+from app.core.cache import LRUCache, ReadThroughCache
 from app.core.config import settings
+from app.core.database import get_connection, resolve_database_path, write_transaction
+from app.core.flight_search import DEPARTURE_TS, build_flight_search
+from app.core.schema import get_schema
+from app.core.table_versions import bump_versions
+from app.services.customer_support.tools.memoize import memoize
+from app.services.customer_support.tools.result_shaping import fetch_page
 
-# 使用相对路径
-project_root = Path(__file__).parent.parent.parent.parent.parent  # 回到项目根目录
-db_path = (project_root / settings.DATABASE_URL.replace('sqlite:///', '')).resolve()
+db_path = resolve_database_path(settings.DATABASE_URL)
 db = settings.DATABASE_URL
 ERROR_NO_PASSENGER_ID = "No passenger ID configured."
 
-def get_db_connection():
-    """创建数据库连接并返回连接和游标"""
+# 乘客存在性检查已合并进连接查询：没有记录时直接返回空列表
+# 依赖 app.core.schema 在启动时创建的 tickets(passenger_id) 等索引
+USER_FLIGHTS_QUERY = """
+SELECT 
+    t.ticket_no, t.book_ref,
+    f.flight_id, f.flight_no, f.departure_airport, f.arrival_airport, 
+    f.scheduled_departure, f.scheduled_arrival,
+    bp.seat_no, tf.fare_conditions
+FROM 
+    tickets t
+    JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
+    JOIN flights f ON tf.flight_id = f.flight_id
+    LEFT JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id
+WHERE 
+    t.passenger_id = ?
+"""
+
+# search_flights 返回给模型的列（不含 aircraft_code、actual_* 等）
+FLIGHT_SEARCH_COLUMNS = (
+    "flight_id", "flight_no", "departure_airport", "arrival_airport",
+    "scheduled_departure", "scheduled_arrival", "status",
+)
+
+def _rows_size(rows: list[dict]) -> int:
+    return len(json.dumps(rows, default=str))
+
+
+# 乘客 ID -> 航班信息。update_ticket_to_new_flight / cancel_ticket 成功后失效，TTL 兜底库外的修改
+user_flights_cache: ReadThroughCache[str, list[dict]] = ReadThroughCache(
+    LRUCache(
+        settings.USER_FLIGHTS_CACHE_SIZE,
+        ttl_seconds=settings.USER_FLIGHTS_CACHE_TTL_SECONDS,
+        max_bytes=settings.USER_FLIGHTS_CACHE_MAX_BYTES,
+        sizeof=_rows_size,
+    )
+)
+
+
+def user_flights_cache_stats() -> dict:
+    """航班信息缓存的命中率等统计"""
+    return user_flights_cache.stats()
+
+
+def _load_user_flights(passenger_id: str) -> list[dict]:
     logger = logging.getLogger(__name__)
     try:
-        # 确保数据库目录存在
-        db_dir = os.path.dirname(str(db_path))
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-            logger.info(f"创建数据库目录: {db_dir}")
-        
-        logger.info(f"尝试连接数据库: {db}")
-        logger.info(f"实际数据库路径: {db_path}")
-        conn = sqlite3.connect(str(db_path))
-        
-        # 测试数据库连接并检查表
-        cursor = conn.cursor()
-        
-        # 查询所有表名
-        cursor.execute("""
-            SELECT name 
-            FROM sqlite_master 
-            WHERE type='table';
-        """)
-        tables = cursor.fetchall()
-        logger.info("数据库中的所有表：")
-        for table in tables:
-            logger.info(f"- {table[0]}")
-            
-            # 可选：查看表结构
-            cursor.execute(f"PRAGMA table_info({table[0]})")
-            columns = cursor.fetchall()
-            logger.info(f"{table[0]} 表的结构:")
-            for col in columns:
-                logger.info(f"  - {col[1]} ({col[2]})")
-        
-        return conn
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(USER_FLIGHTS_QUERY, (passenger_id,))
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
     except sqlite3.Error as e:
-        logger.error(f"数据库连接错误: {str(e)}")
+        logger.error(f"数据库查询错误: {str(e)}")
         logger.error(f"数据库路径: {db_path}")
-        logger.error(f"当前工作目录: {os.getcwd()}")
         raise
 
+    if not rows:
+        logger.info(f"未找到乘客ID为 {passenger_id} 的记录")
+    return [dict(zip(column_names, row)) for row in rows]
+
+
+def get_db_connection():
+    """从共享连接池借用数据库连接
+
+    表结构的检查已移到启动阶段（见 app.core.schema.init_schema），这里不再查询 sqlite_master。
+    """
+    return get_connection()
+
 @tool
 def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
     """Fetch all tickets for the user along with corresponding flight information and seat assignments.
@@ -74,109 +105,105 @@ def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
         logger.error("航空：未提供乘客ID")
         raise ValueError(ERROR_NO_PASSENGER_ID)
 
-    logger.info(f"航空：正在查询乘客 {passenger_id} 的航班信息")
+    logger.debug(f"航空：正在查询乘客 {passenger_id} 的航班信息")
+
+    if not get_schema().has_table("tickets"):
+        logger.error("tickets表不存在！")
+        return []
     
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 查询所有表名
-            cursor.execute("""
-                SELECT name 
-                FROM sqlite_master 
-                WHERE type='table';
-            """)
-            tables = cursor.fetchall()
-            logger.info("数据库中的所有表：")
-            for table in tables:
-                logger.info(f"- {table[0]}")
-            
-            # 检查tickets表是否存在
-            cursor.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='tickets';
-            """)
-            if not cursor.fetchone():
-                logger.error("tickets表不存在！")
-                return []
-            
-            # 检查该乘客是否存在
-            cursor.execute("SELECT * FROM tickets WHERE passenger_id = ?", (passenger_id,))
-            if not cursor.fetchone():
-                logger.error(f"未找到乘客ID为 {passenger_id} 的记录")
-                return []
-                
-            # 原有的查询
-            query = """
-            SELECT 
-                t.ticket_no, t.book_ref,
-                f.flight_id, f.flight_no, f.departure_airport, f.arrival_airport, 
-                f.scheduled_departure, f.scheduled_arrival,
-                bp.seat_no, tf.fare_conditions
-            FROM 
-                tickets t
-                JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
-                JOIN flights f ON tf.flight_id = f.flight_id
-                LEFT JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id
-            WHERE 
-                t.passenger_id = ?
-            """
-            # logger.info(f"执行SQL查询: {query}")
-            cursor.execute(query, (passenger_id,))
-            
-            rows = cursor.fetchall()
-            logger.info(f"查询结果行数: {len(rows)}")
-            
-            column_names = [column[0] for column in cursor.description]
-            results = [dict(zip(column_names, row)) for row in rows]
-            return results
-            
-    except sqlite3.Error as e:
-        logger.error(f"数据库查询错误: {str(e)}")
-        raise
+    rows = user_flights_cache.get_or_load(passenger_id, lambda: _load_user_flights(passenger_id))
+    # 返回副本，调用方修改结果不会影响缓存
+    return [dict(row) for row in rows]
 
 
 @tool
+@memoize(tables=("flights",))
 def search_flights(
     departure_airport: Optional[str] = None,
     arrival_airport: Optional[str] = None,
-    start_time: Optional[date | datetime] = None,
-    end_time: Optional[date | datetime] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
     limit: int = 20,
-) -> list[dict]:
-    """Search for flights based on departure airport, arrival airport, and departure time range."""
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
+    cursor: Optional[str] = None,
+) -> str:
+    """Search for flights based on departure airport, arrival airport, and departure time range.
+
+    start_time and end_time are ISO 8601 dates (2024-05-01) or datetimes (2024-05-01T14:00:00+02:00) and
+    are inclusive; a date covers the whole day (UTC).
 
-    query = "SELECT * FROM flights WHERE 1 = 1"
-    params = []
+    Returns a compact JSON table {"columns": [...], "rows": [[...]]} ordered by departure time, at most
+    `limit` rows per page. When there are more flights it includes "next_cursor": pass it back as `cursor`
+    with the same criteria to get the next page.
+    """
+    # 时间参数保持字符串，由 to_epoch 区分日期和时间：声明为 date | datetime 时，pydantic 的解析结果
+    # 取决于 typing 缓存的 Union 成员顺序，日期可能被解析成当天 0 点
+    # 起飞时间换算为数值后按索引范围扫描，按起飞时间稳定排序，游标按偏移量翻页
+    try:
+        query, params = build_flight_search(
+            FLIGHT_SEARCH_COLUMNS,
+            departure_airport,
+            arrival_airport,
+            start_time,
+            end_time,
+            numeric=get_schema().has_column("flights", DEPARTURE_TS),
+        )
+    except ValueError as e:
+        # 无法解析的时间作为工具错误返回，模型可以换成 ISO 格式重试
+        return str(e)
+    args = {
+        "departure_airport": departure_airport,
+        "arrival_airport": arrival_airport,
+        "start_time": start_time,
+        "end_time": end_time,
+        "limit": limit,
+        "cursor": cursor,
+    }
+    with get_connection() as conn:
+        return fetch_page(conn, query, params, tool="search_flights", args=args, page_size=limit)
 
-    if departure_airport:
-        query += " AND departure_airport = ?"
-        params.append(departure_airport)
 
-    if arrival_airport:
-        query += " AND arrival_airport = ?"
-        params.append(arrival_airport)
+# 改签只需一条 UPDATE：新航班存在且起飞时间距现在不少于 3 小时、机票属于当前乘客，全部在 WHERE 中判断
+# 起飞时间由 strftime 换算为 UTC 秒数，按 flight_id 走 idx_flights_flight_id
+RESCHEDULE_TICKET_SQL = """
+UPDATE ticket_flights SET flight_id = :new_flight_id
+WHERE ticket_no = :ticket_no
+  AND EXISTS (SELECT 1 FROM tickets WHERE ticket_no = :ticket_no AND passenger_id = :passenger_id)
+  AND (
+      SELECT CAST(strftime('%s', scheduled_departure) AS INTEGER) FROM flights WHERE flight_id = :new_flight_id
+  ) >= :earliest_departure
+"""
 
-    if start_time:
-        query += " AND scheduled_departure >= ?"
-        params.append(start_time)
+CANCEL_TICKET_SQL = """
+DELETE FROM ticket_flights
+WHERE ticket_no = :ticket_no
+  AND EXISTS (SELECT 1 FROM tickets WHERE ticket_no = :ticket_no AND passenger_id = :passenger_id)
+"""
 
-    if end_time:
-        query += " AND scheduled_departure <= ?"
-        params.append(end_time)
-    query += " LIMIT ?"
-    params.append(limit)
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    column_names = [column[0] for column in cursor.description]
-    results = [dict(zip(column_names, row)) for row in rows]
+# 改签的航班距离起飞至少要有 3 小时
+MIN_RESCHEDULE_NOTICE_SECONDS = 3 * 3600
 
-    cursor.close()
-    conn.close()
 
-    return results
+def _ticket_problem(conn: sqlite3.Connection, ticket_no: str, passenger_id: str) -> Optional[str]:
+    """写操作没有影响任何行时，找出机票层面的原因（与原先逐条检查时的提示一致）"""
+    if conn.execute("SELECT 1 FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)).fetchone() is None:
+        return "No existing ticket found for the given ticket number."
+    owned = conn.execute(
+        "SELECT 1 FROM tickets WHERE ticket_no = ? AND passenger_id = ?", (ticket_no, passenger_id)
+    ).fetchone()
+    if owned is None:
+        return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
+    return None
+
+
+def _reschedule_problem(conn: sqlite3.Connection, ticket_no: str, new_flight_id: int, passenger_id: str) -> str:
+    row = conn.execute("SELECT scheduled_departure FROM flights WHERE flight_id = ?", (new_flight_id,)).fetchone()
+    if not row:
+        return "Invalid new flight ID provided."
+    departure_time = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S.%f%z")
+    current_time = datetime.now(tz=pytz.timezone("Etc/GMT-3"))
+    if (departure_time - current_time).total_seconds() < MIN_RESCHEDULE_NOTICE_SECONDS:
+        return f"Not permitted to reschedule to a flight that is less than 3 hours from the current time. Selected flight is at {departure_time}."
+    return _ticket_problem(conn, ticket_no, passenger_id) or "Ticket could not be updated."
 
 
 @tool
@@ -189,62 +216,28 @@ def update_ticket_to_new_flight(
     if not passenger_id:
         raise ValueError(ERROR_NO_PASSENGER_ID)
 
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT departure_airport, arrival_airport, scheduled_departure FROM flights WHERE flight_id = ?",
-        (new_flight_id,),
-    )
-    new_flight = cursor.fetchone()
-    if not new_flight:
-        cursor.close()
-        conn.close()
-        return "Invalid new flight ID provided."
-    column_names = [column[0] for column in cursor.description]
-    new_flight_dict = dict(zip(column_names, new_flight))
-    timezone = pytz.timezone("Etc/GMT-3")
-    current_time = datetime.now(tz=timezone)
-    departure_time = datetime.strptime(
-        new_flight_dict["scheduled_departure"], "%Y-%m-%d %H:%M:%S.%f%z"
-    )
-    time_until = (departure_time - current_time).total_seconds()
-    if time_until < (3 * 3600):
-        return f"Not permitted to reschedule to a flight that is less than 3 hours from the current time. Selected flight is at {departure_time}."
-
-    cursor.execute(
-        "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
-    )
-    current_flight = cursor.fetchone()
-    if not current_flight:
-        cursor.close()
-        conn.close()
-        return "No existing ticket found for the given ticket number."
-
-    # Check the signed-in user actually has this ticket
-    cursor.execute(
-        "SELECT * FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
-        (ticket_no, passenger_id),
-    )
-    current_ticket = cursor.fetchone()
-    if not current_ticket:
-        cursor.close()
-        conn.close()
-        return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
-
     # In a real application, you'd likely add additional checks here to enforce business logic,
     # like "does the new departure airport match the current ticket", etc.
     # While it's best to try to be *proactive* in 'type-hinting' policies to the LLM
     # it's inevitably going to get things wrong, so you **also** need to ensure your
     # API enforces valid behavior
-    cursor.execute(
-        "UPDATE ticket_flights SET flight_id = ? WHERE ticket_no = ?",
-        (new_flight_id, ticket_no),
-    )
-    conn.commit()
+    params = {
+        "ticket_no": ticket_no,
+        "new_flight_id": new_flight_id,
+        "passenger_id": passenger_id,
+        "earliest_departure": int(time.time()) + MIN_RESCHEDULE_NOTICE_SECONDS,
+    }
+    with write_transaction() as conn:
+        if conn.execute(RESCHEDULE_TICKET_SQL, params).rowcount > 0:
+            bump_versions(conn, "ticket_flights")
+            message = None
+        else:
+            # 只有失败时才逐项检查原因，检查与更新在同一事务中，看到的是同一份数据
+            message = _reschedule_problem(conn, ticket_no, new_flight_id, passenger_id)
 
-    cursor.close()
-    conn.close()
+    if message:
+        return message
+    user_flights_cache.invalidate(passenger_id)
     return "Ticket successfully updated to new flight."
 
 
@@ -255,32 +248,16 @@ def cancel_ticket(ticket_no: str, *, config: RunnableConfig) -> str:
     passenger_id = configuration.get("passenger_id", None)
     if not passenger_id:
         raise ValueError(ERROR_NO_PASSENGER_ID)
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
-    )
-    existing_ticket = cursor.fetchone()
-    if not existing_ticket:
-        cursor.close()
-        conn.close()
-        return "No existing ticket found for the given ticket number."
-
-    # Check the signed-in user actually has this ticket
-    cursor.execute(
-        "SELECT ticket_no FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
-        (ticket_no, passenger_id),
-    )
-    current_ticket = cursor.fetchone()
-    if not current_ticket:
-        cursor.close()
-        conn.close()
-        return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
 
-    cursor.execute("DELETE FROM ticket_flights WHERE ticket_no = ?", (ticket_no,))
-    conn.commit()
+    params = {"ticket_no": ticket_no, "passenger_id": passenger_id}
+    with write_transaction() as conn:
+        if conn.execute(CANCEL_TICKET_SQL, params).rowcount > 0:
+            bump_versions(conn, "ticket_flights")
+            message = None
+        else:
+            message = _ticket_problem(conn, ticket_no, passenger_id) or "Ticket could not be cancelled."
 
-    cursor.close()
-    conn.close()
-    return "Ticket successfully cancelled."
\ No newline at end of file
+    if message:
+        return message
+    user_flights_cache.invalidate(passenger_id)
+    return "Ticket successfully cancelled."
@@ -1,19 +1,26 @@
-from datetime import date, datetime
-from typing import Optional, Union
-import sqlite3
+from typing import Optional
 from langchain_core.tools import tool
-from app.core.config import settings
+from app.core.availability import CALENDAR_TABLE, availability_condition, date_error, iso_day, sync_reservation
+from app.core.database import get_connection, write_transaction
+from app.core.fts import build_search, fts_table
+from app.core.schema import get_schema
+from app.core.table_versions import bump_versions
+from app.services.customer_support.tools.memoize import memoize
+from app.services.customer_support.tools.result_shaping import fetch_page
 
-db = settings.DATABASE_URL
+# 搜索结果返回给模型的列
+HOTELS_COLUMNS = ("id", "name", "location", "price_tier", "checkin_date", "checkout_date", "booked")
 
-@tool   
+@tool
+@memoize(tables=("hotels",))
 def search_hotels(
     location: Optional[str] = None,
     name: Optional[str] = None,
     price_tier: Optional[str] = None,
-    checkin_date: Optional[Union[datetime, date]] = None,
-    checkout_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
+    checkin_date: Optional[str] = None,
+    checkout_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> str:
     """
     Search for hotels based on location, name, price tier, check-in date, and check-out date.
 
@@ -21,33 +28,43 @@ def search_hotels(
         location (Optional[str]): The location of the hotel. Defaults to None.
         name (Optional[str]): The name of the hotel. Defaults to None.
         price_tier (Optional[str]): The price tier of the hotel. Defaults to None. Examples: Midscale, Upper Midscale, Upscale, Luxury
-        checkin_date (Optional[Union[datetime, date]]): The check-in date of the hotel. Defaults to None.
-        checkout_date (Optional[Union[datetime, date]]): The check-out date of the hotel. Defaults to None.
+        checkin_date (Optional[str]): The check-in date of the hotel, as an ISO 8601 date (2024-05-01). Defaults to None.
+        checkout_date (Optional[str]): The check-out date of the hotel, as an ISO 8601 date (2024-05-01). Defaults to None.
+        cursor (Optional[str]): The next_cursor from a previous search with the same criteria, to get the next page. Defaults to None.
 
     Returns:
-        list[dict]: A list of hotel dictionaries matching the search criteria.
+        str: A compact JSON table {"columns": [...], "rows": [[...]]} of the hotels matching the search criteria.
+        Only hotels that are not booked (or, when dates are given, free for those dates) are returned.
+        When there are more results it includes "next_cursor"; rows cut to keep the result small are described in "summary".
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM hotels WHERE 1=1"
-    params = []
-
-    if location:
-        query += " AND location LIKE ?"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE ?"
-        params.append(f"%{name}%")
-    # For the sake of this tutorial, we will let you match on any dates and price tier.
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-
-    conn.close()
-
-    return [
-        dict(zip([column[0] for column in cursor.description], row)) for row in results
-    ]
+    # 日期保持字符串，由 to_day 解析（原因见 search_flights）；无法解析时让模型改正后重试，而不是忽略日期
+    if error := date_error(checkin_date=checkin_date, checkout_date=checkout_date):
+        return error
+    schema = get_schema()
+    # 价格档次和日期在 SQL 中过滤，只返回可预订的记录
+    where = [availability_condition(
+        "hotels", checkin_date, checkout_date, use_calendar=schema.has_table(CALENDAR_TABLE)
+    )]
+    if price_tier:
+        where.append(("hotels.price_tier = ? COLLATE NOCASE", [price_tier]))
+    # 名称和地点走全文索引（前缀匹配、按相关度排序）
+    query, params = build_search(
+        "hotels",
+        {"location": location, "name": name},
+        where=where,
+        columns=HOTELS_COLUMNS,
+        use_fts=schema.has_table(fts_table("hotels")),
+    )
+    args = {
+        "location": location,
+        "name": name,
+        "price_tier": price_tier,
+        "checkin_date": checkin_date,
+        "checkout_date": checkout_date,
+        "cursor": cursor,
+    }
+    with get_connection() as conn:
+        return fetch_page(conn, query, params, tool="search_hotels", args=args)
 
 
 @tool
@@ -61,57 +78,54 @@ def book_hotel(hotel_id: int) -> str:
     Returns:
         str: A message indicating whether the hotel was successfully booked or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,))
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,)).rowcount
+        if updated:
+            bump_versions(conn, "hotels")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "hotels", hotel_id)
+
+    if updated > 0:
         return f"Hotel {hotel_id} successfully booked."
     else:
-        conn.close()
         return f"No hotel found with ID {hotel_id}."
 
 
 @tool
 def update_hotel(
     hotel_id: int,
-    checkin_date: Optional[Union[datetime, date]] = None,
-    checkout_date: Optional[Union[datetime, date]] = None,
+    checkin_date: Optional[str] = None,
+    checkout_date: Optional[str] = None,
 ) -> str:
     """
     Update a hotel's check-in and check-out dates by its ID.
 
     Args:
         hotel_id (int): The ID of the hotel to update.
-        checkin_date (Optional[Union[datetime, date]]): The new check-in date of the hotel. Defaults to None.
-        checkout_date (Optional[Union[datetime, date]]): The new check-out date of the hotel. Defaults to None.
+        checkin_date (Optional[str]): The new check-in date of the hotel, as an ISO 8601 date (2024-05-01). Defaults to None.
+        checkout_date (Optional[str]): The new check-out date of the hotel, as an ISO 8601 date (2024-05-01). Defaults to None.
 
     Returns:
         str: A message indicating whether the hotel was successfully updated or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    if checkin_date:
-        cursor.execute(
-            "UPDATE hotels SET checkin_date = ? WHERE id = ?", (checkin_date, hotel_id)
-        )
-    if checkout_date:
-        cursor.execute(
-            "UPDATE hotels SET checkout_date = ? WHERE id = ?",
-            (checkout_date, hotel_id),
-        )
-
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    if error := date_error(checkin_date=checkin_date, checkout_date=checkout_date):
+        return error
+    checkin_date, checkout_date = iso_day(checkin_date), iso_day(checkout_date)
+    # 一条 UPDATE 同时修改两个日期，未提供的保持原值；rowcount 即匹配到的记录数
+    with write_transaction() as conn:
+        updated = conn.execute(
+            "UPDATE hotels SET checkin_date = COALESCE(?, checkin_date), checkout_date = COALESCE(?, checkout_date) "
+            "WHERE id = ?",
+            (checkin_date, checkout_date, hotel_id),
+        ).rowcount
+        if updated:
+            bump_versions(conn, "hotels")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "hotels", hotel_id)
+
+    if updated > 0:
         return f"Hotel {hotel_id} successfully updated."
     else:
-        conn.close()
         return f"No hotel found with ID {hotel_id}."
 
 
@@ -126,15 +140,14 @@ def cancel_hotel(hotel_id: int) -> str:
     Returns:
         str: A message indicating whether the hotel was successfully cancelled or not.
     """
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    cursor.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,))
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        conn.close()
+    with write_transaction() as conn:
+        updated = conn.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,)).rowcount
+        if updated:
+            bump_versions(conn, "hotels")
+            if get_schema().has_table(CALENDAR_TABLE):
+                sync_reservation(conn, "hotels", hotel_id)
+
+    if updated > 0:
         return f"Hotel {hotel_id} successfully cancelled."
     else:
-        conn.close()
         return f"No hotel found with ID {hotel_id}."
\ No newline at end of file
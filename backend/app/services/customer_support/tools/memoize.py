@@ -0,0 +1,187 @@
+"""只读工具的结果缓存
+
+用法：在 @tool 下面加一层 @memoize，声明工具依赖的表
+
+    @tool
+    @memoize(tables=("hotels",))
+    def search_hotels(...): ...
+
+缓存键由工具名、规范化后的参数（补齐默认值、去掉字符串首尾空白）、当前数据库以及依赖表的版本号组成。
+写工具在事务中递增表的版本号（app.core.table_versions），之后的调用自然不再命中旧条目。
+版本号在执行查询之前读取：与写操作并发时，新数据最多被存到旧版本的键下，不会出现旧数据挂在新版本键下。
+
+接收 RunnableConfig 的工具结果通常取决于当前乘客，默认不缓存（直接返回原函数）；
+确实需要缓存时用 config_keys 指定参与缓存键的 configurable 字段。
+"""
+import functools
+import inspect
+import json
+import logging
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import get_connection
+from app.core.table_versions import read_versions
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def _sizeof(value: Any) -> int:
+    return len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+
+
+class ToolCache:
+    """所有被 memoize 的工具共享的 LRU 存储，按工具分别统计命中情况
+
+    Args:
+        max_size: 条目上限
+        max_bytes: 结果总大小上限（按字符数估算），0 表示不限制
+        ttl_seconds: 条目存活时间，兜底绕过写工具直接修改数据库的情况，0 表示不过期
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        max_size = settings.TOOL_CACHE_SIZE if max_size is None else max_size
+        max_bytes = settings.TOOL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        ttl_seconds = settings.TOOL_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._cache: LRUCache[tuple, Any] = LRUCache(
+            max_size,
+            ttl_seconds=ttl_seconds or None,
+            max_bytes=max_bytes or None,
+            sizeof=_sizeof,
+        )
+        self._lock = threading.Lock()
+        self._tools: dict[str, dict[str, int]] = {}
+
+    def _count(self, tool: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._tools.setdefault(tool, {"hits": 0, "misses": 0, "bypassed": 0})
+            counters[outcome] += 1
+
+    def get(self, tool: str, key: tuple) -> Any:
+        value = self._cache.get(key)
+        self._count(tool, "misses" if value is None else "hits")
+        return value
+
+    def put(self, key: tuple, value: Any) -> None:
+        self._cache.put(key, value)
+
+    def bypass(self, tool: str) -> None:
+        self._count(tool, "bypassed")
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            tools = {
+                name: {**counters, "hit_rate": counters["hits"] / (counters["hits"] + counters["misses"])
+                       if counters["hits"] + counters["misses"] else 0.0}
+                for name, counters in self._tools.items()
+            }
+        return {"storage": self._cache.stats(), "tools": tools}
+
+
+tool_cache = ToolCache()
+
+
+def _config_parameter(signature: inspect.Signature) -> Optional[str]:
+    for name, parameter in signature.parameters.items():
+        if parameter.annotation is RunnableConfig or name == "config":
+            return name
+    return None
+
+
+def _versions(tables: Sequence[str]) -> Optional[tuple]:
+    """(数据库 URL, 各表版本号)，无法读取版本时返回 None"""
+    database = settings.DATABASE_URL
+    if not tables:
+        return (database,)
+    with get_connection() as conn:
+        versions = read_versions(conn, tables)
+    return None if versions is None else (database, versions)
+
+
+def memoize(
+    tables: Sequence[str] = (),
+    *,
+    version: Optional[Callable[[], Any]] = None,
+    config_keys: Optional[Sequence[str]] = None,
+    cache: Optional[ToolCache] = None,
+):
+    """缓存只读工具的结果，放在 @tool 与函数之间
+
+    Args:
+        tables: 结果依赖的表，任一表的版本变化后缓存失效
+        version: 额外的版本函数，用于不在数据库中的依赖（如政策索引）
+        config_keys: 参与缓存键的 configurable 字段；为 None 时接收 RunnableConfig 的工具不缓存
+        cache: 使用的存储，默认为全局 tool_cache
+
+    Returns:
+        装饰器
+    """
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        config_param = _config_parameter(signature)
+        if config_param and config_keys is None:
+            logger.debug(f"工具 {func.__name__} 接收 RunnableConfig，不缓存其结果")
+            return func
+        store = cache or tool_cache
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.TOOL_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            versions = _versions(tables)
+            if versions is None:
+                store.bypass(name)
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            configurable = None
+            if config_param:
+                config = arguments.pop(config_param) or {}
+                configurable = {k: config.get("configurable", {}).get(k) for k in config_keys}
+            key = (
+                name,
+                versions,
+                version() if version else None,
+                json.dumps(_normalize(arguments), sort_keys=True, default=str),
+                json.dumps(configurable, sort_keys=True, default=str),
+            )
+            result = store.get(name, key)
+            if result is not None:
+                return result
+            result = func(*args, **kwargs)
+            store.put(key, result)
+            return result
+
+        wrapper.memoized_tables = tuple(tables)
+        return wrapper
+
+    return decorator
@@ -1,51 +1,74 @@
-import re
-import requests
-import numpy as np
-import openai
+import logging
+import threading
+from typing import TYPE_CHECKING, Optional
+
 from langchain_core.tools import tool
 
-response = requests.get(
-    "https://storage.googleapis.com/benchmarks-artifacts/travel-db/swiss_faq.md"
-)
-response.raise_for_status()
-faq_text = response.text
+from app.core.config import settings
+from app.services.customer_support.tools.memoize import memoize
+
+if TYPE_CHECKING:
+    from app.services.customer_support.retrieval.vector_store import VectorStoreRetriever
+
+logger = logging.getLogger(__name__)
+
+_retriever: Optional["VectorStoreRetriever"] = None
+_retriever_lock = threading.Lock()
+# 检索器每次被替换时加一，作为 lookup_policy 结果缓存的版本
+_retriever_generation = 0
+
 
-docs = [{"page_content": txt} for txt in re.split(r"(?=\n##)", faq_text)]
+def get_retriever() -> "VectorStoreRetriever":
+    """首次使用时加载政策索引（mmap），模块导入时不访问网络
 
+    索引应由离线构建步骤生成；缺失或原文变化时才会在这里重建。
+    查询向量经过内存 LRU 和磁盘缓存，重复的问题不会再次调用嵌入模型。
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                # numpy 和检索模块在首次查询政策时才导入
+                from app.services.customer_support.retrieval.embedders import (
+                    create_embedder,
+                    create_query_embedder,
+                )
+                from app.services.customer_support.retrieval.index import (
+                    default_paths,
+                    download_faq,
+                    ensure_index,
+                )
+                from app.services.customer_support.retrieval.vector_store import VectorStoreRetriever
 
-class VectorStoreRetriever:
-    def __init__(self, docs: list, vectors: list, oai_client):
-        self._arr = np.array(vectors)
-        self._docs = docs
-        self._client = oai_client
+                embedder = create_embedder()
+                index_dir, source_path = default_paths()
+                index = ensure_index(
+                    index_dir,
+                    source_path,
+                    embedder,
+                    fetch=lambda: download_faq(settings.POLICY_FAQ_URL),
+                )
+                _retriever = VectorStoreRetriever.from_index(index, create_query_embedder(embedder))
+                logger.info(f"政策索引已加载: {len(index.chunks)} 个分块, 嵌入器 {embedder.name}")
+    return _retriever
 
-    @classmethod
-    def from_docs(cls, docs, oai_client):
-        embeddings = oai_client.embeddings.create(
-            model="text-embedding-3-small", input=[doc["page_content"] for doc in docs]
-        )
-        vectors = [emb.embedding for emb in embeddings.data]
-        return cls(docs, vectors, oai_client)
 
-    def query(self, query: str, k: int = 5) -> list[dict]:
-        embed = self._client.embeddings.create(
-            model="text-embedding-3-small", input=[query]
-        )
-        # "@" is just a matrix multiplication in python
-        scores = np.array(embed.data[0].embedding) @ self._arr.T
-        top_k_idx = np.argpartition(scores, -k)[-k:]
-        top_k_idx_sorted = top_k_idx[np.argsort(-scores[top_k_idx])]
-        return [
-            {**self._docs[idx], "similarity": scores[idx]} for idx in top_k_idx_sorted
-        ]
+def set_retriever(retriever: Optional["VectorStoreRetriever"]) -> None:
+    """替换（或用 None 重置）全局检索器，供测试和索引热更新使用"""
+    global _retriever, _retriever_generation
+    with _retriever_lock:
+        _retriever = retriever
+        _retriever_generation += 1
 
 
-retriever = VectorStoreRetriever.from_docs(docs, openai.Client())
+def retriever_generation() -> int:
+    return _retriever_generation
 
 
 @tool
+@memoize(version=retriever_generation)
 def lookup_policy(query: str) -> str:
     """Consult the company policies to check whether certain options are permitted.
     Use this before making any flight changes performing other 'write' events."""
-    docs = retriever.query(query, k=2)
-    return "\n\n".join([doc["page_content"] for doc in docs])
\ No newline at end of file
+    docs = get_retriever().query(query, k=2)
+    return "\n\n".join([doc["page_content"] for doc in docs])
@@ -0,0 +1,133 @@
+"""搜索类工具的结果整形
+
+工具结果会原样序列化进提示词，这里统一控制它的大小：
+- 每页最多 TOOL_RESULT_MAX_ROWS 行，SQL 中多取一行判断是否还有下一页；
+- 翻页使用不透明游标（偏移量 + 查询条件指纹），换了条件的游标会被拒绝；
+- 只查询各工具声明的列，输出为紧凑的表格 {"columns": [...], "rows": [[...]]}；
+- 超过 TOOL_RESULT_MAX_CHARS 时只保留放得下的行，其余行给出摘要并通过游标继续获取。
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+from typing import Any, Optional, Sequence
+
+from app.core.config import settings
+
+# 摘要中列出取值分布的列最多包含的不同取值数
+_SUMMARY_MAX_DISTINCT = 5
+
+
+def _fingerprint(tool: str, args: dict[str, Any]) -> str:
+    filters = {key: value for key, value in args.items() if key != "cursor" and value is not None}
+    payload = json.dumps([tool, filters], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(tool: str, args: dict[str, Any], offset: int) -> str:
+    """生成指向 offset 处的翻页游标，与工具名和查询条件绑定"""
+    raw = json.dumps({"f": _fingerprint(tool, args), "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], tool: str, args: dict[str, Any]) -> int:
+    """解析翻页游标，返回偏移量
+
+    Raises:
+        ValueError: 游标格式错误，或不属于这次查询（工具或条件不同）
+    """
+    if not cursor:
+        return 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset, fingerprint = int(data["o"]), data["f"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor. Repeat the search without a cursor.") from e
+    if offset < 0 or fingerprint != _fingerprint(tool, args):
+        raise ValueError("The cursor belongs to a different search. Repeat the search without a cursor.")
+    return offset
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > settings.TOOL_RESULT_MAX_CELL_CHARS:
+        return value[: settings.TOOL_RESULT_MAX_CELL_CHARS] + "…"
+    return value
+
+
+def encode_table(columns: Sequence[str], rows: Sequence[Sequence[Any]], **extra: Any) -> str:
+    """把结果编码为紧凑的 JSON 表格，值为 None 的附加字段不输出"""
+    payload = {"columns": list(columns), "rows": [[_cell(value) for value in row] for row in rows]}
+    payload.update({key: value for key, value in extra.items() if value is not None})
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def decode_table(text: str) -> list[dict]:
+    """把 encode_table 的输出还原为字典列表"""
+    payload = json.loads(text)
+    return [dict(zip(payload["columns"], row)) for row in payload["rows"]]
+
+
+def summarize(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> dict[str, Any]:
+    """放不下的行的摘要：行数，取值较少的列给出分布，数值列给出范围"""
+    summary: dict[str, Any] = {"rows": len(rows)}
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows if row[i] is not None]
+        if not values:
+            continue
+        if all(isinstance(value, (int, float)) for value in values):
+            summary[column] = [min(values), max(values)]
+            continue
+        counts: dict[str, int] = {}
+        for value in values:
+            counts[str(value)] = counts.get(str(value), 0) + 1
+        if len(counts) <= _SUMMARY_MAX_DISTINCT:
+            summary[column] = counts
+    return summary
+
+
+def fetch_page(
+    conn: sqlite3.Connection,
+    query: str,
+    params: Sequence[Any],
+    *,
+    tool: str,
+    args: dict[str, Any],
+    page_size: Optional[int] = None,
+) -> str:
+    """执行查询并返回一页整形后的结果
+
+    Args:
+        conn: 数据库连接
+        query: 带稳定 ORDER BY、不带 LIMIT 的查询
+        params: 查询参数
+        tool: 工具名，用于绑定游标
+        args: 工具参数（含 cursor），用于解析和生成游标
+        page_size: 每页行数，不超过 TOOL_RESULT_MAX_ROWS
+
+    Returns:
+        紧凑表格；还有更多结果时带 next_cursor，按大小截断时带 summary
+    """
+    offset = decode_cursor(args.get("cursor"), tool, args)
+    limit = min(page_size or settings.TOOL_RESULT_MAX_ROWS, settings.TOOL_RESULT_MAX_ROWS)
+    cursor = conn.execute(f"{query} LIMIT ? OFFSET ?", [*params, limit + 1, offset])
+    columns = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    def render(count: int) -> str:
+        more = has_more or count < len(rows)
+        return encode_table(
+            columns,
+            rows[:count],
+            next_cursor=encode_cursor(tool, args, offset + count) if more else None,
+            summary=summarize(columns, rows[count:]) if count < len(rows) else None,
+        )
+
+    # 按字符预算减少行数（至少保留一行），其余行用摘要代替
+    count = len(rows)
+    text = render(count)
+    while count > 1 and len(text) > settings.TOOL_RESULT_MAX_CHARS:
+        count -= 1
+        text = render(count)
+    return text
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+
+import pytest
+
+# Settings 要求这些密钥存在；测试不会真正调用外部服务
+for _key in ("ANTHROPIC_API_KEY", "OPENAI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(_key, "test-key")
+# 语义响应缓存会在首轮对话时加载政策索引，只在专门的测试中开启
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+
+from app.core import database  # noqa: E402
+from app.core.schema import reset_schema  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+# 与教程 travel2.sqlite 相同的表结构（只保留工具会用到的表，原库由 pandas 写入，没有主键和索引）
+TRAVEL_SCHEMA = """
+CREATE TABLE flights (
+    flight_id INTEGER,
+    flight_no TEXT,
+    scheduled_departure TEXT,
+    scheduled_arrival TEXT,
+    departure_airport TEXT,
+    arrival_airport TEXT,
+    status TEXT,
+    aircraft_code TEXT,
+    actual_departure TEXT,
+    actual_arrival TEXT
+);
+CREATE TABLE tickets (ticket_no TEXT, book_ref TEXT, passenger_id TEXT);
+CREATE TABLE ticket_flights (ticket_no TEXT, flight_id INTEGER, fare_conditions TEXT, amount REAL);
+CREATE TABLE boarding_passes (ticket_no TEXT, flight_id INTEGER, boarding_no INTEGER, seat_no TEXT);
+CREATE TABLE hotels (
+    id INTEGER, name TEXT, location TEXT, price_tier TEXT,
+    checkin_date TEXT, checkout_date TEXT, booked INTEGER
+);
+CREATE TABLE car_rentals (
+    id INTEGER, name TEXT, location TEXT, price_tier TEXT,
+    start_date TEXT, end_date TEXT, booked INTEGER
+);
+CREATE TABLE trip_recommendations (
+    id INTEGER, name TEXT, location TEXT, keywords TEXT, details TEXT, booked INTEGER
+);
+"""
+
+PASSENGER_ID = "3442 587242"
+
+
+def _seed(conn: sqlite3.Connection) -> None:
+    conn.executescript(TRAVEL_SCHEMA)
+    conn.executemany(
+        "INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, 'Scheduled', '320', NULL, NULL)",
+        [
+            (1, "LX0112", "2030-05-01 08:00:00.000000+02:00", "2030-05-01 09:30:00.000000+02:00", "CDG", "BSL"),
+            (2, "LX0114", "2030-05-08 08:00:00.000000+02:00", "2030-05-08 09:30:00.000000+02:00", "CDG", "BSL"),
+            (3, "LX0200", "2030-05-02 12:00:00.000000+02:00", "2030-05-02 14:00:00.000000+02:00", "BSL", "ZRH"),
+        ],
+    )
+    conn.execute("INSERT INTO tickets VALUES ('7240005432906569', 'C46E9F', ?)", (PASSENGER_ID,))
+    conn.execute("INSERT INTO ticket_flights VALUES ('7240005432906569', 1, 'Economy', 120.0)")
+    conn.execute("INSERT INTO boarding_passes VALUES ('7240005432906569', 1, 12, '18E')")
+    conn.executemany(
+        "INSERT INTO hotels VALUES (?, ?, ?, ?, '2024-04-02', '2024-04-20', 0)",
+        [
+            (1, "Hilton Basel", "Basel", "Luxury"),
+            (2, "Marriott Zurich", "Zurich", "Upscale"),
+            (3, "Hyatt Regency Basel", "Basel", "Upper Upscale"),
+            (4, "Holiday Inn Basel", "Basel", "Upper Midscale"),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO car_rentals VALUES (?, ?, ?, ?, '2024-04-14', '2024-04-11', 0)",
+        [
+            (1, "Europcar", "Basel", "Economy"),
+            (2, "Avis", "Basel", "Luxury"),
+            (3, "Hertz", "Zurich", "Midsize"),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO trip_recommendations VALUES (?, ?, ?, ?, ?, 0)",
+        [
+            (1, "Basel Minster", "Basel", "landmark, history", "Visit the historic Basel Minster."),
+            (2, "Kunstmuseum Basel", "Basel", "art, museum", "Explore the extensive art collection."),
+            (3, "Zurich Old Town", "Zurich", "history, architecture", "Walk through the old town."),
+        ],
+    )
+    conn.commit()
+
+
+@pytest.fixture
+def travel_db(tmp_path, monkeypatch):
+    """在临时目录创建小型旅行数据库，并让全局连接池指向它"""
+    path = tmp_path / "travel2.sqlite"
+    conn = sqlite3.connect(path)
+    _seed(conn)
+    conn.close()
+
+    from app.services.customer_support.tools.flight_tool import user_flights_cache
+    from app.services.customer_support.tools.memoize import tool_cache
+
+    database.close_pool()
+    reset_schema()
+    user_flights_cache.clear()
+    tool_cache.clear()
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{path}")
+    yield path
+    database.close_pool()
+    reset_schema()
+    user_flights_cache.clear()
+    tool_cache.clear()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+from app.routers import customer_router
+from app.services.customer_support.graph import Assistant, create_customer_support_graph
+from app.services.customer_support.retry import DeadlineExceeded, RetryPolicy, with_deadline
+from app.tests.test_chat_api import _run, _turn
+
+CONFIG = {"configurable": {"passenger_id": "P1", "thread_id": "t"}}
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "LLM_CALL_TIMEOUT_SECONDS", 0.2)
+
+
+def _scripted(*replies):
+    """按顺序返回 replies 中的内容；数字表示先等待这么多秒再回复 "late" """
+    calls = []
+
+    async def respond(state):
+        calls.append(len(state["messages"]))
+        reply = replies[min(len(calls), len(replies)) - 1]
+        if isinstance(reply, float):
+            await asyncio.sleep(reply)
+            reply = "late"
+        return AIMessage(content=reply)
+
+    return RunnableLambda(respond), calls
+
+
+def _call(runnable, config=CONFIG):
+    state = {"messages": [HumanMessage(content="hi")]}
+    return asyncio.run(Assistant(runnable)(state, config))["messages"]
+
+
+def test_backoff_is_capped_full_jitter():
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=3.0)
+    delays = [policy.backoff(attempt) for attempt in (1, 2, 3, 4) for _ in range(200)]
+    assert all(0 <= d <= 3.0 for d in delays)
+    assert max(delays[:200]) <= 1.0 and max(delays[600:]) > 1.0
+
+
+def test_empty_replies_are_retried_with_a_single_nudge():
+    runnable, calls = _scripted("", "", "done")
+    assert _call(runnable).content == "done"
+    # 提示只追加一次
+    assert calls == [1, 2, 2]
+
+
+def test_attempts_are_capped(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_ATTEMPTS", 4)
+    runnable, calls = _scripted("")
+    assert _call(runnable).content == Assistant.FALLBACK_RESPONSE
+    assert len(calls) == 4
+
+
+def test_slow_call_times_out_and_is_retried():
+    runnable, calls = _scripted(5.0, "fast")
+    started = time.monotonic()
+    assert _call(runnable).content == "fast"
+    assert len(calls) == 2 and time.monotonic() - started < 1
+
+
+def test_request_deadline_stops_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CALL_TIMEOUT_SECONDS", 10.0)
+    runnable, calls = _scripted(5.0)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        _call(runnable, with_deadline(CONFIG, 0.3))
+    assert time.monotonic() - started < 1
+    with pytest.raises(DeadlineExceeded):
+        _call(runnable, with_deadline(CONFIG, 0))
+
+
+def test_router_returns_504_after_request_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_REQUEST_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(settings, "LLM_CALL_TIMEOUT_SECONDS", 10.0)
+    runnable, _ = _scripted(5.0)
+    customer_router.graph = create_customer_support_graph(runnable, MemorySaver())
+    try:
+        started = time.monotonic()
+        response, = _run(_turn("hi"))
+    finally:
+        customer_router.graph = None
+    assert response.status_code == 504
+    assert time.monotonic() - started < 2
+
+
+def test_zero_call_timeout_leaves_only_the_request_deadline():
+    policy = RetryPolicy(call_timeout=0)
+    assert policy.timeout(None) is None
+    assert 0 < policy.timeout(with_deadline({}, 5)) <= 5
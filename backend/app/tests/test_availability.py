@@ -0,0 +1,143 @@
+import sqlite3
+from datetime import date
+
+from app.core.availability import CALENDAR_TABLE, availability_condition, date_range, reserved_days
+from app.core.fts import build_search
+from app.core.schema import get_schema
+from app.services.customer_support.tools.car_rental_tool import (
+    book_car_rental,
+    search_car_rentals,
+    update_car_rental,
+)
+from app.services.customer_support.tools.hotels_tool import (
+    book_hotel,
+    cancel_hotel,
+    search_hotels,
+    update_hotel,
+)
+from app.services.customer_support.tools.result_shaping import decode_table
+
+
+def _ids(result):
+    return sorted(row["id"] for row in decode_table(result))
+
+
+def _calendar(travel_db, resource, resource_id):
+    conn = sqlite3.connect(travel_db)
+    days = [day for (day,) in conn.execute(
+        f"SELECT day FROM {CALENDAR_TABLE} WHERE resource = ? AND resource_id = ? ORDER BY day",
+        (resource, resource_id),
+    )]
+    conn.close()
+    return days
+
+
+def test_date_range_normalization():
+    assert date_range(None, None) is None
+    assert date_range("2024-04-02 15:00:00", date(2024, 4, 4)) == (date(2024, 4, 2), date(2024, 4, 4))
+    # 只给一端时视为一天，结束早于开始时交换
+    assert date_range("2024-04-02", None) == (date(2024, 4, 2), date(2024, 4, 3))
+    assert date_range("2024-04-14", "2024-04-11") == (date(2024, 4, 11), date(2024, 4, 14))
+    assert reserved_days("2024-04-30", "2024-05-02") == ["2024-04-30", "2024-05-01"]
+    assert reserved_days("not a date", None) == []
+
+
+def test_price_tier_filter_is_case_insensitive(travel_db):
+    assert _ids(search_hotels.invoke({"price_tier": "luxury"})) == [1]
+    assert _ids(search_hotels.invoke({"location": "Basel", "price_tier": "Upper Midscale"})) == [4]
+    assert _ids(search_car_rentals.invoke({"location": "Basel", "price_tier": "Economy"})) == [1]
+
+
+def test_booked_inventory_is_hidden_without_dates(travel_db):
+    book_hotel.invoke({"hotel_id": 1})
+    assert _ids(search_hotels.invoke({"location": "Basel"})) == [3, 4]
+    cancel_hotel.invoke({"hotel_id": 1})
+    assert _ids(search_hotels.invoke({"location": "Basel"})) == [1, 3, 4]
+
+
+def test_date_search_uses_calendar(travel_db):
+    # 酒店 1 预订了 2024-04-02 ~ 2024-04-20
+    book_hotel.invoke({"hotel_id": 1})
+    assert _calendar(travel_db, "hotels", 1)[0] == "2024-04-02"
+    assert len(_calendar(travel_db, "hotels", 1)) == 18
+
+    overlapping = {"location": "Basel", "checkin_date": "2024-04-10", "checkout_date": "2024-04-12"}
+    assert _ids(search_hotels.invoke(overlapping)) == [3, 4]
+    # 退房当天可以再次入住
+    later = {"location": "Basel", "checkin_date": "2024-04-20", "checkout_date": "2024-04-22"}
+    assert _ids(search_hotels.invoke(later)) == [1, 3, 4]
+
+    update_hotel.invoke({"hotel_id": 1, "checkin_date": "2024-05-01", "checkout_date": "2024-05-03"})
+    assert _calendar(travel_db, "hotels", 1) == ["2024-05-01", "2024-05-02"]
+    assert _ids(search_hotels.invoke(overlapping)) == [1, 3, 4]
+
+    cancel_hotel.invoke({"hotel_id": 1})
+    assert _calendar(travel_db, "hotels", 1) == []
+
+
+def test_car_rental_dates(travel_db):
+    # 教程数据中租车的结束日期早于开始日期，按 [2024-04-11, 2024-04-14) 处理
+    book_car_rental.invoke({"rental_id": 2})
+    assert _ids(search_car_rentals.invoke({"location": "Basel", "start_date": "2024-04-12"})) == [1]
+    assert _ids(search_car_rentals.invoke({"location": "Basel", "start_date": "2024-04-14",
+                                           "end_date": "2024-04-16"})) == [1, 2]
+
+
+def test_calendar_is_populated_from_existing_bookings(travel_db):
+    conn = sqlite3.connect(travel_db)
+    conn.execute("UPDATE hotels SET booked = 1 WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    assert get_schema().has_table(CALENDAR_TABLE)
+    assert len(_calendar(travel_db, "hotels", 3)) == 18
+    assert _calendar(travel_db, "car_rentals", 1) == []
+
+
+def test_filters_use_indexes(travel_db):
+    schema = get_schema()
+    assert schema.has_index("idx_hotels_price_tier_booked")
+    assert schema.has_index("idx_car_rentals_price_tier_booked")
+
+    conn = sqlite3.connect(travel_db)
+    query, params = build_search("hotels", {}, where=[("hotels.price_tier = ? COLLATE NOCASE", ["luxury"])])
+    plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+    assert "USING INDEX idx_hotels_price_tier_booked" in plan
+
+    query, params = build_search(
+        "hotels", {"location": "Basel"}, where=[availability_condition("hotels", "2024-04-10", "2024-04-12")]
+    )
+    plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+    conn.close()
+    assert "SEARCH c USING PRIMARY KEY" in plan
+
+
+def test_unparseable_dates_are_reported_to_the_model(travel_db):
+    # 无法解析的日期返回错误让模型重试，而不是退回到只按 booked 过滤
+    result = search_hotels.invoke({"location": "Basel", "checkin_date": "next Friday"})
+    assert result.startswith("Invalid checkin_date 'next Friday'")
+    assert search_car_rentals.invoke({"end_date": "tomorrow"}).startswith("Invalid end_date")
+    assert update_car_rental.invoke({"rental_id": 1, "start_date": "soon"}).startswith("Invalid start_date")
+
+    # 日期与时间都按当天处理，写入统一为 YYYY-MM-DD
+    update_hotel.invoke({"hotel_id": 1, "checkin_date": "2024-05-01T15:00:00", "checkout_date": "2024-05-03"})
+    conn = sqlite3.connect(travel_db)
+    assert conn.execute("SELECT checkin_date, checkout_date FROM hotels WHERE id = 1").fetchone() == (
+        "2024-05-01", "2024-05-03"
+    )
+    conn.close()
+
+
+def test_booked_rows_without_dates_are_not_offered_for_dated_searches(travel_db):
+    # 没有日期的预订在日历中没有记录，但已被订走，不能在按日期搜索时出现
+    conn = sqlite3.connect(travel_db)
+    conn.execute("UPDATE hotels SET checkin_date = NULL, checkout_date = NULL WHERE id = 3")
+    conn.commit()
+    conn.close()
+    book_hotel.invoke({"hotel_id": 3})
+    assert _calendar(travel_db, "hotels", 3) == []
+
+    dated = {"location": "Basel", "checkin_date": "2024-06-01", "checkout_date": "2024-06-03"}
+    assert _ids(search_hotels.invoke(dated)) == [1, 4]
+    cancel_hotel.invoke({"hotel_id": 3})
+    assert _ids(search_hotels.invoke(dated)) == [1, 3, 4]
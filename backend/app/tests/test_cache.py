@@ -0,0 +1,68 @@
+from app.core.cache import LRUCache, ReadThroughCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lru_stats():
+    cache = LRUCache(max_size=1)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    cache.put("b", 2)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_ttl_expires_entries():
+    clock = FakeClock()
+    cache = LRUCache(max_size=4, ttl_seconds=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None and "a" not in cache
+    assert cache.stats()["expirations"] == 1 and len(cache) == 0
+
+
+def test_lru_memory_bound():
+    cache = LRUCache(max_size=10, max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.put("c", "xxxx")
+    assert "a" not in cache and cache.stats()["bytes"] == 8
+    # 单个值超过上限时不缓存
+    cache.put("d", "x" * 11)
+    assert "d" not in cache and "b" in cache
+
+
+def test_read_through_drops_results_loaded_across_invalidation():
+    cache = ReadThroughCache(LRUCache(max_size=4))
+    calls = []
+
+    def load_stale():
+        calls.append("stale")
+        # 加载过程中发生了写操作
+        cache.invalidate("p1")
+        return "stale"
+
+    assert cache.get_or_load("p1", load_stale) == "stale"
+    assert cache.get_or_load("p1", lambda: calls.append("fresh") or "fresh") == "fresh"
+    assert cache.get_or_load("p1", lambda: calls.append("again") or "again") == "fresh"
+    assert calls == ["stale", "fresh"]
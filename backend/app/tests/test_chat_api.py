@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.routers import customer_router
+from app.services.customer_support.graph import create_customer_support_graph
+
+
+async def _count_messages(state) -> AIMessage:
+    return AIMessage(content=f"seen {len(state['messages'])}")
+
+
+@pytest.fixture
+def stub_graph():
+    customer_router.graph = create_customer_support_graph(RunnableLambda(_count_messages), MemorySaver())
+    yield customer_router.graph
+    customer_router.graph = None
+
+
+def _run(*requests):
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = []
+            for method, url, kwargs in requests:
+                responses.append(await client.request(method, url, **kwargs))
+            return responses
+
+    return asyncio.run(go())
+
+
+def _turn(content, **extra):
+    return ("POST", "/api/v1/chat", {"json": {"messages": [{"role": "user", "content": content}], **extra}})
+
+
+def test_graph_is_built_on_first_use():
+    assert customer_router.graph is None
+
+
+def test_thread_continues_with_incremental_messages(stub_graph):
+    first, = _run(_turn("hi", passenger_id="P1"))
+    thread_id = first.json()["thread_id"]
+    assert first.json()["response"] == "seen 1"
+
+    second, full_transcript = _run(
+        _turn("again", thread_id=thread_id),
+        ("POST", "/api/v1/chat", {"json": {"thread_id": thread_id, "messages": [
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "seen 1"},
+            {"role": "user", "content": "third"},
+        ]}}),
+    )
+    assert second.json() == {**first.json(), "response": "seen 3"}
+    # 重发完整记录时只追加最后的用户消息
+    assert full_transcript.json()["response"] == "seen 5"
+
+
+def test_thread_ownership_and_unknown_threads(stub_graph):
+    first, = _run(_turn("hi", passenger_id="P1"))
+    thread_id = first.json()["thread_id"]
+    other, unknown = _run(
+        _turn("hi", thread_id=thread_id, passenger_id="P2"),
+        ("POST", "/api/v1/confirm-action", {"params": {"thread_id": "missing", "action_id": "a", "confirmed": True}}),
+    )
+    assert other.status_code == 403
+    assert unknown.status_code == 404
+
+
+def test_websocket_resume_checks_thread_owner(stub_graph):
+    first, = _run(_turn("hi", passenger_id="P1"))
+    thread_id = first.json()["thread_id"]
+    client = TestClient(app)
+
+    with client.websocket_connect(f"/chat/P1?thread_id={thread_id}") as ws:
+        ws.send_text("again")
+        events = [ws.receive_json()]
+        while events[-1]["type"] != "end":
+            events.append(ws.receive_json())
+    assert events[-1]["thread_id"] == thread_id
+    assert events[-1]["response"] == "seen 3"
+
+    # 其他乘客不能接着别人的会话继续
+    with client.websocket_connect(f"/chat/P2?thread_id={thread_id}") as ws:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            ws.receive_text()
+    assert excinfo.value.code == 1008
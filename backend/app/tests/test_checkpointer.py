@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import threading
+import time
+from typing import Annotated
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import AnyMessage, add_messages
+from typing_extensions import TypedDict
+
+from app.services.customer_support.checkpointer import SQLiteCheckpointSaver
+
+
+class EchoState(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+
+
+def _graph(saver):
+    builder = StateGraph(EchoState)
+    builder.add_node("echo", lambda state: {"messages": [("ai", f"echo {len(state['messages'])}")]})
+    builder.add_edge(START, "echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path)
+    graph = _graph(saver)
+    graph.invoke({"messages": [("user", "hi")]}, _config("t1"))
+    graph.invoke({"messages": [("user", "again")]}, _config("t1"))
+    saver.close()
+
+    restarted = _graph(SQLiteCheckpointSaver(path))
+    messages = restarted.get_state(_config("t1")).values["messages"]
+    assert [m.content for m in messages] == ["hi", "echo 1", "again", "echo 3"]
+
+
+def test_writes_are_batched_until_flush(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path, batch_size=1000)
+    asyncio.run(_graph(saver).ainvoke({"messages": [("user", "hi")]}, _config("t1")))
+
+    other_worker = SQLiteCheckpointSaver(path)
+    assert other_worker.get_tuple(_config("t1")) is None
+    assert saver.flush() > 0
+    assert other_worker.get_tuple(_config("t1")) is not None
+
+
+def test_maintain_evicts_and_compacts(tmp_path):
+    saver = SQLiteCheckpointSaver(
+        str(tmp_path / "checkpoints.sqlite"), max_threads=2, keep_versions=2,
+        thread_ttl_seconds=3600,
+    )
+    graph = _graph(saver)
+    for thread_id in ("a", "b", "c"):
+        for _ in range(3):
+            graph.invoke({"messages": [("user", "hi")]}, _config(thread_id))
+
+    stats = saver.maintain()
+    assert stats["evicted"] == 1
+    assert saver.get_tuple(_config("a")) is None
+    assert len(list(saver.list(_config("b")))) == 2
+    # 压缩后最新状态不受影响
+    assert len(graph.get_state(_config("c")).values["messages"]) == 6
+
+    stats = saver.maintain(now=time.time() + 7200)
+    assert stats["expired"] == 2
+    assert list(saver.list(None)) == []
+
+
+def test_buffered_writes_do_not_wait_for_a_running_flush(tmp_path, monkeypatch):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), batch_size=1000)
+    graph = _graph(saver)
+    graph.invoke({"messages": [("user", "hi")]}, _config("t1"))
+
+    # 让落盘卡在 SQLite 事务里
+    in_transaction, release = threading.Event(), threading.Event()
+    real_connection = saver._pool.connection
+
+    @contextlib.contextmanager
+    def slow_connection():
+        with real_connection() as conn:
+            in_transaction.set()
+            release.wait(5)
+            yield conn
+
+    monkeypatch.setattr(saver._pool, "connection", slow_connection)
+    flusher = threading.Thread(target=saver.flush)
+    flusher.start()
+    assert in_transaction.wait(5)
+
+    started = time.perf_counter()
+    saver._enqueue([("SELECT 1", ())], "t2")
+    assert time.perf_counter() - started < 0.5
+    release.set()
+    flusher.join(5)
+    assert saver._dirty == {"t2"}
+
+
+def test_reads_flush_only_threads_with_pending_writes(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path, batch_size=1000)
+    graph = _graph(saver)
+    graph.invoke({"messages": [("user", "hi")]}, _config("t1"))
+    assert saver.get_tuple(_config("t1")) is not None
+    assert not saver._dirty
+
+    # 读取没有待落盘写入的会话不会把其他会话的缓冲写入落盘
+    graph.invoke({"messages": [("user", "hi")]}, _config("t2"))
+    assert saver.get_tuple(_config("t1")) is not None
+    assert saver._dirty == {"t2"}
+    assert SQLiteCheckpointSaver(path).get_tuple(_config("t2")) is None
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from app.core.database import PoolTimeoutError, SQLiteConnectionPool, get_pool
+
+
+def test_pool_is_bounded(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.sqlite"), max_size=2, timeout=0.05)
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+    pool.release(second)
+    assert pool.stats()["size"] == 2
+    pool.close()
+
+
+def test_connection_is_reused_within_thread(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.sqlite"), max_size=4)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+    with pool.connection() as again:
+        assert again is outer
+
+    seen = []
+
+    def worker():
+        with pool.connection() as conn:
+            seen.append(conn)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    # 空闲连接可以被其他线程复用，不会额外新建
+    assert pool.stats()["size"] == 1
+    assert seen == [outer]
+    pool.close()
+
+
+def test_connection_pragmas(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.sqlite"), busy_timeout_ms=1234)
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    pool.close()
+
+
+def test_uncommitted_work_is_rolled_back_on_release(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.sqlite"), max_size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("boom")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close()
+
+
+def test_tools_share_global_pool(travel_db):
+    from app.services.customer_support.tools.hotels_tool import book_hotel, search_hotels
+    from app.services.customer_support.tools.result_shaping import decode_table
+
+    assert len(decode_table(search_hotels.invoke({"location": "Basel"}))) == 3
+    assert book_hotel.invoke({"hotel_id": 1}) == "Hotel 1 successfully booked."
+    assert get_pool().stats()["size"] == 1
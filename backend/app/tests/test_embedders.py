@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.services.customer_support.retrieval.embedders import (
+    CachedEmbedder,
+    Embedder,
+    HashingEmbedder,
+)
+
+
+class CountingEmbedder(Embedder):
+    name = "counting"
+
+    def __init__(self):
+        self.queries = []
+        self._inner = HashingEmbedder(64)
+
+    def embed_documents(self, texts):
+        self.queries.extend(texts)
+        return self._inner.embed_documents(texts)
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(256)
+    first = embedder.embed_query("Can I change my flight?")
+    again = HashingEmbedder(256).embed_query("Can I change my flight?")
+    assert first.dtype == np.float32 and first.shape == (256,)
+    assert np.array_equal(first, again)
+    assert abs(float(np.linalg.norm(first)) - 1.0) < 1e-5
+
+
+def test_hashing_embedder_ranks_word_overlap_higher():
+    embedder = HashingEmbedder(512)
+    docs = embedder.embed_documents(["refund policy for cancelled tickets", "baggage allowance for pets"])
+    scores = docs @ embedder.embed_query("how do refunds for cancelled tickets work")
+    assert scores[0] > scores[1]
+
+
+def test_cached_embedder_normalizes_and_counts(tmp_path):
+    inner = CountingEmbedder()
+    cached = CachedEmbedder(inner, max_size=8)
+    a = cached.embed_query("Can I  change my flight?")
+    b = cached.embed_query("can i change my flight?")
+    assert np.array_equal(a, b)
+    assert inner.queries == ["can i change my flight?"]
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    path = tmp_path / "query_cache.sqlite"
+    first = CachedEmbedder(CountingEmbedder(), cache_path=path)
+    vector = first.embed_query("refund policy")
+    first.close()
+
+    inner = CountingEmbedder()
+    second = CachedEmbedder(inner, cache_path=path)
+    assert np.array_equal(second.embed_query("Refund policy"), vector)
+    assert inner.queries == []
+    assert second.stats()["disk_hits"] == 1
+    second.close()
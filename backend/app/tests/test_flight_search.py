@@ -0,0 +1,136 @@
+import json
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.core import database
+from app.core.config import settings
+from app.core.flight_search import FLIGHT_SEARCH_INDEXES, build_flight_search, to_epoch, verify_flight_plans
+from app.core.schema import get_schema, init_schema, reset_schema
+from app.services.customer_support.tools.flight_tool import search_flights
+
+FLIGHT_COUNT = 1_000_000
+# 2030-01-01 00:00 UTC 起一年内均匀分布
+EPOCH_START = 1893456000
+
+# 300 个出发机场 x 300 个到达机场，起飞时间带不同时区偏移
+SYNTHETIC_FLIGHTS = f"""
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {FLIGHT_COUNT - 1})
+INSERT INTO flights
+SELECT
+    i,
+    'SY' || i,
+    datetime({EPOCH_START} + (i * 613) % 31536000 + 7200, 'unixepoch') || '.000000+02:00',
+    NULL,
+    char(65 + i % 20, 65 + (i / 20) % 5, 65 + (i / 100) % 3),
+    char(65 + (i / 7) % 20, 66 + (i / 3) % 5, 65 + (i / 11) % 3),
+    'Scheduled', '320', NULL, NULL
+FROM n
+"""
+
+
+@pytest.fixture(scope="module")
+def million_flights(tmp_path_factory):
+    """百万行航班表，启动流程负责添加数值时间列和索引"""
+    from app.tests.conftest import TRAVEL_SCHEMA
+
+    path = tmp_path_factory.mktemp("flights") / "flights.sqlite"
+    conn = sqlite3.connect(path)
+    conn.executescript(TRAVEL_SCHEMA)
+    conn.execute(SYNTHETIC_FLIGHTS)
+    conn.commit()
+    conn.close()
+
+    with pytest.MonkeyPatch.context() as mp:
+        database.close_pool()
+        reset_schema()
+        mp.setattr(settings, "DATABASE_URL", f"sqlite:///{path}")
+        init_schema()
+        yield path
+        database.close_pool()
+        reset_schema()
+
+
+def _plan(conn, query, params):
+    return " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+
+
+def test_to_epoch_windows():
+    day = int(datetime(2030, 5, 1, tzinfo=timezone.utc).timestamp())
+    assert to_epoch(date(2030, 5, 1)) == day
+    assert to_epoch(date(2030, 5, 1), end=True) == day + 86400
+    assert to_epoch("2030-05-01") == day
+    assert to_epoch("2030-05-01 10:00:00+02:00") == day + 8 * 3600
+    assert to_epoch(datetime(2030, 5, 1, 8), end=True) == day + 8 * 3600 + 1
+    assert to_epoch("") is None
+    with pytest.raises(ValueError, match="ISO 8601"):
+        to_epoch("tomorrow")
+
+
+def test_timestamps_compare_across_time_zones(travel_db):
+    assert get_schema().has_column("flights", "scheduled_departure_ts")
+    conn = sqlite3.connect(travel_db)
+    conn.execute(
+        "INSERT INTO flights VALUES (4, 'LX0300', '2030-05-01 03:00:00.000000-04:00', NULL, 'JFK', 'ZRH', "
+        "'Scheduled', '320', NULL, NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    def flight_ids(**args):
+        return [row[0] for row in json.loads(search_flights.invoke(args))["rows"]]
+
+    # 03:00-04:00 即 07:00 UTC，排在航班 1（08:00+02:00，即 06:00 UTC）和航班 3 之间；按文本比较会排在最前
+    assert flight_ids() == [1, 4, 3, 2]
+    assert flight_ids(start_time="2030-05-01", end_time="2030-05-01") == [1, 4]
+    assert flight_ids(start_time="2030-05-01T06:30:00+00:00", end_time="2030-05-02") == [4, 3]
+    assert flight_ids(departure_airport="CDG", arrival_airport="BSL", end_time="2030-05-07") == [1]
+    # 无法解析的时间返回错误，而不是忽略时间窗口返回最早的航班
+    assert search_flights.invoke({"start_time": "next Friday"}).startswith("Invalid time 'next Friday'")
+
+
+def test_indexes_are_created_and_verified_at_startup(million_flights):
+    schema = get_schema()
+    for index in FLIGHT_SEARCH_INDEXES.values():
+        assert schema.has_index(index)
+    with database.get_connection() as conn:
+        assert verify_flight_plans(conn) == {index: True for index in FLIGHT_SEARCH_INDEXES.values()}
+
+
+@pytest.mark.parametrize("by_origin,by_destination", [(True, True), (True, False), (False, True), (False, False)])
+def test_million_flight_search_uses_index(million_flights, by_origin, by_destination):
+    start = date(2030, 3, 1)
+    end = start + timedelta(days=30)
+    with database.get_connection() as conn:
+        # 取窗口内一个真实航班的航线，保证查询有结果
+        origin, destination = conn.execute(
+            "SELECT departure_airport, arrival_airport FROM flights WHERE scheduled_departure_ts >= ? LIMIT 1",
+            (to_epoch(start) + 86400,),
+        ).fetchone()
+        query, params = build_flight_search(
+            ("flight_id",), origin if by_origin else None, destination if by_destination else None, start, end
+        )
+        plan = _plan(conn, query, params)
+        rows = conn.execute(query + " LIMIT 20", params).fetchall()
+    index = FLIGHT_SEARCH_INDEXES[(by_origin, by_destination)]
+    assert f"INDEX {index}" in plan
+    assert "SCAN flights" not in plan
+    # 排序沿索引进行，只对同一时刻的航班补充排序
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+    assert rows
+
+
+def test_million_flight_search_pages_are_stable(million_flights):
+    args = {"departure_airport": "AAA", "start_time": "2030-03-01", "end_time": "2030-03-31", "limit": 50}
+    seen, cursor = [], None
+    for _ in range(3):
+        payload = json.loads(search_flights.invoke({**args, "cursor": cursor}))
+        seen.extend(row[0] for row in payload["rows"])
+        cursor = payload["next_cursor"]
+    assert len(seen) == len(set(seen)) == 3 * min(50, settings.TOOL_RESULT_MAX_ROWS)
+
+    with database.get_connection() as conn:
+        query, params = build_flight_search(("flight_id",), "AAA", None, "2030-03-01", "2030-03-31")
+        expected = [row[0] for row in conn.execute(query + " LIMIT ?", [*params, len(seen)])]
+    assert seen == expected
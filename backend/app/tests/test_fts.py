@@ -0,0 +1,79 @@
+import sqlite3
+
+from app.core.fts import build_search, match_expression
+from app.core.schema import get_schema
+from app.services.customer_support.tools.car_rental_tool import search_car_rentals
+from app.services.customer_support.tools.excursions_tool import search_trip_recommendations, update_excursion
+from app.services.customer_support.tools.hotels_tool import search_hotels
+from app.services.customer_support.tools.result_shaping import decode_table
+
+
+def _names(result):
+    return [row["name"] for row in decode_table(result)]
+
+
+def test_match_expression_quotes_prefixes_and_ors():
+    assert match_expression({"location": 'Ba"sel', "name": None}) == 'location : "Ba""sel"*'
+    assert match_expression({}, {"keywords": ["art", " ", "museum"]}) == 'keywords : ("art"* OR "museum"*)'
+    assert match_expression({"location": "%"}) is None
+
+
+def test_fts_tables_are_created_at_startup(travel_db):
+    schema = get_schema()
+    for table in ("hotels_fts", "car_rentals_fts", "trip_recommendations_fts"):
+        assert schema.has_table(table)
+
+
+def test_prefix_search_is_ranked(travel_db):
+    assert set(_names(search_hotels.invoke({"location": "bas"}))) == {
+        "Hilton Basel", "Hyatt Regency Basel", "Holiday Inn Basel",
+    }
+    assert _names(search_hotels.invoke({"location": "Basel", "name": "hy"})) == ["Hyatt Regency Basel"]
+    assert _names(search_car_rentals.invoke({"location": "Zur"})) == ["Hertz"]
+    # 名称和地点都命中 "Basel" 的记录相关度更高
+    trips = search_trip_recommendations.invoke({"location": "basel", "keywords": "museum, landmark"})
+    assert set(_names(trips)) == {"Basel Minster", "Kunstmuseum Basel"}
+
+
+def test_index_follows_row_changes(travel_db):
+    get_schema()
+    conn = sqlite3.connect(travel_db)
+    conn.execute("UPDATE hotels SET name = 'Grand Hotel Les Trois Rois' WHERE id = 1")
+    conn.execute("INSERT INTO hotels VALUES (5, 'Radisson Blu', 'Lucerne', 'Upscale', '2024-04-02', '2024-04-20', 0)")
+    conn.execute("DELETE FROM hotels WHERE id = 4")
+    conn.commit()
+    conn.close()
+
+    assert _names(search_hotels.invoke({"name": "trois"})) == ["Grand Hotel Les Trois Rois"]
+    assert _names(search_hotels.invoke({"name": "hilton"})) == []
+    assert _names(search_hotels.invoke({"location": "luc"})) == ["Radisson Blu"]
+    assert "Holiday Inn Basel" not in _names(search_hotels.invoke({"location": "Basel"}))
+
+
+def test_update_tool_keeps_index_consistent(travel_db):
+    update_excursion.invoke({"recommendation_id": 2, "details": "New exhibition"})
+    assert _names(search_trip_recommendations.invoke({"keywords": "art"})) == ["Kunstmuseum Basel"]
+    # 索引与原表不一致时 integrity-check 会抛出 SQLITE_CORRUPT
+    conn = sqlite3.connect(travel_db)
+    conn.execute("INSERT INTO trip_recommendations_fts(trip_recommendations_fts) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_fts_query_does_not_scan_base_table(travel_db):
+    get_schema()
+    query, params = build_search("hotels", {"location": "Basel"})
+    conn = sqlite3.connect(travel_db)
+    plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+    conn.close()
+    assert "VIRTUAL TABLE" in plan
+    assert "SEARCH hotels USING INTEGER PRIMARY KEY" in plan
+
+
+def test_like_fallback_without_fts():
+    query, params = build_search("trip_recommendations", {"location": "Basel"}, {"keywords": ["art", "history"]},
+                                 use_fts=False)
+    assert query == (
+        "SELECT trip_recommendations.* FROM trip_recommendations WHERE 1=1 AND location LIKE ? "
+        "AND (keywords LIKE ? OR keywords LIKE ?) ORDER BY trip_recommendations.rowid"
+    )
+    assert params == ["%Basel%", "%art%", "%history%"]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+from app.services.customer_support.graph import create_customer_support_graph
+from app.services.customer_support.history import (
+    compact_tool_results,
+    estimate_tokens,
+    extractive_summarizer,
+    window_start,
+)
+
+
+def _turn(i, result="x" * 2000):
+    return [
+        HumanMessage(content=f"question {i}", id=f"h{i}"),
+        AIMessage(content="", tool_calls=[{"name": "search_hotels", "args": {"location": "Basel"}, "id": f"c{i}"}],
+                  id=f"a{i}"),
+        ToolMessage(content=result, tool_call_id=f"c{i}", id=f"t{i}"),
+        AIMessage(content=f"answer {i}", id=f"r{i}"),
+    ]
+
+
+def test_old_tool_results_are_compacted():
+    messages = _turn(0) + _turn(1)[:3]
+    compacted = compact_tool_results(messages, 100)
+    # 当前轮（最后一条用户消息之后）的工具结果保持原样
+    assert [m.id for m in compacted] == ["t0"]
+    assert compacted[0].content.startswith("x" * 100) and "2000 characters" in compacted[0].content
+    assert compact_tool_results(compacted, 100) == []
+
+
+def test_window_keeps_whole_turns_within_budget():
+    messages = _turn(0, "short") + _turn(1, "short") + _turn(2, "short") + [HumanMessage(content="now", id="h3")]
+    turn_tokens = sum(estimate_tokens(m) for m in _turn(0, "short"))
+    start = window_start(messages, turn_tokens + 10)
+    assert messages[start].id == "h2"
+    assert window_start(messages, 10_000) == 0
+    # 预算再小也保留当前轮
+    assert messages[window_start(messages, 1)].id == "h3"
+
+
+def test_extractive_summary_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_SUMMARY_MAX_TOKENS", 20)
+    summary = asyncio.run(extractive_summarizer("- User: first", _turn(0)))
+    # 超出预算时先丢弃最早的行
+    assert len(summary) <= 80 and "first" not in summary
+    assert summary.endswith("- Assistant: answer 0")
+
+
+def test_graph_summarizes_incrementally(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TOKENS", 120)
+    seen, summarized = [], []
+
+    async def respond(state) -> AIMessage:
+        seen.append((len(state["messages"]), state["conversation_summary"]))
+        return AIMessage(content="sure " * 30)
+
+    async def summarizer(summary, messages):
+        summarized.append([m.id for m in messages])
+        return f"{summary}|{len(messages)}"
+
+    graph = create_customer_support_graph(RunnableLambda(respond), MemorySaver(), summarizer)
+    config = {"configurable": {"thread_id": "t", "passenger_id": "P1"}}
+
+    async def chat(turns):
+        for i in range(turns):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"question {i} " * 20)]}, config)
+        return await graph.aget_state(config)
+
+    state = asyncio.run(chat(8))
+    # 每次摘要的消息互不重复，都是此前尚未摘要的内容
+    ids = [i for batch in summarized for i in batch]
+    assert summarized and len(ids) == len(set(ids))
+    # 发送给 LLM 的消息数不再随轮数增长，较早的内容以摘要形式出现在 system 中
+    assert max(count for count, _ in seen[-4:]) <= 3
+    assert "<Summary>" in seen[-1][1]
+    assert len(state.values["messages"]) <= 4
+    assert state.values["summary"].count("|") == len(summarized)
+
+
+def test_prefix_is_unchanged_across_turns_within_budget(travel_db, monkeypatch):
+    # 工具结果都超过压缩阈值，但历史在预算之内时不能改写已发送过的消息（否则提示缓存失效）
+    monkeypatch.setattr(settings, "HISTORY_TOOL_RESULT_MAX_CHARS", 20)
+    calls = []
+
+    async def respond(state) -> AIMessage:
+        messages = state["messages"]
+        calls.append([m.model_dump_json() for m in messages])
+        if isinstance(messages[-1], HumanMessage):
+            call = {"name": "search_hotels", "args": {"location": "Basel"}, "id": f"c{len(calls)}"}
+            return AIMessage(content="", tool_calls=[call])
+        return AIMessage(content="here you go")
+
+    graph = create_customer_support_graph(RunnableLambda(respond), MemorySaver())
+    config = {"configurable": {"thread_id": "t", "passenger_id": "P1"}}
+
+    async def chat(turns):
+        for i in range(turns):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"question {i}")]}, config)
+
+    asyncio.run(chat(3))
+    assert len(calls) == 6
+    assert len(json.loads(calls[1][-1])["content"]) > 20
+    # 每轮第一次调用时，上一轮最后一次调用看到的消息原样保留在前缀中
+    for previous, first in ((calls[1], calls[2]), (calls[3], calls[4])):
+        assert first[:len(previous)] == previous
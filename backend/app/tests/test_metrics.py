@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry
+from app.routers import customer_router
+from app.services.customer_support import instrumentation
+from app.services.customer_support.graph import Assistant, create_customer_support_graph
+from app.tests.test_chat_api import _run, _turn
+
+
+def _usage(inputs, outputs, cache_read=0):
+    return {
+        "input_tokens": inputs,
+        "output_tokens": outputs,
+        "total_tokens": inputs + outputs,
+        "input_token_details": {"cache_read": cache_read},
+    }
+
+
+def _fake_llm(*replies):
+    model = GenericFakeChatModel(messages=iter(replies))
+    return RunnableLambda(lambda state: state["messages"]) | model
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["status"])
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    counter.inc(status="ok")
+    counter.inc(2, status='bad "x"')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+    registry.register_collector("pool_size", "Pool", lambda: [({"state": "idle"}, 2)])
+    registry.register_collector("broken", "Fails", lambda: 1 / 0)
+    registry.register_collector("loads_total", "Loads", lambda: [({}, 5)], type="counter")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{status="bad \\"x\\""} 2' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 3.55" in lines
+    assert "latency_seconds_count 3" in lines
+    assert 'pool_size{state="idle"} 2' in lines
+    assert "# TYPE pool_size gauge" in lines
+    assert "# TYPE loads_total counter" in lines and "loads_total 5" in lines
+    # 出错的采集回调被跳过
+    assert not any(line.startswith("# HELP broken") for line in lines)
+
+
+@pytest.fixture
+def instrumented_graph(travel_db, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_JSON_LOGS", True)
+    llm = _fake_llm(
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "search_hotels", "args": {"location": "Basel"}, "id": "call-1"}],
+            usage_metadata=_usage(100, 10, cache_read=80),
+        ),
+        AIMessage(content="Here are some hotels.", usage_metadata=_usage(150, 20, cache_read=80)),
+    )
+    customer_router.graph = create_customer_support_graph(llm, MemorySaver())
+    yield
+    customer_router.graph = None
+
+
+def test_chat_records_node_tool_and_token_metrics(instrumented_graph, caplog):
+    before_tokens = instrumentation.TOKENS.value(type="cache_read")
+    before_tool = instrumentation.TOOL_SECONDS.count(tool="search_hotels", status="ok")
+    before_nodes = instrumentation.NODE_SECONDS.count(node="assistant")
+    before_requests = instrumentation.REQUESTS.value(status="ok")
+
+    with caplog.at_level(logging.INFO, logger=instrumentation.__name__):
+        response, = _run(_turn("find me a hotel in Basel", passenger_id="P1"))
+    assert response.json()["response"] == "Here are some hotels."
+
+    assert instrumentation.TOKENS.value(type="cache_read") == before_tokens + 160
+    assert instrumentation.TOOL_SECONDS.count(tool="search_hotels", status="ok") == before_tool + 1
+    assert instrumentation.NODE_SECONDS.count(node="assistant") == before_nodes + 2
+    assert instrumentation.REQUESTS.value(status="ok") == before_requests + 1
+
+    logged = [json.loads(r.getMessage()) for r in caplog.records if r.getMessage().startswith("{")]
+    assert logged[-1]["thread_id"] == response.json()["thread_id"]
+    assert logged[-1]["hops"] == 1
+    assert logged[-1]["tokens"] == {"input": 250, "output": 30, "cache_read": 160}
+    assert set(logged[-1]["nodes_ms"]) == {"history", "assistant", "tools"}
+    assert set(logged[-1]["tools_ms"]) == {"search_hotels"}
+
+    # 所有运行结束后不残留按 run_id 记录的状态
+    callback = instrumentation.metrics_callback
+    assert not (callback._requests or callback._roots or callback._nodes or callback._tools)
+
+    metrics, = _run(("GET", "/metrics", {}))
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'graph_tool_duration_seconds_count{tool="search_hotels",status="ok"}' in metrics.text
+    assert 'db_pool_connections{state="max_size"}' in metrics.text
+    assert 'cache_hits_total{cache="tool_results"}' in metrics.text
+    assert "# TYPE cache_hits_total counter" in metrics.text
+
+
+def test_retries_are_reported_through_callbacks(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY_SECONDS", 0.001)
+    replies = iter(["", "done"])
+    assistant = Assistant(RunnableLambda(lambda state: AIMessage(content=next(replies))))
+    before = instrumentation.RETRIES.value(reason="empty")
+
+    async def go():
+        runnable = RunnableLambda(assistant)
+        config = {"configurable": {"passenger_id": "P1"}, "callbacks": [instrumentation.metrics_callback]}
+        return await runnable.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+
+    assert asyncio.run(go())["messages"].content == "done"
+    assert instrumentation.RETRIES.value(reason="empty") == before + 1
+
+
+def test_metrics_disabled_attaches_no_callbacks(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    config = customer_router._run_config({"configurable": {"thread_id": "t", "passenger_id": "P1"}})
+    assert "callbacks" not in config
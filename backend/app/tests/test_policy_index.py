@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.services.customer_support.retrieval.embedders import Embedder, HashingEmbedder
+from app.services.customer_support.retrieval.index import ensure_index, load_index
+from app.services.customer_support.retrieval.vector_store import VectorStoreRetriever
+from app.services.customer_support.tools import policy_tool
+
+FAQ = "# FAQ\n## Baggage\nOne bag.\n## Refunds\nRefunds within 24h.\n## Changes\nChanges allowed.\n"
+
+
+class CountingEmbedder(Embedder):
+    def __init__(self, name="m"):
+        self.name = name
+        self.calls = 0
+        self._inner = HashingEmbedder(64)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return self._inner.embed_documents(texts)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = tmp_path / "swiss_faq.md"
+    source.write_text(FAQ, encoding="utf-8")
+    return tmp_path / "index", source
+
+
+def test_build_then_load_as_mmap_without_reembedding(paths):
+    index_dir, source = paths
+    embed = CountingEmbedder()
+    ensure_index(index_dir, source, embed)
+
+    index = ensure_index(index_dir, source, embed)
+    assert embed.calls == 1
+    assert isinstance(index.vectors, np.memmap)
+    assert index.vectors.dtype == np.float32
+    assert index.chunks[1].startswith("\n## Baggage")
+
+
+def test_rebuilds_only_when_content_or_model_changes(paths):
+    index_dir, source = paths
+    embed = CountingEmbedder()
+    ensure_index(index_dir, source, embed)
+
+    source.write_text(FAQ + "## Pets\nSmall pets allowed.\n", encoding="utf-8")
+    assert len(ensure_index(index_dir, source, embed).chunks) == 5
+    embed.name = "other-model"
+    ensure_index(index_dir, source, embed)
+    assert embed.calls == 3
+
+
+def test_index_without_source_is_trusted_and_missing_everything_fails(paths):
+    index_dir, source = paths
+    ensure_index(index_dir, source, CountingEmbedder())
+    source.unlink()
+
+    def no_network():
+        raise AssertionError("should not fetch")
+
+    assert ensure_index(index_dir, source, CountingEmbedder(), fetch=no_network) is not None
+    with pytest.raises(FileNotFoundError):
+        ensure_index(index_dir.parent / "empty", source, CountingEmbedder())
+
+
+def test_incomplete_index_is_ignored(paths):
+    index_dir, source = paths
+    ensure_index(index_dir, source, CountingEmbedder())
+    (index_dir / "chunks.json").write_text("[]", encoding="utf-8")
+    assert load_index(index_dir) is None
+
+
+def test_lookup_policy_uses_loaded_index(paths):
+    index_dir, source = paths
+    embedder = CountingEmbedder()
+    index = ensure_index(index_dir, source, embedder)
+    policy_tool.set_retriever(VectorStoreRetriever.from_index(index, embedder))
+    try:
+        result = policy_tool.lookup_policy.invoke({"query": "how long do refunds take"})
+    finally:
+        policy_tool.set_retriever(None)
+    assert result.startswith("\n## Refunds")
+
+
+def test_retriever_rejects_index_from_another_embedder(paths):
+    index_dir, source = paths
+    index = ensure_index(index_dir, source, CountingEmbedder())
+    with pytest.raises(ValueError):
+        VectorStoreRetriever.from_index(index, HashingEmbedder(64))
@@ -0,0 +1,104 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.services.customer_support.graph import create_llm, primary_assistant_prompt, tools
+from app.services.customer_support.prompt_cache import (
+    PromptCacheStats,
+    add_cache_breakpoints,
+    cacheable_tools,
+    turn_usage,
+)
+
+CACHED = {"type": "ephemeral"}
+
+
+def _conversation(turns):
+    """turns 轮对话，每轮：用户消息 -> 工具调用 -> 工具结果 -> 回答"""
+    messages = []
+    for i in range(turns):
+        messages += [
+            HumanMessage(content=f"question {i}"),
+            AIMessage(content="", tool_calls=[{"name": "search_flights", "args": {}, "id": f"call_{i}"}]),
+            ToolMessage(content=f"result {i}", tool_call_id=f"call_{i}"),
+            AIMessage(content=f"answer {i}"),
+        ]
+    return messages
+
+
+def _payload(messages):
+    llm = create_llm().bind_tools(cacheable_tools(tools))
+    prompt = primary_assistant_prompt.invoke({"messages": messages, "user_info": "3442 587242"})
+    return llm.bound._get_request_payload(add_cache_breakpoints(prompt), **llm.kwargs)
+
+
+def _breakpoints(payload):
+    marked = []
+    for position, message in enumerate(payload["messages"]):
+        content = message["content"]
+        if isinstance(content, list) and any("cache_control" in block for block in content):
+            marked.append(position)
+    return marked
+
+
+def test_system_and_tools_are_cached():
+    payload = _payload([HumanMessage(content="hello")])
+    static, dynamic = payload["system"]
+    assert static["cache_control"] == CACHED and "Swiss Airlines" in static["text"]
+    # 当前用户在断点之后，不影响共享前缀
+    assert "cache_control" not in dynamic and "3442 587242" in dynamic["text"]
+    assert payload["tools"][-1]["cache_control"] == CACHED
+    assert sum("cache_control" in tool for tool in payload["tools"]) == 1
+
+
+def test_history_breakpoint_moves_forward():
+    history = _conversation(2) + [HumanMessage(content="question 2")]
+    first = _payload(history)
+    # 最新的用户消息，以及上一次调用时的末尾（工具结果）
+    assert _breakpoints(first) == [len(first["messages"]) - 3, len(first["messages"]) - 1]
+
+    history += [
+        AIMessage(content="", tool_calls=[{"name": "search_flights", "args": {}, "id": "call_2"}]),
+        ToolMessage(content="result 2", tool_call_id="call_2"),
+    ]
+    second = _payload(history)
+    # 上一次写入缓存的位置（question 2）在这一次仍是断点，可以直接读取
+    assert first["messages"][-1] == second["messages"][-3]
+    assert _breakpoints(second) == [len(second["messages"]) - 3, len(second["messages"]) - 1]
+    # 请求中的断点总数不超过 4 个
+    assert len(_breakpoints(second)) + 2 <= 4
+
+
+def test_breakpoints_do_not_modify_state():
+    messages = _conversation(1) + [HumanMessage(content="again")]
+    marked = add_cache_breakpoints([SystemMessage(content="a"), SystemMessage(content="b"), *messages])
+    assert isinstance(marked[0], SystemMessage) and len(marked) == len(messages) + 1
+    assert messages[-1].content == "again" and messages[2].content == "result 0"
+    assert add_cache_breakpoints(messages, history_breakpoints=0) == messages
+
+
+def test_turn_usage_sums_calls_since_last_user_message():
+    def ai(input_tokens, cache_read, cache_creation):
+        return AIMessage(
+            content="ok",
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": 10,
+                "total_tokens": input_tokens + 10,
+                "input_token_details": {"cache_read": cache_read, "cache_creation": cache_creation},
+            },
+        )
+
+    messages = [HumanMessage(content="q1"), ai(1000, 0, 900), HumanMessage(content="q2"), ai(1200, 900, 200),
+                ToolMessage(content="r", tool_call_id="x"), ai(1400, 1100, 200)]
+    assert turn_usage(messages) == {
+        "input_tokens": 2600,
+        "output_tokens": 20,
+        "cache_read_input_tokens": 2000,
+        "cache_creation_input_tokens": 400,
+    }
+    assert turn_usage([HumanMessage(content="q"), AIMessage(content="no usage")]) is None
+
+    stats = PromptCacheStats()
+    for message in messages:
+        stats.record(message)
+    assert stats.stats()["calls"] == 3
+    assert stats.stats()["cache_hit_rate"] == 2000 / 3600
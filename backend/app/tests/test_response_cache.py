@@ -0,0 +1,140 @@
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+from app.routers import customer_router
+from app.services.customer_support.graph import SHARED_TOOLS, create_customer_support_graph
+from app.services.customer_support.response_cache import (
+    SemanticResponseCache,
+    set_response_cache,
+    shareable_answer,
+)
+from app.services.customer_support.retrieval.embedders import HashingEmbedder
+from app.tests.test_chat_api import _run, _turn
+
+EMBED = HashingEmbedder(256).embed_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _call(name):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": {}, "id": name}])
+
+
+def test_similar_questions_hit_until_ttl():
+    clock = FakeClock()
+    cache = SemanticResponseCache(EMBED, max_entries=4, ttl_seconds=60, threshold=0.9, clock=clock)
+    cache.store("What is the baggage allowance?", "23 kg")
+    assert cache.lookup("what is the  baggage allowance") == "23 kg"
+    assert cache.lookup("Can I get a refund for my ticket?") is None
+    clock.now += 61
+    assert cache.lookup("What is the baggage allowance?") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    clock = FakeClock()
+    cache = SemanticResponseCache(EMBED, max_entries=2, ttl_seconds=600, threshold=0.9, clock=clock)
+    cache.store("baggage allowance", "a")
+    clock.now += 1
+    cache.store("refund rules", "b")
+    clock.now += 1
+    assert cache.lookup("baggage allowance") == "a"
+    clock.now += 1
+    cache.store("pet policy", "c")
+    assert cache.lookup("refund rules") is None
+    assert cache.lookup("baggage allowance") == "a" and cache.lookup("pet policy") == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_unavailable_embedder_is_retried_after_backoff(monkeypatch, caplog):
+    from types import SimpleNamespace
+
+    from app.services.customer_support.tools import policy_tool
+
+    loads = []
+
+    def get_retriever():
+        loads.append(1)
+        if len(loads) == 1:
+            raise RuntimeError("no policy index")
+        return SimpleNamespace(embedder=SimpleNamespace(embed_query=EMBED))
+
+    monkeypatch.setattr(policy_tool, "get_retriever", get_retriever)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_RETRY_SECONDS", 60)
+    clock = FakeClock()
+    cache = SemanticResponseCache(max_entries=2, threshold=0.9, clock=clock)
+    # 退避期内不再加载嵌入器（不会在每个请求上下载 FAQ），缓存直接跳过
+    assert cache.lookup("baggage allowance") is None
+    cache.store("baggage allowance", "23 kg")
+    assert cache.lookup("baggage allowance") is None
+    assert len(loads) == 1
+    assert sum("嵌入器不可用" in r.getMessage() for r in caplog.records) == 1
+
+    clock.now += 61
+    cache.store("baggage allowance", "23 kg")
+    assert cache.lookup("baggage allowance") == "23 kg"
+    assert len(loads) == 2
+
+
+def test_zero_ttl_is_not_replaced_by_the_default():
+    assert SemanticResponseCache(EMBED, max_entries=2, ttl_seconds=0).ttl_seconds == 0
+
+
+def test_only_answers_without_personal_tools_are_shared():
+    answer = AIMessage(content="Refunds are possible within 24 hours.")
+    policy = [_call("lookup_policy"), ToolMessage(content="...", tool_call_id="lookup_policy"), answer]
+    assert SHARED_TOOLS == {"lookup_policy"}
+    assert shareable_answer(policy, SHARED_TOOLS) == answer.content
+    assert shareable_answer([answer], SHARED_TOOLS) == answer.content
+    for name in ("fetch_user_flight_information", "search_hotels", "not_a_registered_tool"):
+        assert shareable_answer([_call(name), answer], SHARED_TOOLS) is None
+    personal = AIMessage(content="Passenger 3442 587242 may request a refund.")
+    assert shareable_answer([personal], SHARED_TOOLS, "3442 587242") is None
+    fallback = AIMessage(content="Sorry", response_metadata={"fallback": True})
+    assert shareable_answer([fallback], SHARED_TOOLS) is None
+
+
+@pytest.fixture
+def cached_chat(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    set_response_cache(SemanticResponseCache(EMBED, max_entries=8, threshold=0.9))
+    calls = []
+
+    async def respond(state):
+        calls.append(len(state["messages"]))
+        return AIMessage(content=f"answer {len(calls)}")
+
+    customer_router.graph = create_customer_support_graph(RunnableLambda(respond), MemorySaver())
+    yield calls
+    customer_router.graph = None
+    set_response_cache(None)
+
+
+def test_repeated_first_question_is_served_from_cache(cached_chat):
+    first, second = _run(
+        _turn("What is the baggage allowance?", passenger_id="P1"),
+        _turn("what is the baggage allowance", passenger_id="P2"),
+    )
+    assert first.json()["response"] == second.json()["response"] == "answer 1"
+    assert cached_chat == [1]
+
+    # 命中缓存的问答写入了会话，后续轮次在此基础上继续
+    follow_up, = _run(_turn("and for children?", thread_id=second.json()["thread_id"]))
+    assert follow_up.json()["response"] == "answer 2"
+    assert cached_chat == [1, 3]
+
+
+def test_follow_up_questions_are_not_cached(cached_chat):
+    first, = _run(_turn("hi", passenger_id="P1"))
+    _run(_turn("What is the baggage allowance?", thread_id=first.json()["thread_id"]))
+    new_thread, = _run(_turn("What is the baggage allowance?", passenger_id="P2"))
+    assert new_thread.json()["response"] == "answer 3"
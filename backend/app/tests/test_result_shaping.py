@@ -0,0 +1,104 @@
+import json
+import sqlite3
+
+import pytest
+
+from app.core.config import settings
+from app.services.customer_support.tools.excursions_tool import search_trip_recommendations
+from app.services.customer_support.tools.flight_tool import FLIGHT_SEARCH_COLUMNS, search_flights
+from app.services.customer_support.tools.hotels_tool import search_hotels
+from app.services.customer_support.tools.result_shaping import (
+    decode_cursor,
+    decode_table,
+    encode_cursor,
+    encode_table,
+)
+
+
+def _add_hotels(travel_db, count):
+    conn = sqlite3.connect(travel_db)
+    conn.executemany(
+        "INSERT INTO hotels VALUES (?, ?, 'Geneva', 'Midscale', '2024-04-02', '2024-04-20', 0)",
+        [(100 + i, f"Geneva Hotel {i}") for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _pages(tool, args):
+    rows, pages, cursor = [], 0, None
+    while True:
+        payload = json.loads(tool.invoke({**args, "cursor": cursor}))
+        rows.extend(dict(zip(payload["columns"], row)) for row in payload["rows"])
+        pages += 1
+        cursor = payload.get("next_cursor")
+        if not cursor:
+            return rows, pages
+
+
+def test_cursor_is_bound_to_tool_and_filters():
+    args = {"location": "Basel", "cursor": None}
+    cursor = encode_cursor("search_hotels", args, 40)
+    assert decode_cursor(cursor, "search_hotels", {**args, "cursor": cursor}) == 40
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "search_hotels", {"location": "Zurich"})
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "search_car_rentals", args)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", "search_hotels", args)
+
+
+def test_compact_encoding_round_trip(monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_RESULT_MAX_CELL_CHARS", 5)
+    text = encode_table(["id", "details"], [(1, "short"), (2, "much longer text")], next_cursor=None)
+    assert text == '{"columns":["id","details"],"rows":[[1,"short"],[2,"much …"]]}'
+    assert decode_table(text)[1] == {"id": 2, "details": "much …"}
+
+
+def test_search_is_capped_and_paginated(travel_db, monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_RESULT_MAX_ROWS", 4)
+    _add_hotels(travel_db, 10)
+
+    first = json.loads(search_hotels.invoke({"location": "Geneva"}))
+    assert len(first["rows"]) == 4 and first["next_cursor"]
+    rows, pages = _pages(search_hotels, {"location": "Geneva"})
+    assert pages == 3
+    assert [row["id"] for row in rows] == list(range(100, 110))
+
+    # 游标换了条件后不能继续使用
+    with pytest.raises(ValueError):
+        search_hotels.invoke({"location": "Basel", "cursor": first["next_cursor"]})
+
+
+def test_oversized_page_is_trimmed_and_summarized(travel_db, monkeypatch):
+    _add_hotels(travel_db, 10)
+    full = search_hotels.invoke({"location": "Geneva"})
+    monkeypatch.setattr(settings, "TOOL_RESULT_MAX_CHARS", len(full) // 2)
+
+    payload = json.loads(search_hotels.invoke({"location": "Geneva"}))
+    assert len(json.dumps(payload, ensure_ascii=False, separators=(",", ":"))) <= len(full) // 2
+    kept = len(payload["rows"])
+    assert 0 < kept < 10
+    assert payload["summary"]["rows"] == 10 - kept
+    assert payload["summary"]["price_tier"] == {"Midscale": 10 - kept}
+    # 被截掉的行仍可以通过游标取回
+    rows, _ = _pages(search_hotels, {"location": "Geneva"})
+    assert len(rows) == 10
+
+
+def test_columns_are_projected(travel_db):
+    payload = json.loads(search_flights.invoke({"departure_airport": "CDG"}))
+    assert tuple(payload["columns"]) == FLIGHT_SEARCH_COLUMNS
+    assert "aircraft_code" not in payload["columns"]
+    assert [row[0] for row in payload["rows"]] == [1, 2]
+
+    payload = json.loads(search_trip_recommendations.invoke({"keywords": "history"}))
+    assert payload["columns"] == ["id", "name", "location", "keywords", "details", "booked"]
+
+
+def test_flight_limit_respects_global_cap(travel_db, monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_RESULT_MAX_ROWS", 2)
+    payload = json.loads(search_flights.invoke({"limit": 50}))
+    assert len(payload["rows"]) == 2 and payload["next_cursor"]
+    rows, pages = _pages(search_flights, {"limit": 50})
+    assert [row["flight_id"] for row in rows] == [1, 3, 2] and pages == 2
@@ -0,0 +1,43 @@
+from app.core.database import get_connection
+from app.core.schema import REQUIRED_COLUMNS, get_schema, init_schema
+from app.tests.conftest import PASSENGER_ID
+
+
+def test_init_schema_loads_once_and_creates_indexes(travel_db):
+    registry = init_schema()
+    assert registry.has_table("tickets")
+    assert "passenger_id" in registry.columns("tickets")
+    assert registry.missing_columns(REQUIRED_COLUMNS) == {}
+    assert registry.has_index("idx_tickets_passenger")
+    assert init_schema() is registry
+
+
+def test_fetch_user_flight_information_is_a_single_query(travel_db):
+    from app.services.customer_support.tools.flight_tool import (
+        USER_FLIGHTS_QUERY,
+        fetch_user_flight_information,
+    )
+
+    get_schema()
+    statements = []
+    config = {"configurable": {"passenger_id": PASSENGER_ID}}
+    with get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        rows = fetch_user_flight_information.invoke({}, config=config)
+        conn.set_trace_callback(None)
+
+        plan = " ".join(
+            row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {USER_FLIGHTS_QUERY}", (PASSENGER_ID,))
+        )
+
+    assert [row["seat_no"] for row in rows] == ["18E"]
+    assert len(statements) == 1
+    assert "sqlite_master" not in statements[0]
+    assert "idx_tickets_passenger" in plan
+
+
+def test_fetch_user_flight_information_unknown_passenger(travel_db):
+    from app.services.customer_support.tools.flight_tool import fetch_user_flight_information
+
+    config = {"configurable": {"passenger_id": "0000 000000"}}
+    assert fetch_user_flight_information.invoke({}, config=config) == []
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+# 导入 app.main（uvicorn 启动 worker 时做的事情）的累计耗时上限，主要开销应只剩 FastAPI 本身
+IMPORT_BUDGET_SECONDS = 1.0
+
+# 这些模块只应在构建对话图或首次调用工具时加载
+LAZY_MODULES = (
+    "app.services.customer_support.graph",
+    "langchain_anthropic",
+    "langchain_community",
+    "langgraph",
+    "numpy",
+    "openai",
+)
+
+
+def _import_times(module):
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def test_app_import_is_lazy_and_within_budget():
+    times = _import_times("app.main")
+    loaded = [name for name in times if name.split(".")[0] in LAZY_MODULES or name in LAZY_MODULES]
+    assert loaded == []
+    assert times["app.main"] < IMPORT_BUDGET_SECONDS, f"import app.main took {times['app.main']:.3f}s"
@@ -0,0 +1,102 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk, ToolMessage
+
+from app.services.customer_support.streaming import stream_graph_events
+
+
+def _token(text, node="assistant"):
+    return {
+        "event": "on_chat_model_stream",
+        "metadata": {"langgraph_node": node},
+        "data": {"chunk": AIMessageChunk(content=[{"type": "text", "text": text, "index": 0}])},
+    }
+
+
+class FakeGraph:
+    def __init__(self, events, delay=0.0):
+        self.events = events
+        self.delay = delay
+        self.cancelled = False
+
+    async def astream_events(self, inputs, config, version):
+        try:
+            for event in self.events:
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield event
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def _collect(graph, **kwargs):
+    return [event async for event in stream_graph_events(graph, {}, {}, **kwargs)]
+
+
+def test_translates_tokens_and_tool_events():
+    graph = FakeGraph([
+        _token("Hello"),
+        _token("ignored", node="summarize"),
+        {"event": "on_tool_start", "name": "search_hotels", "run_id": "r1", "data": {"input": {"location": "Basel"}}},
+        {"event": "on_tool_end", "name": "search_hotels", "run_id": "r1",
+         "data": {"output": ToolMessage(content="[]", tool_call_id="c1")}},
+        {"event": "on_chain_start", "name": "assistant", "data": {}},
+    ])
+    events = asyncio.run(_collect(graph))
+    assert events == [
+        {"type": "token", "content": "Hello"},
+        {"type": "tool_start", "run_id": "r1", "name": "search_hotels", "input": {"location": "Basel"}},
+        {"type": "tool_end", "run_id": "r1", "name": "search_hotels", "output": "[]"},
+    ]
+
+
+def test_slow_consumer_gets_coalesced_tokens():
+    words = [f"w{i} " for i in range(50)]
+    graph = FakeGraph([_token(w) for w in words] + [
+        {"event": "on_tool_start", "name": "lookup_policy", "run_id": "r1", "data": {"input": {}}},
+    ])
+
+    async def slow_collect():
+        events = []
+        async for event in stream_graph_events(graph, {}, {}, max_buffer=2):
+            await asyncio.sleep(0.001)
+            events.append(event)
+        return events
+
+    events = asyncio.run(slow_collect())
+    tokens = [e["content"] for e in events if e["type"] == "token"]
+    assert "".join(tokens) == "".join(words)
+    assert len(tokens) < len(words)
+    assert events[-1]["type"] == "tool_start"
+
+
+def test_stopping_consumer_cancels_graph():
+    graph = FakeGraph([_token(str(i)) for i in range(1000)], delay=0.01)
+
+    async def read_one():
+        stream = stream_graph_events(graph, {}, {})
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(read_one()) == {"type": "token", "content": "0"}
+    assert graph.cancelled
+
+
+def test_chat_events_enforce_request_deadline(monkeypatch):
+    from app.core.config import settings
+    from app.routers.customer_router import _chat_events
+
+    monkeypatch.setattr(settings, "CHAT_REQUEST_TIMEOUT_SECONDS", 0.1)
+    graph = FakeGraph([_token(str(i)) for i in range(1000)], delay=0.03)
+    config = {"configurable": {"thread_id": "t", "passenger_id": "P1"}}
+
+    async def collect():
+        return [event async for event in _chat_events(graph, {}, config)]
+
+    events = asyncio.run(collect())
+    # 超时后以错误事件结束，后台的图被取消
+    assert 0 < len(events) < 10
+    assert events[-1] == {"type": "error", "thread_id": "t", "detail": "对话请求超时，请稍后重试"}
+    assert graph.cancelled
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+
+import pytest
+
+from app.core import database
+from app.core.config import settings
+from app.core.schema import REQUIRED_INDEXES, reset_schema
+from app.core.synthetic_db import TUTORIAL_PASSENGER_ID, generate_travel_db
+from app.services.customer_support.tools.flight_tool import fetch_user_flight_information, user_flights_cache
+from app.services.customer_support.tools.hotels_tool import search_hotels
+from app.services.customer_support.tools.memoize import tool_cache
+
+TABLES = ("flights", "tickets", "ticket_flights", "boarding_passes", "hotels", "car_rentals", "trip_recommendations")
+
+
+def _digest(path) -> str:
+    conn = sqlite3.connect(path)
+    digest = hashlib.sha256()
+    for table in TABLES:
+        for row in conn.execute(f"SELECT * FROM {table} ORDER BY rowid"):
+            digest.update(repr(row).encode())
+    conn.close()
+    return digest.hexdigest()
+
+
+def test_same_seed_generates_identical_data(tmp_path):
+    counts = generate_travel_db(tmp_path / "a.sqlite", 2000, seed=7)
+    generate_travel_db(tmp_path / "b.sqlite", 2000, seed=7)
+    generate_travel_db(tmp_path / "c.sqlite", 2000, seed=8)
+    assert _digest(tmp_path / "a.sqlite") == _digest(tmp_path / "b.sqlite")
+    assert _digest(tmp_path / "a.sqlite") != _digest(tmp_path / "c.sqlite")
+
+    assert counts["tickets"] == 2000
+    assert counts["flights"] == 181
+    assert 2 * 2000 < counts["ticket_flights"] < 3.5 * 2000
+    assert 0 < counts["boarding_passes"] < counts["ticket_flights"]
+    assert counts["hotels"] == counts["car_rentals"] == counts["trip_recommendations"] == 10
+    assert not (tmp_path / "a.sqlite.tmp").exists()
+
+
+def test_keys_are_consistent_and_indexed(tmp_path):
+    path = tmp_path / "travel.sqlite"
+    generate_travel_db(path, 5000)
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {name for name, _, _ in REQUIRED_INDEXES} <= indexes
+    orphans = conn.execute(
+        "SELECT COUNT(*) FROM ticket_flights tf LEFT JOIN flights f ON f.flight_id = tf.flight_id "
+        "WHERE f.flight_id IS NULL"
+    ).fetchone()[0]
+    assert orphans == 0
+    # 同一张机票不会两次包含同一航班，同一航班的座位号不重复，取消的航班没有登机牌
+    assert conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM ticket_flights GROUP BY ticket_no, flight_id HAVING COUNT(*) > 1)"
+    ).fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM boarding_passes GROUP BY flight_id, seat_no HAVING COUNT(*) > 1)"
+    ).fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT COUNT(*) FROM boarding_passes bp JOIN flights f ON f.flight_id = bp.flight_id "
+        "WHERE f.status = 'Cancelled'"
+    ).fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(DISTINCT ticket_no) FROM tickets").fetchone()[0] == 5000
+    # 常旅客：持票最多的乘客远多于平均
+    top = conn.execute(
+        "SELECT COUNT(*) FROM tickets GROUP BY passenger_id ORDER BY 1 DESC LIMIT 1"
+    ).fetchone()[0]
+    assert top >= 10
+    conn.close()
+
+
+def test_rejects_bad_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        generate_travel_db(tmp_path / "small.sqlite", 10)
+    path = tmp_path / "travel.sqlite"
+    path.write_text("")
+    with pytest.raises(FileExistsError):
+        generate_travel_db(path, 1000)
+
+
+def test_tools_run_against_generated_database(tmp_path, monkeypatch):
+    path = tmp_path / "travel.sqlite"
+    generate_travel_db(path, 1000)
+    database.close_pool()
+    reset_schema()
+    user_flights_cache.clear()
+    tool_cache.clear()
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{path}")
+    try:
+        flights = fetch_user_flight_information.invoke(
+            {}, {"configurable": {"passenger_id": TUTORIAL_PASSENGER_ID}}
+        )
+        assert flights and all(f["ticket_no"] == "7240000000000000" for f in flights)
+        hotels = json.loads(search_hotels.invoke({"location": "Zurich"}))
+        assert hotels["rows"]
+    finally:
+        database.close_pool()
+        reset_schema()
+        user_flights_cache.clear()
+        tool_cache.clear()
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from langchain_core.runnables import RunnableConfig
+
+from app.core.database import get_connection, write_transaction
+from app.core.schema import get_schema
+from app.core.table_versions import bump_versions, read_versions
+from app.services.customer_support.tools import policy_tool
+from app.services.customer_support.tools.hotels_tool import book_hotel, search_hotels
+from app.services.customer_support.tools.memoize import ToolCache, memoize, tool_cache
+
+
+def _traced(func):
+    get_schema()
+    statements = []
+    with get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            result = func()
+        finally:
+            conn.set_trace_callback(None)
+    return result, statements
+
+
+def _hotel_ids(**args):
+    return [row[0] for row in json.loads(search_hotels.invoke(args))["rows"]]
+
+
+def test_memoized_tool_keeps_its_schema():
+    assert set(search_hotels.args) == {"location", "name", "price_tier", "checkin_date", "checkout_date", "cursor"}
+    assert search_hotels.description.startswith("Search for hotels")
+
+
+def test_identical_calls_hit_the_cache(travel_db):
+    first, statements = _traced(lambda: _hotel_ids(location="Basel"))
+    assert any("FROM hotels" in s for s in statements)
+    # 参数规范化后相同，只读取版本号，不再执行搜索
+    second, statements = _traced(lambda: _hotel_ids(location=" Basel ", cursor=None))
+    assert second == first
+    assert not any("FROM hotels" in s for s in statements)
+    assert tool_cache.stats()["tools"]["search_hotels"]["hits"] >= 1
+
+
+def test_write_tools_bump_versions(travel_db):
+    assert 1 in _hotel_ids(location="Basel")
+    with get_connection() as conn:
+        before = read_versions(conn, ["hotels"])
+    assert book_hotel.invoke({"hotel_id": 1}).endswith("successfully booked.")
+    with get_connection() as conn:
+        assert read_versions(conn, ["hotels"]) == (before[0] + 1,)
+    assert 1 not in _hotel_ids(location="Basel")
+
+
+def test_rolled_back_write_keeps_the_version(travel_db):
+    get_schema()
+    with pytest.raises(RuntimeError):
+        with write_transaction() as conn:
+            bump_versions(conn, "hotels")
+            raise RuntimeError("boom")
+    with get_connection() as conn:
+        assert read_versions(conn, ["hotels"]) == (0,)
+
+
+def test_tools_taking_config_opt_out():
+    def personal(query: str, config: RunnableConfig) -> str:
+        return query
+
+    assert memoize()(personal) is personal
+
+    cache = ToolCache(max_size=8)
+    calls = []
+
+    @memoize(config_keys=("passenger_id",), cache=cache)
+    def per_passenger(query: str, config: RunnableConfig) -> str:
+        calls.append(query)
+        return f"{config['configurable']['passenger_id']}:{query}"
+
+    def config_for(passenger_id):
+        return {"configurable": {"passenger_id": passenger_id, "thread_id": passenger_id * 2}}
+
+    assert per_passenger("q", config_for("A")) == per_passenger("q", config_for("A")) == "A:q"
+    assert per_passenger("q", config_for("B")) == "B:q"
+    assert calls == ["q", "q"]
+    assert cache.stats()["tools"]["per_passenger"] == {"hits": 1, "misses": 2, "bypassed": 0, "hit_rate": 1 / 3}
+
+
+def test_lookup_policy_is_invalidated_when_the_index_changes():
+    class Retriever:
+        def __init__(self, text):
+            self.text, self.queries = text, 0
+
+        def query(self, query, k):
+            self.queries += 1
+            return [{"page_content": self.text}]
+
+    old, new = Retriever("old policy"), Retriever("new policy")
+    policy_tool.set_retriever(old)
+    try:
+        assert policy_tool.lookup_policy.invoke({"query": "refunds"}) == "old policy"
+        assert policy_tool.lookup_policy.invoke({"query": "refunds "}) == "old policy"
+        assert old.queries == 1
+        policy_tool.set_retriever(new)
+        assert policy_tool.lookup_policy.invoke({"query": "refunds"}) == "new policy"
+    finally:
+        policy_tool.set_retriever(None)
+
+
+def test_explicit_zero_disables_expiry_and_byte_cap():
+    cache = ToolCache(max_size=8, max_bytes=0, ttl_seconds=0)
+    assert cache._cache.ttl_seconds is None and cache._cache.max_bytes is None
+    with pytest.raises(ValueError):
+        ToolCache(max_size=0)
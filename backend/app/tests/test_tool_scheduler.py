@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+
+from app.services.customer_support.graph import State, create_tool_node_with_fallback
+from app.services.customer_support.tool_scheduler import ToolCallScheduler, is_write_tool
+
+DELAY = 0.2
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.spans = []
+
+    def run(self, name):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        start = time.perf_counter()
+        time.sleep(DELAY)
+        with self.lock:
+            self.active -= 1
+            self.spans.append((name, start, time.perf_counter()))
+        return name
+
+
+def _tools(recorder):
+    @tool
+    def search_hotels(location: str) -> str:
+        """Search hotels."""
+        return recorder.run(f"hotels:{location}")
+
+    @tool
+    def search_car_rentals(location: str) -> str:
+        """Search cars."""
+        return recorder.run(f"cars:{location}")
+
+    @tool
+    def book_hotel(hotel_id: int) -> str:
+        """Book a hotel."""
+        return recorder.run(f"book:{hotel_id}")
+
+    return [search_hotels, search_car_rentals, book_hotel]
+
+
+def _run_turn(tool_calls, scheduler=None, passenger_id="P1"):
+    recorder = Recorder()
+    builder = StateGraph(State)
+    builder.add_node("tools", create_tool_node_with_fallback(_tools(recorder), scheduler))
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    graph = builder.compile()
+
+    message = AIMessage(
+        content="",
+        tool_calls=[{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(tool_calls)],
+    )
+    config = {"configurable": {"passenger_id": passenger_id}}
+    start = time.perf_counter()
+    result = asyncio.run(graph.ainvoke({"messages": [message]}, config))
+    return result["messages"][1:], recorder, time.perf_counter() - start
+
+
+def test_write_tool_detection():
+    assert is_write_tool("book_hotel") and is_write_tool("cancel_ticket") and is_write_tool("update_excursion")
+    assert not is_write_tool("search_hotels") and not is_write_tool("fetch_user_flight_information")
+
+
+def test_read_tools_run_concurrently_in_call_order():
+    calls = [("search_hotels", {"location": "Basel"}), ("search_car_rentals", {"location": "Basel"}),
+             ("search_hotels", {"location": "Zurich"})]
+    messages, recorder, elapsed = _run_turn(calls, ToolCallScheduler(max_concurrency=4))
+    assert [m.content for m in messages] == ["hotels:Basel", "cars:Basel", "hotels:Zurich"]
+    assert [m.tool_call_id for m in messages] == ["call_0", "call_1", "call_2"]
+    assert recorder.peak == 3
+    assert elapsed < DELAY * 2
+
+
+def test_concurrency_is_bounded():
+    calls = [("search_hotels", {"location": str(i)}) for i in range(4)]
+    _, recorder, _ = _run_turn(calls, ToolCallScheduler(max_concurrency=2))
+    assert recorder.peak == 2
+
+
+def test_write_tools_for_one_passenger_are_serialized_in_order():
+    calls = [("book_hotel", {"hotel_id": 1}), ("search_hotels", {"location": "Basel"}),
+             ("book_hotel", {"hotel_id": 2})]
+    messages, recorder, _ = _run_turn(calls, ToolCallScheduler(max_concurrency=4))
+    assert [m.content for m in messages] == ["book:1", "hotels:Basel", "book:2"]
+    spans = {name: (start, end) for name, start, end in recorder.spans}
+    assert spans["book:1"][1] <= spans["book:2"][0]
+    # 只读工具与写操作并发执行
+    assert spans["hotels:Basel"][0] < spans["book:1"][1]
+
+
+def test_write_tools_for_different_passengers_overlap():
+    scheduler = ToolCallScheduler(max_concurrency=4)
+    recorder = Recorder()
+
+    def request(passenger_id, hotel_id):
+        return SimpleNamespace(
+            tool_call={"name": "book_hotel", "args": {"hotel_id": hotel_id}},
+            runtime=SimpleNamespace(config={"configurable": {"passenger_id": passenger_id}}),
+        )
+
+    async def execute(req):
+        return await asyncio.to_thread(recorder.run, req.tool_call["args"]["hotel_id"])
+
+    async def go():
+        return await asyncio.gather(
+            scheduler.awrap(request("P1", 1), execute),
+            scheduler.awrap(request("P2", 2), execute),
+            scheduler.awrap(request("P1", 3), execute),
+        )
+
+    assert asyncio.run(go()) == [1, 2, 3]
+    assert recorder.peak == 2
@@ -0,0 +1,60 @@
+from app.core.database import get_connection
+from app.core.schema import get_schema
+from app.services.customer_support.tools.flight_tool import (
+    cancel_ticket,
+    fetch_user_flight_information,
+    update_ticket_to_new_flight,
+    user_flights_cache_stats,
+)
+from app.tests.conftest import PASSENGER_ID
+
+CONFIG = {"configurable": {"passenger_id": PASSENGER_ID}}
+TICKET_NO = "7240005432906569"
+
+
+def _fetch_counting_queries():
+    statements = []
+    with get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        rows = fetch_user_flight_information.invoke({}, config=CONFIG)
+        conn.set_trace_callback(None)
+    return rows, len(statements)
+
+
+def test_repeat_lookups_hit_the_cache(travel_db):
+    get_schema()
+    before = user_flights_cache_stats()
+    first, queries = _fetch_counting_queries()
+    assert queries == 1
+    second, queries = _fetch_counting_queries()
+    assert queries == 0
+    assert second == first
+    # 调用方修改返回值不影响缓存
+    second[0]["seat_no"] = "1A"
+    assert fetch_user_flight_information.invoke({}, config=CONFIG)[0]["seat_no"] == "18E"
+
+    stats = user_flights_cache_stats()
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"], stats["size"]) == (2, 1, 1)
+    assert 0 < stats["hit_rate"] <= 1
+    assert stats["bytes"] > 0
+
+
+def test_update_ticket_invalidates(travel_db):
+    assert [row["flight_id"] for row in fetch_user_flight_information.invoke({}, config=CONFIG)] == [1]
+    result = update_ticket_to_new_flight.invoke({"ticket_no": TICKET_NO, "new_flight_id": 3}, config=CONFIG)
+    assert result == "Ticket successfully updated to new flight."
+    assert [row["flight_id"] for row in fetch_user_flight_information.invoke({}, config=CONFIG)] == [3]
+
+
+def test_cancel_ticket_invalidates(travel_db):
+    assert fetch_user_flight_information.invoke({}, config=CONFIG)
+    assert cancel_ticket.invoke({"ticket_no": TICKET_NO}, config=CONFIG) == "Ticket successfully cancelled."
+    assert fetch_user_flight_information.invoke({}, config=CONFIG) == []
+
+
+def test_rejected_write_keeps_cache(travel_db):
+    fetch_user_flight_information.invoke({}, config=CONFIG)
+    other = {"configurable": {"passenger_id": "0000 000000"}}
+    assert "not the owner" in cancel_ticket.invoke({"ticket_no": TICKET_NO}, config=other)
+    _, queries = _fetch_counting_queries()
+    assert queries == 0
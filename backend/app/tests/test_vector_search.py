@@ -0,0 +1,83 @@
+import numpy as np
+
+from app.core.config import settings
+from app.services.customer_support.retrieval.ann import IVFIndex, normalize_rows, top_k
+from app.services.customer_support.retrieval.embedders import CachedEmbedder, Embedder, HashingEmbedder
+from app.services.customer_support.retrieval.index import ensure_index
+from app.services.customer_support.retrieval.vector_store import VectorStoreRetriever
+
+DOCS = [
+    {"page_content": text}
+    for text in [
+        "Refunds are issued within 24 hours of cancellation.",
+        "Each passenger may check one bag up to 23 kg.",
+        "Flights can be changed up to three hours before departure.",
+        "Small pets may travel in the cabin.",
+    ]
+]
+
+
+class BatchCountingEmbedder(Embedder):
+    name = "batch-counting"
+
+    def __init__(self):
+        self.calls = []
+        self._inner = HashingEmbedder(256)
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return self._inner.embed_documents(texts)
+
+
+def _clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+    return normalize_rows(points)
+
+
+def test_query_batch_matches_single_queries():
+    retriever = VectorStoreRetriever.from_docs(DOCS, HashingEmbedder(256))
+    queries = ["how fast are refunds", "can my pets travel with me", "change my flight"]
+    batched = retriever.query_batch(queries, k=2)
+    for results, query in zip(batched, queries):
+        single = retriever.query(query, k=2)
+        assert [r["page_content"] for r in results] == [r["page_content"] for r in single]
+        assert np.allclose([r["similarity"] for r in results], [r["similarity"] for r in single], atol=1e-6)
+    assert batched[1][0]["page_content"].startswith("Small pets")
+    assert retriever.query_batch([], k=2) == []
+
+
+def test_cached_batch_embeds_only_misses_in_one_call():
+    inner = BatchCountingEmbedder()
+    cached = CachedEmbedder(inner)
+    cached.embed_query("refunds")
+    vectors = cached.embed_queries(["Refunds", "pets", "bags", "pets"])
+    assert vectors.shape == (4, 256)
+    assert inner.calls[-1] == ["pets", "bags"]
+    assert np.array_equal(vectors[1], vectors[3])
+
+
+def test_ivf_recall_against_exact_search():
+    vectors = _clustered(4000)
+    queries = normalize_rows(vectors[:100] + 0.05 * np.random.default_rng(1).normal(size=(100, 32)))
+    exact = top_k(queries @ vectors.T, 10)
+
+    ivf = IVFIndex.build(vectors, nprobe=8)
+    found = ivf.search(vectors, queries, 10)
+    recall = np.mean([len(set(e) & set(idx)) / 10 for e, (idx, _) in zip(exact, found)])
+    assert recall >= 0.9
+    assert ivf.offsets[-1] == len(vectors)
+
+
+def test_large_index_persists_ivf(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "POLICY_ANN_MIN_DOCS", 3)
+    source = tmp_path / "faq.md"
+    source.write_text("".join(f"\n## Topic {i}\nDetails about topic {i}.\n" for i in range(9)))
+    embedder = HashingEmbedder(128)
+    ensure_index(tmp_path / "index", source, embedder)
+
+    index = ensure_index(tmp_path / "index", source, embedder)
+    assert index.ann is not None and index.meta["ann"]["nlist"] == index.ann.nlist
+    retriever = VectorStoreRetriever.from_index(index, embedder)
+    assert retriever.query("topic 4 details", k=1)[0]["page_content"].startswith("\n## Topic 4")
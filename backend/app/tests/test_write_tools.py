@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.database import get_connection, write_transaction
+from app.core.schema import get_schema
+from app.services.customer_support.tools.car_rental_tool import update_car_rental
+from app.services.customer_support.tools.excursions_tool import book_excursion
+from app.services.customer_support.tools.flight_tool import cancel_ticket, update_ticket_to_new_flight
+from app.services.customer_support.tools.hotels_tool import book_hotel, update_hotel
+from app.tests.conftest import PASSENGER_ID
+
+CONFIG = {"configurable": {"passenger_id": PASSENGER_ID}}
+OTHER = {"configurable": {"passenger_id": "0000 000000"}}
+TICKET_NO = "7240005432906569"
+
+
+def _traced(func):
+    """执行 func 并返回它在共享连接上发出的 SQL"""
+    get_schema()
+    statements = []
+    with get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            result = func()
+        finally:
+            conn.set_trace_callback(None)
+    return result, [" ".join(s.split()) for s in statements]
+
+
+def _flight_of_ticket(travel_db):
+    conn = sqlite3.connect(travel_db)
+    row = conn.execute("SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (TICKET_NO,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def test_reschedule_is_one_guarded_update(travel_db):
+    result, statements = _traced(
+        lambda: update_ticket_to_new_flight.invoke({"ticket_no": TICKET_NO, "new_flight_id": 3}, config=CONFIG)
+    )
+    assert result == "Ticket successfully updated to new flight."
+    assert statements[0] == "BEGIN IMMEDIATE" and statements[-1] == "COMMIT"
+    # 一条受保护的 UPDATE，随后在同一事务中递增表版本号
+    assert len(statements) == 4 and statements[1].startswith("UPDATE ticket_flights")
+    assert statements[2].startswith("INSERT INTO table_versions")
+    assert _flight_of_ticket(travel_db) == 3
+
+
+def test_reschedule_rejections_keep_the_ticket(travel_db):
+    soon = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S.%f+00:00")
+    conn = sqlite3.connect(travel_db)
+    conn.execute(
+        "INSERT INTO flights VALUES (9, 'LX0900', ?, NULL, 'CDG', 'BSL', 'Scheduled', '320', NULL, NULL)", (soon,)
+    )
+    conn.commit()
+    conn.close()
+
+    def reschedule(flight_id, config=CONFIG, ticket_no=TICKET_NO):
+        return update_ticket_to_new_flight.invoke({"ticket_no": ticket_no, "new_flight_id": flight_id}, config=config)
+
+    assert reschedule(99) == "Invalid new flight ID provided."
+    assert reschedule(9).startswith("Not permitted to reschedule")
+    assert reschedule(3, ticket_no="0000") == "No existing ticket found for the given ticket number."
+    assert "not the owner" in reschedule(3, config=OTHER)
+    assert _flight_of_ticket(travel_db) == 1
+
+
+def test_cancel_checks_ownership_in_the_delete(travel_db):
+    assert "not the owner" in cancel_ticket.invoke({"ticket_no": TICKET_NO}, config=OTHER)
+    assert _flight_of_ticket(travel_db) == 1
+    result, statements = _traced(lambda: cancel_ticket.invoke({"ticket_no": TICKET_NO}, config=CONFIG))
+    assert result == "Ticket successfully cancelled."
+    assert len(statements) == 4 and statements[1].startswith("DELETE FROM ticket_flights")
+    assert _flight_of_ticket(travel_db) is None
+
+
+def test_update_reports_affected_rows(travel_db):
+    _, statements = _traced(lambda: update_hotel.invoke({"hotel_id": 2, "checkout_date": "2024-04-25"}))
+    assert sum(s.startswith("UPDATE hotels") for s in statements) == 1
+    conn = sqlite3.connect(travel_db)
+    checkin, checkout = conn.execute("SELECT checkin_date, checkout_date FROM hotels WHERE id = 2").fetchone()
+    # 未提供的入住日期保持原值
+    assert checkin == "2024-04-02" and checkout.startswith("2024-04-25")
+    conn.close()
+    assert update_hotel.invoke({"hotel_id": 42, "checkin_date": "2024-05-01"}) == "No hotel found with ID 42."
+    assert update_car_rental.invoke({"rental_id": 1, "start_date": "2024-05-01"}) == (
+        "Car rental 1 successfully updated."
+    )
+    assert book_excursion.invoke({"recommendation_id": 42}) == "No trip recommendation found with ID 42."
+
+
+def test_transaction_rolls_back_on_error(travel_db):
+    with pytest.raises(RuntimeError):
+        with write_transaction() as conn:
+            conn.execute("UPDATE hotels SET booked = 1 WHERE id = 1")
+            raise RuntimeError("boom")
+    with get_connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT booked FROM hotels WHERE id = 1").fetchone() == (0,)
+
+
+def test_concurrent_writes_do_not_fail_or_lose_updates(travel_db):
+    get_schema()
+    errors = []
+
+    def worker(i):
+        try:
+            for _ in range(10):
+                assert book_hotel.invoke({"hotel_id": 1 + i % 4}).endswith("successfully booked.")
+                result = update_ticket_to_new_flight.invoke(
+                    {"ticket_no": TICKET_NO, "new_flight_id": 2 if i % 2 else 3}, config=CONFIG
+                )
+                assert result == "Ticket successfully updated to new flight."
+        except Exception as e:  # noqa: BLE001 - 在主线程中统一断言
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert _flight_of_ticket(travel_db) in (2, 3)
@@ -0,0 +1,89 @@
+"""对比每次调用新建连接与共享连接池在并发工具调用下的吞吐
+
+用法:
+    python -m benchmarks.bench_db_pool --threads 8 --calls 500
+"""
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.core.database import SQLiteConnectionPool
+
+SEARCH_SQL = "SELECT * FROM hotels WHERE location LIKE ? AND name LIKE ?"
+
+
+def _build_db(path: Path, rows: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE hotels (id INTEGER PRIMARY KEY, name TEXT, location TEXT, "
+        "price_tier TEXT, checkin_date TEXT, checkout_date TEXT, booked INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO hotels VALUES (?, ?, ?, 'Midscale', '2024-04-02', '2024-04-20', 0)",
+        [(i, f"Hotel {i}", f"City {i % 50}") for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _per_call(path: str, i: int) -> int:
+    # 与改造前的工具实现相同：每次调用都建立并关闭连接
+    conn = sqlite3.connect(path)
+    rows = conn.execute(SEARCH_SQL, (f"%City {i % 50}%", "%Hotel%")).fetchall()
+    conn.close()
+    return len(rows)
+
+
+def _pooled(pool: SQLiteConnectionPool, i: int) -> int:
+    with pool.connection() as conn:
+        return len(conn.execute(SEARCH_SQL, (f"%City {i % 50}%", "%Hotel%")).fetchall())
+
+
+def _run(fn, threads: int, calls: int) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+
+    def timed(i: int) -> None:
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(calls)))
+    return time.perf_counter() - start, latencies
+
+
+def _report(label: str, elapsed: float, latencies: list[float]) -> None:
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<10} {len(latencies) / elapsed:>10.0f} ops/s  "
+        f"p50 {statistics.median(latencies) * 1000:.3f} ms  p95 {p95 * 1000:.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.sqlite"
+        _build_db(path, args.rows)
+        pool = SQLiteConnectionPool(str(path), max_size=args.pool_size)
+
+        print(f"threads={args.threads} calls={args.calls} rows={args.rows}")
+        _report("per-call", *_run(lambda i: _per_call(str(path), i), args.threads, args.calls))
+        _report("pooled", *_run(lambda i: _pooled(pool, i), args.threads, args.calls))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""对比精确检索与 IVF 近似检索在不同语料规模下的召回率和延迟
+
+语料为带簇结构的随机单位向量（近似真实嵌入的分布），查询为语料中随机文档加噪声。
+召回率以精确检索的前 k 个结果为基准。
+
+用法:
+    python -m benchmarks.bench_policy_search --sizes 1000 10000 50000 --dim 256 --nprobe 4 8 16
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.services.customer_support.retrieval.ann import IVFIndex, normalize_rows, top_k
+
+
+def _corpus(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, n // 200), dim))
+    points = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.normal(size=(n, dim))
+    return normalize_rows(points)
+
+
+def _queries(corpus: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = corpus[rng.integers(0, len(corpus), count)]
+    return normalize_rows(picked + 0.1 * rng.normal(size=picked.shape))
+
+
+def _p50_ms(samples: list[float]) -> float:
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'docs':>7} {'mode':<12} {'recall@k':>8} {'p50 ms/query':>13} {'batch ms/query':>15} {'build s':>8}")
+    for size in args.sizes:
+        corpus = _corpus(size, args.dim)
+        queries = _queries(corpus, args.queries)
+
+        single = []
+        for q in queries:
+            start = time.perf_counter()
+            top_k(corpus @ q, args.k)
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        exact = top_k(queries @ corpus.T, args.k)
+        batch = (time.perf_counter() - start) / len(queries)
+        print(f"{size:>7} {'exact':<12} {1.0:>8.3f} {_p50_ms(single):>13.3f} {batch * 1000:>15.3f} {0.0:>8.2f}")
+
+        start = time.perf_counter()
+        ivf = IVFIndex.build(corpus)
+        build = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            single = []
+            found = []
+            for q in queries:
+                start = time.perf_counter()
+                found.append(ivf.search(corpus, q[np.newaxis, :], args.k)[0][0])
+                single.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ivf.search(corpus, queries, args.k)
+            batch = (time.perf_counter() - start) / len(queries)
+            recall = np.mean([len(set(e) & set(f)) / args.k for e, f in zip(exact, found)])
+            mode = f"ivf/{ivf.nlist}/{nprobe}"
+            print(f"{size:>7} {mode:<12} {recall:>8.3f} {_p50_ms(single):>13.3f} {batch * 1000:>15.3f} {build:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
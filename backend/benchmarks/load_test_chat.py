@@ -0,0 +1,63 @@
+"""单个 worker 内 /chat 接口的并发压测（使用桩 LLM，不访问 Anthropic）
+
+桩 LLM 每次调用固定等待 --latency 秒，模拟上游响应时间。事件循环不被阻塞时，
+并发请求的总耗时应接近单个请求的耗时，而不是随并发数线性增长。
+
+用法:
+    python -m benchmarks.load_test_chat --concurrency 1 8 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.main import app
+from app.routers import customer_router
+from app.services.customer_support.graph import create_customer_support_graph
+
+
+def _stub_llm(latency: float) -> RunnableLambda:
+    async def respond(prompt_value) -> AIMessage:
+        await asyncio.sleep(latency)
+        return AIMessage(content="Your flight departs at 08:00.")
+
+    return RunnableLambda(respond)
+
+
+async def _run(client: httpx.AsyncClient, concurrency: int) -> float:
+    payload = {"messages": [{"role": "user", "content": "Hi there, what time is my flight?"}]}
+
+    async def one() -> None:
+        response = await client.post("/api/v1/chat", json=payload)
+        response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    customer_router.graph = create_customer_support_graph(_stub_llm(args.latency))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        baseline = None
+        for concurrency in args.concurrency:
+            elapsed = await _run(client, concurrency)
+            baseline = baseline or elapsed
+            print(
+                f"concurrency={concurrency:<4} total {elapsed:.3f}s  "
+                f"{concurrency / elapsed:>7.1f} req/s  "
+                f"slowdown vs 1x {elapsed / baseline:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,382 @@
+"""回放 tutorial_questions 的离线基准：桩 LLM + 生成的 SQLite 库（app.core.synthetic_db），不访问任何外部服务
+
+每个会话完整回放一遍教程中的 14 轮对话（第一个会话使用原文，其余为确定性的改写变体：
+换城市、加前缀、改大小写）。桩 LLM 按问题中的关键词决定调用哪些工具、分几步调用，
+工具真实地查询和修改临时数据库，政策检索使用本地哈希嵌入，因此测到的是图、历史管理、
+工具层和缓存本身的开销。
+
+对每个并发数 N，N 个会话同时进行（每个会话依次回放 --rounds 遍），输出每轮延迟的
+p50 / p95 / p99、吞吐（轮/秒）、进程内存增长以及各工具、各节点的耗时占比。
+结果与基线文件中相同参数的记录比较，超出容差时以非零状态退出。
+
+用法:
+    python -m benchmarks.replay_tutorial --concurrency 1 8 32
+    python -m benchmarks.replay_tutorial --llm-latency 0.05 --no-tool-cache
+    python -m benchmarks.replay_tutorial --update-baseline   # 把本次结果记录为基线
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core import database
+from app.core.config import settings
+from app.core.schema import init_schema, reset_schema
+from app.core.synthetic_db import generate_travel_db
+from app.routers.customer_router import tutorial_questions
+from app.services.customer_support.graph import create_customer_support_graph
+from app.services.customer_support.instrumentation import GraphMetricsCallback
+from app.services.customer_support.retrieval.embedders import HashingEmbedder
+from app.services.customer_support.retrieval.vector_store import VectorStoreRetriever
+from app.services.customer_support.tools import policy_tool
+from app.services.customer_support.tools.flight_tool import user_flights_cache
+from app.services.customer_support.tools.memoize import tool_cache
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "replay_tutorial.json"
+
+# 改写变体使用的城市（均在生成器的城市列表中）
+CITIES = ("Basel", "Zurich", "Geneva", "Lugano", "Bern")
+# 航班时间窗口放在未来，改签时“起飞前至少 3 小时”的检查能够通过
+FLIGHTS_START = date(2030, 5, 1)
+
+POLICY_DOCS = [
+    {"page_content": "Changing a ticket is possible up to 3 hours before departure. A change fee may apply."},
+    {"page_content": "Refunds are available within 24 hours of booking for all fare conditions."},
+    {"page_content": "Each passenger may bring one carry-on bag and one personal item."},
+    {"page_content": "Hotel and car rental bookings can be cancelled free of charge until the day before."},
+]
+
+
+# ---- 测试数据 ----
+
+class _Catalog:
+    """桩 LLM 需要的 ID：各城市的酒店 / 租车 / 旅游推荐、乘客及其机票、可改签的航班"""
+
+    def __init__(self, path: Path, passengers: int):
+        conn = sqlite3.connect(path)
+        try:
+            self.hotels = self._by_city(conn, "hotels")
+            self.car_rentals = self._by_city(conn, "car_rentals")
+            self.trip_recommendations = self._by_city(conn, "trip_recommendations")
+            self.tickets = dict(conn.execute(
+                "SELECT passenger_id, MIN(ticket_no) FROM tickets GROUP BY passenger_id ORDER BY 2 LIMIT ?",
+                (passengers,),
+            ).fetchall())
+            self.flights = [row[0] for row in conn.execute("SELECT flight_id FROM flights ORDER BY flight_id")]
+        finally:
+            conn.close()
+        self.passengers = list(self.tickets)
+
+    @staticmethod
+    def _by_city(conn: sqlite3.Connection, table: str) -> dict[str, list[int]]:
+        ids: dict[str, list[int]] = defaultdict(list)
+        for location, resource_id in conn.execute(f"SELECT location, id FROM {table} ORDER BY id"):
+            ids[location].append(resource_id)
+        return ids
+
+    @staticmethod
+    def pick(ids_by_city: dict[str, list[int]], city: str, passenger: str) -> int:
+        """为乘客确定性地挑选城市中的一项；城市没有数据时从全部数据中挑选"""
+        ids = ids_by_city.get(city) or sorted(i for values in ids_by_city.values() for i in values)
+        return ids[zlib.crc32(passenger.encode()) % len(ids)]
+
+
+def _use_database(path: Path) -> None:
+    database.close_pool()
+    reset_schema()
+    user_flights_cache.clear()
+    tool_cache.clear()
+    settings.DATABASE_URL = f"sqlite:///{path}"
+    init_schema()
+
+
+# ---- 对话与桩 LLM ----
+
+def _variant(index: int) -> list[str]:
+    """第 index 个会话要回放的问题：0 为原文，其余为确定性的改写"""
+    if index == 0:
+        return list(tutorial_questions)
+    rng = random.Random(index)
+    city = CITIES[index % len(CITIES)]
+    questions = []
+    for question in tutorial_questions:
+        question = rng.choice(("", "Please, ", "Hey - ")) + question
+        if re.search(r"hotel|lodging|car|excursion|museum", question, re.I):
+            question = f"{question.rstrip(' .?')} in {city}?"
+        questions.append(question.lower() if rng.random() < 0.3 else question)
+    return questions
+
+
+_call_ids = itertools.count()
+
+
+def _call(name: str, **args) -> dict:
+    return {"name": name, "args": args, "id": f"call_{next(_call_ids)}"}
+
+
+def _plan(text: str, passenger: str, catalog: _Catalog) -> list[list[dict]]:
+    """按问题决定依次执行的工具调用批次（每批一次 assistant -> tools 往返）"""
+    text = text.lower()
+    match = re.search("|".join(city.lower() for city in CITIES), text)
+    city = match.group(0).title() if match else "Basel"
+    if "car" in text and re.search(r"book|cheapest", text):
+        return [[_call("book_car_rental", rental_id=catalog.pick(catalog.car_rentals, city, passenger))]]
+    if re.search(r"reservation|book anything", text):
+        return [[_call("book_hotel", hotel_id=catalog.pick(catalog.hotels, city, passenger))]]
+    if "book it" in text:
+        recommendation_id = catalog.pick(catalog.trip_recommendations, city, passenger)
+        return [[_call("book_excursion", recommendation_id=recommendation_id)]]
+    if "lodging" in text:
+        return [[_call("search_hotels", location=city), _call("search_car_rentals", location=city)]]
+    if "hotel" in text:
+        return [[_call("search_hotels", location=city, price_tier="Midscale")]]
+    if "car" in text:
+        return [[_call("search_car_rentals", location=city)]]
+    if "museum" in text:
+        return [[_call("search_trip_recommendations", location=city, keywords="museum")]]
+    if re.search(r"excursion|available while", text):
+        return [[_call("search_trip_recommendations", location=city)]]
+    if "next available option" in text:
+        flight_id = catalog.flights[zlib.crc32(passenger.encode()) % len(catalog.flights)]
+        ticket = catalog.tickets[passenger]
+        return [[_call("update_ticket_to_new_flight", ticket_no=ticket, new_flight_id=flight_id)]]
+    if re.search(r"update my flight|sooner", text):
+        return [
+            [_call("lookup_policy", query="changing a ticket"), _call("fetch_user_flight_information")],
+            [_call(
+                "search_flights", departure_airport="CDG", arrival_airport="BSL", start_time=FLIGHTS_START.isoformat()
+            )],
+        ]
+    if "flight" in text:
+        return [[_call("fetch_user_flight_information")]]
+    return []
+
+
+def _usage(messages, reply: AIMessage) -> dict:
+    prompt = sum(len(str(m.content)) for m in messages) // 4 + 1500
+    output = len(reply.content) // 4 + 20 * len(reply.tool_calls)
+    return {"input_tokens": prompt, "output_tokens": output, "total_tokens": prompt + output}
+
+
+def _stub_llm(latency: float, catalog: _Catalog) -> RunnableLambda:
+    """确定性的桩 LLM：本轮的计划还有未执行的批次时发起工具调用，否则给出文字回复"""
+
+    async def respond(state) -> AIMessage:
+        if latency:
+            await asyncio.sleep(latency)
+        messages = state["messages"]
+        start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        steps_done = sum(1 for m in messages[start:] if isinstance(m, AIMessage) and m.tool_calls)
+        plan = _plan(messages[start].content, state["user_info"], catalog)
+        if steps_done < len(plan):
+            reply = AIMessage(content="", tool_calls=plan[steps_done])
+        else:
+            tools = sorted({m.name for m in messages[start:] if isinstance(m, ToolMessage)})
+            reply = AIMessage(content=f"Done. I checked: {', '.join(tools) or 'nothing'}.")
+        reply.usage_metadata = _usage(messages, reply)
+        return reply
+
+    return RunnableLambda(respond)
+
+
+# ---- 测量 ----
+
+def _rss_mb() -> float:
+    """当前常驻内存（MB）；没有 /proc 时退化为峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+async def _conversation(graph, callback, index: int, passenger: str, rounds: int, latencies: list) -> None:
+    for _ in range(rounds):
+        config = {
+            "configurable": {"thread_id": str(uuid.uuid4()), "passenger_id": passenger},
+            "callbacks": [callback],
+        }
+        for question in _variant(index):
+            start = time.perf_counter()
+            await graph.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+            latencies.append(time.perf_counter() - start)
+
+
+async def _level(concurrency: int, args, catalog: _Catalog) -> dict:
+    records: list[dict] = []
+    callback = GraphMetricsCallback(on_request=records.append)
+    graph = create_customer_support_graph(_stub_llm(args.llm_latency, catalog), MemorySaver())
+    latencies: list[float] = []
+
+    gc.collect()
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _conversation(
+            graph, callback, index, catalog.passengers[index % len(catalog.passengers)], args.rounds, latencies
+        )
+        for index in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+
+    errors = sum(1 for r in records if r["status"] != "ok")
+    if errors:
+        raise RuntimeError(f"{errors} 轮对话执行失败")
+    tools, nodes = defaultdict(float), defaultdict(float)
+    for record in records:
+        for name, ms in record["tools_ms"].items():
+            tools[name] += ms
+        for name, ms in record["nodes_ms"].items():
+            nodes[name] += ms
+    return {
+        "turns": len(latencies),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "throughput": len(latencies) / elapsed,
+        "rss_growth_mb": _rss_mb() - rss_before,
+        "hops": sum(r["hops"] for r in records) / len(records),
+        "tools_ms": dict(tools),
+        "nodes_ms": dict(nodes),
+        "turn_ms": sum(latencies) * 1000,
+    }
+
+
+def _print_level(concurrency: int, result: dict) -> None:
+    print(
+        f"{concurrency:>5} {result['turns']:>6} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+        f"{result['p99_ms']:>8.2f} {result['throughput']:>9.1f} {result['hops']:>5.2f} "
+        f"{result['rss_growth_mb']:>+9.1f}"
+    )
+
+
+def _print_breakdown(concurrency: int, result: dict) -> None:
+    total = result["turn_ms"]
+    print(f"\nconcurrency={concurrency}: 占每轮总耗时的比例")
+    for label, times in (("node", result["nodes_ms"]), ("tool", result["tools_ms"])):
+        for name, ms in sorted(times.items(), key=lambda item: -item[1]):
+            print(f"  {label} {name:<30} {ms:>10.1f} ms {ms / total:>7.1%}")
+
+
+# ---- 基线 ----
+
+def _params(args) -> dict:
+    return {
+        "llm_latency": args.llm_latency,
+        "rounds": args.rounds,
+        "rows": args.rows,
+        "tool_cache": args.tool_cache,
+    }
+
+
+def _regressions(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """延迟高于基线 (1 + tolerance) 倍或吞吐低于基线 (1 - tolerance) 倍的项"""
+    problems = []
+    for level, result in results.items():
+        base = baseline.get(level)
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if result[key] > base[key] * (1 + tolerance):
+                problems.append(f"concurrency={level} {key} {result[key]:.2f} > 基线 {base[key]:.2f}")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(
+                f"concurrency={level} throughput {result['throughput']:.1f} < 基线 {base['throughput']:.1f}"
+            )
+    return problems
+
+
+def _load_baseline(path: Path, params: dict) -> Optional[dict]:
+    if not path.exists():
+        return None
+    stored = json.loads(path.read_text())
+    if stored.get("params") != params:
+        print(f"\n基线 {path} 的参数 {stored.get('params')} 与本次不同，跳过比较")
+        return None
+    return stored["results"]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=3, help="每个会话回放教程的遍数")
+    parser.add_argument("--rows", type=int, default=20_000, help="生成的数据库中的机票数")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="桩 LLM 每次调用等待的秒数")
+    parser.add_argument("--tool-cache", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="相对基线允许的退化比例")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    settings.TOOL_CACHE_ENABLED = args.tool_cache
+    policy_tool.set_retriever(VectorStoreRetriever.from_docs(POLICY_DOCS, HashingEmbedder(256)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "travel2.sqlite"
+        generate_travel_db(path, args.rows, start=FLIGHTS_START)
+        catalog = _Catalog(path, passengers=max(args.concurrency))
+        _use_database(path)
+        try:
+            # 预热：导入、建图和首次查询的开销不计入结果
+            warmup = argparse.Namespace(**{**vars(args), "rounds": 1})
+            await _level(1, warmup, catalog)
+
+            print(f"{'conc':>5} {'turns':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'turns/s':>9} "
+                  f"{'hops':>5} {'rss +MB':>9}")
+            results = {}
+            for concurrency in args.concurrency:
+                results[str(concurrency)] = await _level(concurrency, args, catalog)
+                _print_level(concurrency, results[str(concurrency)])
+            for concurrency in args.concurrency:
+                _print_breakdown(concurrency, results[str(concurrency)])
+        finally:
+            database.close_pool()
+
+    summary = {
+        level: {key: round(result[key], 3) for key in ("p50_ms", "p95_ms", "p99_ms", "throughput")}
+        for level, result in results.items()
+    }
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({"params": _params(args), "results": summary}, indent=2) + "\n")
+        print(f"\n基线已写入 {args.baseline}")
+        return 0
+
+    baseline = _load_baseline(args.baseline, _params(args))
+    if baseline is None:
+        return 0
+    problems = _regressions(summary, baseline, args.tolerance)
+    for problem in problems:
+        print(f"退化: {problem}")
+    if not problems:
+        print(f"\n与基线相比没有超过 {args.tolerance:.0%} 的退化")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -8,9 +8,12 @@ setup(
         "fastapi",
         "uvicorn",
         "langchain",
-        "langchain-core",
+        "langchain-core==1.6.10",
         "langchain-community",
-        "langgraph",
-        "langchain-anthropic",
+        "langgraph==1.2.15",
+        "langgraph-prebuilt==1.1.0",
+        "langgraph-checkpoint==4.3.0",
+        "langchain-anthropic==1.7.6",
+        "numpy>=1.26.0",
     ]
 ) 
\ No newline at end of file